@@ -7,8 +7,11 @@ app.config['SECRET_KEY'] = 'your_secret_key'
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///site.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# FLASK_-prefixed environment variables override any setting, e.g. FLASK_SQLALCHEMY_DATABASE_URI
+app.config.from_prefixed_env()
+
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
 
 # Import views to register routes
-from app import views, models
+from app import views, api, models, commands, responses
@@ -0,0 +1,252 @@
+import numpy as np
+from flask import Response, abort, jsonify, request, stream_with_context
+from app import app, db
+from app.boundaries import get_boundaries_json
+from app.cache import sync_data_version
+from app.export import EXPORT_FORMATS, EXPORT_WRITERS
+from app.jobs import job_to_dict
+from app.locate import locate_points
+from app.matrix import get_category_values, get_ward_matrix, get_ward_names
+from app.metrics import DISPLAY_CATEGORIES, DISPLAY_MODELS, MEASURE_LABELS, MEASURES, is_valid_category
+from app.models import IngestJob
+from app.observations import get_observation_catalog, get_observation_values, get_ward_observations
+from app.prerender import prerendered_response
+from app.rollups import AREA_LEVELS, get_area_boundaries, get_area_profile, get_area_values
+from app.similarity import similar_wards
+from app.tiles import get_tile
+
+app.config.setdefault('LOCATE_MAX_POINTS', 200000)
+app.config.setdefault('SIMILAR_MAX_K', 100)
+
+
+@app.route('/api/wards')
+def api_wards():
+    # Ward names and the available categories, fetched once per page load
+    version = sync_data_version()
+    return jsonify(
+        data_version=version,
+        wards=get_ward_names(version),
+        categories=DISPLAY_CATEGORIES,
+        measures=MEASURE_LABELS
+    )
+
+
+@app.route('/api/wards/<display_type>/<category>')
+def api_ward_values(display_type, category):
+    # ?measure= picks a derived measure (share, rate, rank, ...) worked out from the counts
+    measure = request.args.get('measure', 'count')
+    if not is_valid_category(display_type, category) or measure not in MEASURES:
+        abort(404)
+
+    version = sync_data_version()
+    response = prerendered_response('values', display_type, category, measure, version)
+    if response is not None:
+        return response
+
+    values = get_category_values(display_type, category, version, measure)
+    return jsonify(
+        display=display_type,
+        category=category,
+        measure=measure,
+        data_version=version,
+        values=values,
+        min=min(values.values(), default=0),
+        max=max(values.values(), default=0)
+    )
+
+
+@app.route('/api/wards/<ward_code>/similar')
+def api_similar_wards(ward_code):
+    # The ?k= (default 10) wards with the closest population, health, occupation, tenure and
+    # vehicle make-up, nearest first
+    k = min(max(request.args.get('k', 10, type=int), 1), app.config['SIMILAR_MAX_K'])
+    version = sync_data_version()
+    similar = similar_wards(ward_code, k, version)
+    if similar is None:
+        abort(404)
+
+    matrix = get_ward_matrix(version)
+    return jsonify(
+        ward_code=ward_code,
+        ward_name=matrix.ward_names[matrix.index[ward_code]],
+        data_version=version,
+        similar=[
+            {'ward_code': code, 'ward_name': name, 'distance': distance}
+            for code, name, distance in similar
+        ]
+    )
+
+
+@app.route('/export')
+def export_wards():
+    # Every ward's counts for ?datasets= (comma-separated, all by default) as ?format=csv,
+    # parquet or arrow, streamed chunk by chunk as the rows are read
+    datasets = list(dict.fromkeys(filter(None, request.args.get('datasets', ','.join(DISPLAY_MODELS)).split(','))))
+    export_format = request.args.get('format', 'csv')
+    if not datasets or any(dataset not in DISPLAY_MODELS for dataset in datasets) or export_format not in EXPORT_FORMATS:
+        abort(400)
+
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    return Response(
+        stream_with_context(EXPORT_WRITERS[export_format](datasets)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=ward_data.{extension}'}
+    )
+
+
+@app.route('/api/locate')
+def api_locate():
+    # The ward containing ?lat=&lon=, with its profile
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is None or lon is None:
+        abort(400)
+
+    version = sync_data_version()
+    ward_code = locate_points([lat], [lon], version)[0]
+    if ward_code is None:
+        abort(404)
+
+    matrix = get_ward_matrix(version)
+    row = matrix.index.get(ward_code)
+    return jsonify(
+        lat=lat,
+        lon=lon,
+        ward_code=ward_code,
+        ward_name=matrix.ward_names[row] if row is not None else None,
+        data_version=version,
+        profile=matrix.profile(ward_code)
+    )
+
+
+@app.route('/api/locate', methods=['POST'])
+def api_locate_batch():
+    # Batch lookup. Body: {"points": [[lat, lon], ...]} or {"lat": [...], "lon": [...]}.
+    # Returns one ward code (or null) per point, in order, and each matched ward's name and
+    # profile once; pass "profile": false to leave the profiles out.
+    payload = request.get_json(silent=True) or {}
+    try:
+        if 'points' in payload:
+            points = np.asarray(payload['points'], dtype=np.float64).reshape(-1, 2)
+            lats, lons = points[:, 0], points[:, 1]
+        else:
+            lats = np.asarray(payload['lat'], dtype=np.float64)
+            lons = np.asarray(payload['lon'], dtype=np.float64)
+    except (KeyError, TypeError, ValueError):
+        abort(400)
+    if lats.shape != lons.shape or lats.ndim != 1 or len(lats) > app.config['LOCATE_MAX_POINTS']:
+        abort(400)
+
+    version = sync_data_version()
+    ward_codes = locate_points(lats, lons, version)
+    matrix = get_ward_matrix(version)
+    wards = {}
+    for ward_code in set(ward_codes) - {None}:
+        row = matrix.index.get(ward_code)
+        wards[ward_code] = {'ward_name': matrix.ward_names[row] if row is not None else None}
+        if payload.get('profile', True):
+            wards[ward_code]['profile'] = matrix.profile(ward_code)
+
+    return jsonify(data_version=version, ward_codes=ward_codes, wards=wards)
+
+
+@app.route('/api/areas/<level>/<display_type>/<category>')
+def api_area_values(level, display_type, category):
+    # A category summed to local authority (level 'lad') or region level, for a higher-level choropleth
+    if level not in AREA_LEVELS or not is_valid_category(display_type, category):
+        abort(404)
+
+    areas = get_area_values(level, display_type, category)
+    values = [value for _, value in areas.values()]
+    return jsonify(
+        level=level,
+        display=display_type,
+        category=category,
+        data_version=sync_data_version(),
+        values={area_code: value for area_code, (_, value) in areas.items()},
+        names={area_code: area_name for area_code, (area_name, _) in areas.items()},
+        min=min(values, default=0),
+        max=max(values, default=0)
+    )
+
+
+@app.route('/api/areas/<level>/<area_code>')
+def api_area_profile(level, area_code):
+    # Totals of every display and category for one local authority or region
+    if level not in AREA_LEVELS:
+        abort(404)
+    area_name, ward_count, profile = get_area_profile(level, area_code)
+    if not profile:
+        abort(404)
+    return jsonify(level=level, area_code=area_code, area_name=area_name, ward_count=ward_count, profile=profile)
+
+
+@app.route('/api/boundaries/<int:level>.geojson')
+def api_ward_boundaries(level):
+    # Ward polygons at one simplification level, as the map fetches them; tagged with the
+    # data version so a browser revalidates with an empty 304 until the boundaries change
+    version = sync_data_version()
+    response = Response(get_boundaries_json(level), mimetype='application/geo+json')
+    response.set_etag(f'{version}-{level}', weak=True)
+    return response
+
+
+@app.route('/api/areas/<level>.geojson')
+def api_area_boundaries(level):
+    # Ward boundaries dissolved into local authorities or regions
+    if level not in AREA_LEVELS:
+        abort(404)
+    return jsonify(get_area_boundaries(level, sync_data_version()))
+
+
+@app.route('/api/observations')
+def api_observations():
+    # Datasets, categories and periods held in the long-format observation table
+    return jsonify(data_version=sync_data_version(), datasets=get_observation_catalog())
+
+
+@app.route('/api/observations/<dataset>/<category>')
+def api_observation_values(dataset, category):
+    # Every ward's value for one category; ?period= picks a census period, the latest by default
+    period, values = get_observation_values(dataset, category, request.args.get('period'))
+    if not values:
+        abort(404)
+    return jsonify(dataset=dataset, category=category, period=period, data_version=sync_data_version(), values=values)
+
+
+@app.route('/api/observations/ward/<ward_code>')
+def api_ward_observations(ward_code):
+    rows = get_ward_observations(ward_code, request.args.get('dataset'))
+    if not rows:
+        abort(404)
+    return jsonify(
+        ward_code=ward_code,
+        observations=[
+            {'dataset': dataset, 'category': category, 'period': period, 'value': value}
+            for dataset, category, period, value in rows
+        ]
+    )
+
+
+@app.route('/tiles/<int:z>/<int:x>/<int:y>.mvt')
+def api_tile(z, x, y):
+    # Ward polygons as a Mapbox Vector Tile; ?display=&category= adds that value as an attribute
+    if z > 22 or x >= 2 ** z or y >= 2 ** z:
+        abort(404)
+
+    display_type = request.args.get('display')
+    category = request.args.get('category')
+    if (display_type or category) and not is_valid_category(display_type, category):
+        abort(404)
+
+    tile = get_tile(z, x, y, sync_data_version(), display_type, category)
+    return Response(tile, mimetype='application/vnd.mapbox-vector-tile')
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    # Progress of a background refresh started by /update_all, with per-dataset timings and errors
+    job = db.session.get(IngestJob, job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job_to_dict(job))
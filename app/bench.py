@@ -0,0 +1,259 @@
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from flask import Flask, render_template
+from app import app, db
+from app.boundaries import clear_boundary_cache, get_boundaries, level_for_zoom, update_boundary_data
+from app.metrics import DISPLAY_CATEGORIES, DISPLAY_MODELS, MEASURE_LABELS
+from app.models import Observation
+from app.synthetic import REFERENCE_PERIOD, generate
+
+# Ward counts each benchmark is run at: a borough, a region, and the whole country
+BENCH_SIZES = (19, 600, 9000)
+
+# Rounds per benchmark; later rounds are skipped once one benchmark has run for MAX_TIME seconds
+ROUNDS = 5
+MAX_TIME = 5.0
+
+
+def build_fixtures(size, root):
+    # Synthetic boundaries and NOMIS files for `size` wards, as (boundary path, source dir)
+    return generate(size, root, periods=(REFERENCE_PERIOD,))[REFERENCE_PERIOD]
+
+
+def measure(func, setup=None, rounds=ROUNDS, max_time=MAX_TIME):
+    # pytest-benchmark style statistics, in seconds, over up to `rounds` timed calls.
+    # `setup` runs untimed before each call.
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < rounds and (not timings or time.perf_counter() - started < max_time):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {
+        'min': min(timings),
+        'max': max(timings),
+        'mean': statistics.fmean(timings),
+        'stddev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        'median': statistics.median(timings),
+        'rounds': len(timings),
+    }
+
+
+def median_ms(func, repeat):
+    # Median wall time of `repeat` calls, in milliseconds
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000
+
+
+def write_obs_file(path, count, template):
+    # Write a NOMIS-shaped file with `count` observations, one record at a time
+    with open(path, 'w') as file:
+        file.write('{"header": {}, "obs": [')
+        for number in range(count):
+            record = dict(template)
+            record['geography'] = dict(template['geography'], geogcode=f'E0{number // 6:07d}')
+            record['c2021_health_6'] = dict(template['c2021_health_6'], value=number % 6)
+            file.write((',' if number else '') + json.dumps(record))
+        file.write(']}')
+
+
+def peak_mb(func):
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+def _bench_app(database_path):
+    # A second Flask app sharing the models, so the benchmarks read and write a scratch
+    # database rather than the site's
+    bench_app = Flask(__name__)
+    bench_app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{database_path}'
+    db.init_app(bench_app)
+    return bench_app
+
+
+def run_size(size, rounds=ROUNDS, max_time=MAX_TIME, selected=None):
+    # Every benchmark at one ward count, as (group, name, stats) tuples
+    import folium
+    import pandas as pd
+    import plotly.express as px
+    import plotly.io as pio
+    from branca.colormap import LinearColormap
+    from app.charts import PLOTLY_CDN, bar_chart_html
+    from app.choropleth import WARD_STYLE, WardChoropleth
+    from app.ingest import DATASET_PARSERS, parse_dataset, write_dataset
+    from app.matrix import load_ward_matrix
+    from app.metrics import CATEGORY_ARGS
+    from app.views import CHART_SPECS, COLOR_SCALES
+
+    results = []
+
+    def bench(group, name, func, setup=None):
+        if selected and not any(pattern in f'{group}.{name}' for pattern in selected):
+            return
+        results.append((group, name, measure(func, setup, rounds, max_time)))
+
+    display_type, category = 'tenure', 'owns_outright'
+    label = category.replace('_', ' ').title()
+    scale = COLOR_SCALES[display_type]
+
+    with tempfile.TemporaryDirectory(prefix='wardbench-') as root:
+        boundary_path, source_dir = build_fixtures(size, root)
+        with _bench_app(os.path.join(root, 'bench.db')).app_context():
+            db.create_all()
+            clear_boundary_cache()
+            update_boundary_data(boundary_path)
+
+            # Each ingester: parse the synthetic files and write them into an emptied table
+            for name in DATASET_PARSERS:
+                def empty_dataset(name=name):
+                    DISPLAY_MODELS[name].query.delete()
+                    Observation.query.filter_by(dataset=name).delete()
+                    db.session.commit()
+
+                def ingest(name=name):
+                    rows, sources, _ = parse_dataset(name, None, source_dir)
+                    write_dataset(name, rows, sources)
+
+                bench('ingest', name, ingest, empty_dataset)
+                if not DISPLAY_MODELS[name].query.first():
+                    ingest()
+
+            def fetch_columns():
+                for display, model in DISPLAY_MODELS.items():
+                    columns = [getattr(model, column) for column in DISPLAY_CATEGORIES[display]]
+                    db.session.query(model.ward_code, model.ward_name, *columns).all()
+
+            bench('db', 'fetch_columns', fetch_columns)
+            bench('db', 'load_ward_matrix', load_ward_matrix)
+            matrix = load_ward_matrix()
+
+            bench('dict', 'values_for', lambda: matrix.values_for(display_type, category))
+            bench('dict', 'rows_for', lambda: matrix.rows_for(display_type, category))
+            values = matrix.values_for(display_type, category)
+
+            level = level_for_zoom(12)
+            get_boundaries(level)
+
+            def inject():
+                geo_json_data = get_boundaries(level)
+                for feature in geo_json_data['features']:
+                    ward_code = feature['properties'].get('WD23CD', None)
+                    if ward_code:
+                        feature['properties']['data_value'] = values.get(ward_code, 0.0)
+                return geo_json_data
+
+            bench('geojson', 'inject_values', inject)
+            geo_json_data = inject()
+            vmin, vmax = min(values.values()), max(values.values())
+
+        # Rendering needs nothing from the database
+        def folium_style_function():
+            m = folium.Map(location=[51.465, -0.02], zoom_start=12)
+            color_scale = LinearColormap([color for _, color in scale], vmin=vmin, vmax=vmax)
+            folium.GeoJson(
+                geo_json_data,
+                style_function=lambda feature: dict(WARD_STYLE, fillColor=color_scale(feature['properties'].get('data_value', 0))),
+                tooltip=folium.GeoJsonTooltip(fields=['WD23NM', 'data_value'], aliases=['Ward Name:', label + ': '], localize=True)
+            ).add_to(m)
+            color_scale.add_to(m)
+            return m._repr_html_()
+
+        def folium_client_styled():
+            m = folium.Map(location=[51.465, -0.02], zoom_start=12)
+            color_scale = LinearColormap([color for _, color in scale], vmin=vmin, vmax=vmax)
+            layer = WardChoropleth(f'/api/boundaries/{level}.geojson', values, scale, vmin, vmax, label=label).add_to(m)
+            color_scale.add_to(m)
+            return m._repr_html_(), layer.get_name()
+
+        bench('folium', 'style_function', folium_style_function)
+        bench('folium', 'client_styled', folium_client_styled)
+        map_html, map_layer = folium_client_styled()
+
+        df = pd.DataFrame([
+            {'ward_name': ward_name, 'value': value, 'category': category}
+            for ward_name, value in matrix.rows_for(display_type, category)
+        ]).sort_values('ward_name')
+
+        def px_bar():
+            fig = px.bar(
+                df, x='value', y='ward_name', color='value', color_continuous_scale=scale,
+                title=f'Ward {label}', labels={'ward_name': 'Ward Name', 'value': label}, orientation='h'
+            )
+            fig.update_layout(
+                yaxis_title='Ward Name', xaxis_title=label, autosize=True, height=600,
+                xaxis=dict(showgrid=False), yaxis=dict(showgrid=False, categoryorder="total ascending"),
+                plot_bgcolor='rgba(0,0,0,0)', margin=dict(l=0, r=0, t=40, b=0), showlegend=False
+            )
+            fig.update_traces(marker_line_width=0)
+            return pio.to_html(fig, full_html=False, include_plotlyjs='cdn')
+
+        def chart_spec():
+            return bar_chart_html(CHART_SPECS[display_type], label, df['ward_name'].tolist(), df['value'].tolist())
+
+        def table():
+            return df.drop(columns=['category'], errors='ignore').to_html(
+                classes="table table-striped table-bordered table-hover", index=False, justify="center"
+            )
+
+        bench('chart', 'px_bar_to_html', px_bar)
+        bench('chart', 'chart_spec', chart_spec)
+        bench('table', 'df_to_html', table)
+
+        fragments = {'map_html': map_html, 'graph_html': chart_spec(), 'table_html': table(), 'map_layer': map_layer}
+        with app.test_request_context(f'/wardprofile?display={display_type}&{CATEGORY_ARGS[display_type]}={category}'):
+            bench('template', 'wardprofile', lambda: render_template(
+                'wardprofile.html', display_type=display_type, category=category, category_args=CATEGORY_ARGS,
+                measure='count', measure_labels=MEASURE_LABELS, color_scales=COLOR_SCALES,
+                plotly_cdn=PLOTLY_CDN, **fragments
+            ))
+
+    clear_boundary_cache()
+    return results
+
+
+def machine_info():
+    return {
+        'node': platform.node(),
+        'processor': platform.processor(),
+        'machine': platform.machine(),
+        'python_implementation': platform.python_implementation(),
+        'python_version': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def run_benchmarks(sizes=BENCH_SIZES, rounds=ROUNDS, max_time=MAX_TIME, selected=None, progress=None):
+    # Results in pytest-benchmark's JSON layout, one entry per benchmark and ward count
+    benchmarks = []
+    for size in sizes:
+        for group, name, stats in run_size(size, rounds, max_time, selected):
+            benchmarks.append({
+                'group': group,
+                'name': f'{name}[{size}]',
+                'fullname': f'app/bench.py::{group}.{name}[{size}]',
+                'params': {'wards': size},
+                'stats': stats,
+            })
+            if progress:
+                progress(benchmarks[-1])
+    return {
+        'machine_info': machine_info(),
+        'datetime': datetime.now(timezone.utc).isoformat(),
+        'benchmarks': benchmarks,
+    }
@@ -0,0 +1,223 @@
+import json
+import logging
+import orjson
+import requests
+import shapely
+from shapely.geometry import mapping, shape
+from sqlalchemy.exc import SQLAlchemyError
+from app import db
+from app.models import WardBoundary, WardBoundaryLevel
+
+# ArcGIS FeatureServer query for the Lewisham ward boundaries (WD_MAY_2023_UK_BGC)
+ARCGIS_URL = (
+    "https://services1.arcgis.com/ESMARspQHYMw9BZ9/arcgis/rest/services/WD_MAY_2023_UK_BGC/FeatureServer/0/query?"
+    "where=LAD23NM%20%3D%20'LEWISHAM'&outFields=*&outSR=4326&f=geojson"
+)
+
+REQUEST_TIMEOUT = 30  # seconds
+
+# Region of the local authorities whose LAD23 code alone identifies it. The ward layer has no
+# region field, so other English authorities need RGN23CD/RGN23NM in the boundary source.
+REGION_BY_LAD_PREFIX = {
+    'E09': ('E12000007', 'London'),
+    'W06': ('W92000004', 'Wales'),
+    'S12': ('S92000003', 'Scotland'),
+    'N09': ('N92000002', 'Northern Ireland'),
+}
+
+# Geometry pyramid: simplification tolerance in degrees for each level.
+# Level 0 is the full-resolution geometry; higher levels are coarser.
+SIMPLIFY_LEVELS = {
+    1: 0.00002,  # ~2m, for street-level zooms
+    2: 0.0001,   # ~10m, borough view (zoom 12-13)
+    3: 0.0004,   # ~40m, city/region view
+}
+
+# In-process cache of (properties, geometry) pairs per level, filled on first use
+_boundary_cache = {}
+
+# Serialized ward code/name-only FeatureCollection per level, for the browser to fetch
+_boundary_json = {}
+
+
+class BoundaryStoreEmpty(RuntimeError):
+    pass
+
+
+def load_boundary_source(source=None):
+    # Load a GeoJSON FeatureCollection from a URL or a local file; ArcGIS by default
+    source = source or ARCGIS_URL
+    if source.startswith(('http://', 'https://')):
+        response = requests.get(source, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        data = response.json()
+    else:
+        with open(source, 'r') as file:
+            data = json.load(file)
+
+    if 'features' not in data:
+        raise ValueError(f"Invalid data structure in boundary source: {source}")
+
+    return data
+
+
+def update_boundary_data(source=None):
+    from app.utils import bulk_upsert
+    try:
+        data = load_boundary_source(source)
+
+        # Upsert one boundary per ward, keyed by WD23CD, in a single statement per batch
+        rows = {}
+        for feature in data['features']:
+            properties = feature.get('properties') or {}
+            ward_code = properties.get('WD23CD')
+            if not ward_code or not feature.get('geometry'):
+                continue
+
+            lad_code = properties.get('LAD23CD', '')
+            region_code, region_name = region_for(lad_code, properties.get('RGN23CD'), properties.get('RGN23NM'))
+            rows[ward_code] = {
+                'ward_code': ward_code,
+                'ward_name': properties.get('WD23NM', ward_code),
+                'lad_code': lad_code,
+                'lad_name': properties.get('LAD23NM', ''),
+                'region_code': region_code,
+                'region_name': region_name,
+                'properties': json.dumps(properties),
+                'geometry': json.dumps(feature['geometry']),
+            }
+        count = len(rows)
+        bulk_upsert(WardBoundary, list(rows.values()))
+
+        # Commit the changes to the database
+        db.session.commit()
+
+        # Precompute the simplified levels once, at ingest time
+        build_boundary_levels()
+        clear_boundary_cache()
+
+        # Wards may have moved between authorities, so rebuild every rollup
+        from app.rollups import refresh_rollups
+        refresh_rollups()
+        db.session.commit()
+        logging.info(f"Boundary data updated successfully ({count} wards).")
+        return count
+
+    except FileNotFoundError:
+        logging.error(f"File not found: {source}")
+    except json.JSONDecodeError:
+        logging.error(f"Error decoding JSON in boundary source: {source}")
+    except requests.RequestException as e:
+        logging.error(f"Error fetching boundary source: {e}")
+    except ValueError as ve:
+        logging.error(ve)
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logging.error(f"Database error: {e}")
+    return 0
+
+
+def region_for(lad_code, region_code=None, region_name=None):
+    # (region code, region name) for a ward, from the source when it has them
+    if region_code:
+        return region_code, region_name or region_code
+    return REGION_BY_LAD_PREFIX.get((lad_code or '')[:3], ('', ''))
+
+
+def simplify_coverage(geometries, tolerance):
+    # Simplify all wards together so shared borders stay shared (no gaps or overlaps)
+    return shapely.coverage_simplify([shape(geometry) for geometry in geometries], tolerance)
+
+
+def build_boundary_levels():
+    records = WardBoundary.query.order_by(WardBoundary.ward_code).all()
+    geometries = [json.loads(record.geometry) for record in records]
+
+    WardBoundaryLevel.query.delete()
+    for level, tolerance in SIMPLIFY_LEVELS.items():
+        simplified = simplify_coverage(geometries, tolerance)
+        for record, geometry in zip(records, simplified):
+            db.session.add(WardBoundaryLevel(
+                ward_code=record.ward_code,
+                level=level,
+                tolerance=tolerance,
+                geometry=json.dumps(mapping(geometry))
+            ))
+
+    db.session.commit()
+    logging.info(f"Built {len(SIMPLIFY_LEVELS)} simplified boundary levels for {len(records)} wards.")
+
+
+def level_for_zoom(zoom):
+    # Pick the coarsest level whose tolerance is still below one screen pixel at this zoom
+    pixel_degrees = 360.0 / (256 * 2 ** zoom)
+    level = 0
+    for candidate, tolerance in sorted(SIMPLIFY_LEVELS.items()):
+        if tolerance <= pixel_degrees:
+            level = candidate
+    return level
+
+
+def _load_boundaries(level):
+    if level == 0:
+        records = WardBoundary.query.order_by(WardBoundary.ward_code).all()
+        if not records:
+            # Never draw the map without real boundaries
+            raise BoundaryStoreEmpty("The ward boundary store is empty. Run 'flask ingest-boundaries'.")
+        return [(json.loads(record.properties), json.loads(record.geometry)) for record in records]
+
+    full = _get_level(0)
+    stored = {
+        record.ward_code: json.loads(record.geometry)
+        for record in WardBoundaryLevel.query.filter_by(level=level).all()
+    }
+    if stored:
+        return [(properties, stored.get(properties.get('WD23CD'), geometry)) for properties, geometry in full]
+
+    # Levels have not been built yet, simplify in-process once
+    simplified = simplify_coverage([geometry for _, geometry in full], SIMPLIFY_LEVELS[level])
+    return [(properties, mapping(geometry)) for (properties, _), geometry in zip(full, simplified)]
+
+
+def _get_level(level):
+    if level not in _boundary_cache:
+        _boundary_cache[level] = _load_boundaries(level)
+    return _boundary_cache[level]
+
+
+def get_boundaries(level=0):
+    # Return a fresh FeatureCollection; properties are copied so callers can add values to them
+    if level not in SIMPLIFY_LEVELS:
+        level = 0
+
+    return {
+        'type': 'FeatureCollection',
+        'features': [
+            {'type': 'Feature', 'properties': dict(properties), 'geometry': geometry}
+            for properties, geometry in _get_level(level)
+        ]
+    }
+
+
+def get_boundaries_json(level=0):
+    # The level's boundaries as GeoJSON bytes, with only the ward code and name kept
+    if level not in SIMPLIFY_LEVELS:
+        level = 0
+    if level not in _boundary_json:
+        _boundary_json[level] = orjson.dumps({
+            'type': 'FeatureCollection',
+            'features': [
+                {
+                    'type': 'Feature',
+                    'properties': {'WD23CD': properties.get('WD23CD'), 'WD23NM': properties.get('WD23NM')},
+                    'geometry': geometry
+                }
+                for properties, geometry in _get_level(level)
+            ]
+        })
+    return _boundary_json[level]
+
+
+def clear_boundary_cache():
+    _boundary_cache.clear()
+    _boundary_json.clear()
@@ -0,0 +1,119 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import app, db
+from app.boundaries import clear_boundary_cache
+from app.models import (
+    WardPopulation, WardGeneralHealth, WardOccupation, WardVehicles, WardTenures,
+    WardBoundary, WardBoundaryLevel, Observation, DataVersion
+)
+
+# Models whose changes invalidate anything rendered from them
+VERSIONED_MODELS = (
+    WardPopulation, WardGeneralHealth, WardOccupation, WardVehicles, WardTenures,
+    WardBoundary, WardBoundaryLevel, Observation
+)
+
+
+class RenderCache:
+    # Bounded LRU cache for rendered page fragments, with hit/miss counters
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+render_cache = RenderCache(maxsize=app.config.get('RENDER_CACHE_SIZE', 64))
+
+# Data version this process last rendered against
+_seen_version = None
+
+
+def get_data_version():
+    return db.session.query(DataVersion.version).filter_by(id=1).scalar() or 0
+
+
+def bump_data_version(session):
+    # Increment the shared data version inside the session's current transaction
+    with session.no_autoflush:
+        record = session.get(DataVersion, 1)
+    if record is None:
+        # The first bump on an empty table leaves a pending row the next bump must reuse
+        record = next((pending for pending in session.new if isinstance(pending, DataVersion)), None)
+    if record is None:
+        record = DataVersion(id=1, version=0)
+        session.add(record)
+    record.version = (record.version or 0) + 1
+    record.updated_at = datetime.utcnow()
+    session.info['data_version_bumped'] = True
+
+
+def sync_data_version():
+    # Read the shared data version and drop this worker's caches if another process changed the data
+    global _seen_version
+    version = get_data_version()
+    if version != _seen_version:
+        render_cache.clear()
+        clear_boundary_cache()
+        _seen_version = version
+    return version
+
+
+@event.listens_for(Session, 'before_flush')
+def _track_data_changes(session, flush_context, instances):
+    # Any committed change to ward data or boundaries bumps the version once per transaction
+    if session.info.get('data_version_bumped'):
+        return
+
+    changed = any(
+        isinstance(obj, VERSIONED_MODELS)
+        for obj in list(session.new) + list(session.deleted)
+    ) or any(
+        isinstance(obj, VERSIONED_MODELS) and session.is_modified(obj)
+        for obj in session.dirty
+    )
+    if changed:
+        bump_data_version(session)
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _reset_data_changes(session):
+    session.info.pop('data_version_bumped', None)
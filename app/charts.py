@@ -0,0 +1,76 @@
+import uuid
+import orjson
+import plotly.io as pio
+from plotly.offline import get_plotlyjs_version
+
+PLOTLY_CDN = f"https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"
+
+# Markup pio.to_html(fig, full_html=False, include_plotlyjs='cdn') wraps a figure in
+CHART_HTML = (
+    '<div><script type="text/javascript">window.PlotlyConfig = {MathJaxConfig: \'local\'};</script>'
+    '<script charset="utf-8" src="' + PLOTLY_CDN + '"></script>'
+    '<div id="%(id)s" class="plotly-graph-div" style="height:600px; width:100%%;"></div>'
+    '<script type="text/javascript">window.PLOTLYENV=window.PLOTLYENV || {};'
+    'if (document.getElementById("%(id)s")) {Plotly.newPlot("%(id)s", %(data)s, %(layout)s, {"responsive": true})};'
+    '</script></div>'
+)
+
+
+def build_chart_spec(color_scale):
+    # The horizontal bar chart of one display, laid out as px.bar drew it, with
+    # only the ward arrays and the category label left to fill in per render
+    return {
+        'trace': {
+            'type': 'bar',
+            'orientation': 'h',
+            'alignmentgroup': 'True',
+            'offsetgroup': '',
+            'legendgroup': '',
+            'name': '',
+            'showlegend': False,
+            'textposition': 'auto',
+            'xaxis': 'x',
+            'yaxis': 'y',
+            'marker': {'coloraxis': 'coloraxis', 'pattern': {'shape': ''}, 'line': {'width': 0}},
+        },
+        'layout': {
+            'template': pio.templates[pio.templates.default].to_plotly_json(),
+            'xaxis': {'anchor': 'y', 'domain': [0.0, 1.0], 'showgrid': False},
+            'yaxis': {
+                'anchor': 'x', 'domain': [0.0, 1.0], 'title': {'text': 'Ward Name'},
+                'showgrid': False, 'categoryorder': 'total ascending'
+            },
+            'coloraxis': {'colorscale': [list(stop) for stop in color_scale]},
+            'legend': {'tracegroupgap': 0},
+            'barmode': 'relative',
+            'margin': {'l': 0, 'r': 0, 't': 40, 'b': 0},
+            'autosize': True,
+            'height': 600,
+            'plot_bgcolor': 'rgba(0,0,0,0)',
+            'showlegend': False,
+        },
+    }
+
+
+def _to_json(value):
+    # orjson output made safe to embed in a <script> element
+    return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY).replace(b'</', b'<\\/').decode()
+
+
+def bar_chart_html(spec, label, names, values):
+    # Fill a chart spec with the wards (names and values in display order) and render it
+    trace = dict(
+        spec['trace'],
+        x=values,
+        y=names,
+        hovertemplate=f'{label}=%{{marker.color}}<br>Ward Name=%{{y}}<extra></extra>',
+        marker=dict(spec['trace']['marker'], color=values)
+    )
+    layout = spec['layout']
+    layout = dict(
+        layout,
+        title={'text': f'Ward {label}'},
+        xaxis=dict(layout['xaxis'], title={'text': label}),
+        coloraxis=dict(layout['coloraxis'], colorbar={'title': {'text': label}})
+    )
+    return CHART_HTML % {'id': uuid.uuid4(), 'data': _to_json([trace]), 'layout': _to_json(layout)}
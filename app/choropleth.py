@@ -0,0 +1,70 @@
+from branca.element import MacroElement
+from jinja2 import Template
+
+# Outline and opacity shared by every ward polygon
+WARD_STYLE = {
+    'color': 'black',
+    'weight': 1,
+    'dashArray': '5, 5',
+    'fillOpacity': 0.7,
+}
+
+
+class WardChoropleth(MacroElement):
+    # A ward GeoJSON layer styled in the browser. The map embeds only ward_code -> value
+    # and one colour definition: `scale` ((position, hex) stops, interpolated between vmin
+    # and vmax) or a `palette` the values index into. The geometry is fetched from
+    # `boundaries_url`, which the browser caches across renders, instead of being inlined
+    # with a style per feature as folium.GeoJson with a style_function does.
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.geoJson(null).addTo({{ this._parent.get_name() }});
+        (function (layer) {
+            var values = {{ this.values|tojson }}, scale = {{ this.scale|tojson }}, palette = {{ this.palette|tojson }};
+            var vmin = {{ this.vmin|tojson }}, vmax = {{ this.vmax|tojson }}, label = {{ this.label|tojson }};
+            function rgb(hex) {
+                var n = parseInt(hex.slice(1, 7), 16);
+                return [(n >> 16) & 255, (n >> 8) & 255, n & 255];
+            }
+            function color(value) {
+                var t = vmax > vmin ? (value - vmin) / (vmax - vmin) : 0;
+                for (var i = 1; i < scale.length; i++) {
+                    if (t <= scale[i][0] || i === scale.length - 1) {
+                        var f = Math.min(Math.max((t - scale[i - 1][0]) / (scale[i][0] - scale[i - 1][0]), 0), 1);
+                        var a = rgb(scale[i - 1][1]), b = rgb(scale[i][1]);
+                        return 'rgb(' + a.map(function (v, k) { return Math.round(v + (b[k] - v) * f); }).join(',') + ')';
+                    }
+                }
+                return scale[0][1];
+            }
+            layer.options.style = function (feature) {
+                var properties = feature.properties;
+                var value = values[properties.WD23CD];
+                if (!palette) properties.data_value = value === undefined ? 0 : value;
+                var fill = palette ? palette[value] || '#000000' : color(properties.data_value);
+                return Object.assign({fillColor: fill}, {{ this.style|tojson }});
+            };
+            layer.bindTooltip(function (feature) {
+                var properties = feature.feature.properties;
+                var text = '<b>Ward Name:</b> ' + properties.WD23NM;
+                if (label) text += '<br><b>' + label + ':</b> ' + Number(properties.data_value).toLocaleString();
+                return text;
+            }, {sticky: true, className: 'foliumtooltip'});
+            fetch({{ this.boundaries_url|tojson }})
+                .then(function (response) { return response.json(); })
+                .then(function (data) { layer.addData(data); });
+        })({{ this.get_name() }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, boundaries_url, values, scale=(), vmin=0, vmax=0, palette=None, label=None, style=WARD_STYLE):
+        super().__init__()
+        self._name = 'WardChoropleth'
+        self.boundaries_url = boundaries_url
+        self.values = values
+        self.scale = [list(stop) for stop in scale]
+        self.vmin = vmin
+        self.vmax = vmax
+        self.palette = palette
+        self.label = label
+        self.style = style
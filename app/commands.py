@@ -0,0 +1,409 @@
+import functools
+import json
+import os
+import tempfile
+import time
+import click
+from app import app, db
+from app.metrics import DISPLAY_MODELS
+
+
+def _count(written):
+    # A bulk_upsert row count for display; None means the database driver could not count
+    return '?' if written is None else written
+
+
+@app.cli.command('ingest-boundaries')
+@click.option('--source', default='arcgis', show_default=True,
+              help="GeoJSON file or URL to load; 'arcgis' fetches the Lewisham wards from the "
+                   "WD_MAY_2023_UK_BGC FeatureServer.")
+def ingest_boundaries(source):
+    """Load the ward boundaries into the local boundary store."""
+    from app.boundaries import ARCGIS_URL, update_boundary_data
+    if source == 'arcgis':
+        source = ARCGIS_URL
+    count = update_boundary_data(source)
+    if not count:
+        click.echo(f"No ward boundaries were loaded from {source}.")
+        raise SystemExit(1)
+    click.echo(f"Stored {count} ward boundaries.")
+
+
+@app.cli.command('ingest')
+@click.argument('datasets', nargs=-1, type=click.Choice(list(DISPLAY_MODELS)))
+@click.option('--dry-run', is_flag=True, help="Parse every dataset and report, without writing to the database.")
+@click.option('--workers', type=int, default=None,
+              help="Parser processes to run. Defaults to one per dataset, up to the CPU count.")
+@click.option('--force', is_flag=True, help="Parse every dataset, even if its source files are unchanged.")
+@click.option('--source-dir', default=None, type=click.Path(file_okay=False),
+              help="Read the NOMIS files from this directory (laid out like app/static/json), "
+                   "e.g. the cache written by flask fetch-nomis.")
+def ingest(datasets, dry_run, workers, force, source_dir):
+    """Parse the NOMIS datasets in parallel and write them to the database.
+
+    Pass dataset names (population, health, occupation, tenure, vehicles) to ingest only those.
+    Datasets whose source files have the same content hash as at the last ingest are skipped.
+    """
+    from app.ingest import run_ingest
+
+    start = time.perf_counter()
+    report = run_ingest(datasets, dry_run=dry_run, workers=workers, force=force, source_dir=source_dir)
+    total = time.perf_counter() - start
+
+    from app.utils import add_written
+
+    click.echo(f"{'dataset':<11} {'rows':>7} {'written':>8} {'parse s':>8} {'write s':>8}  status")
+    for name, result in report.items():
+        if result['error']:
+            status = f"error: {result['error']}"
+        elif result['skipped']:
+            status = 'unchanged'
+        else:
+            status = 'parsed' if dry_run else 'ok'
+        click.echo(
+            f"{name:<11} {result['rows']:>7} {_count(result['written']):>8} {result['parse_s']:>8.3f} "
+            f"{result['write_s']:>8.3f}  {status}"
+        )
+    click.echo(
+        f"{sum(result['rows'] for result in report.values())} rows parsed, "
+        f"{_count(functools.reduce(add_written, (result['written'] for result in report.values()), 0))} "
+        f"written in {total:.3f} s"
+        + (" (dry run)" if dry_run else "")
+    )
+    if any(result['error'] for result in report.values()):
+        raise SystemExit(1)
+
+
+@app.cli.command('refresh-rollups')
+@click.argument('datasets', nargs=-1, type=click.Choice(list(DISPLAY_MODELS)))
+def refresh_rollups_command(datasets):
+    """Rebuild the local authority and region rollups from the ward tables."""
+    from app.rollups import refresh_rollups
+
+    written = refresh_rollups(datasets)
+    db.session.commit()
+    click.echo(f"Wrote {_count(written)} rollup rows.")
+
+
+@app.cli.command('ingest-observations')
+@click.argument('file_path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--dataset', required=True, help="Name to store the observations under.")
+@click.option('--dimension', default=None,
+              help="NOMIS dimension holding the category, e.g. c2021_health_6. "
+                   "Without one, every value is stored under the dataset name.")
+@click.option('--period', default=None, help="Period to store. Defaults to the file's NOMIS time value.")
+def ingest_observations(file_path, dataset, dimension, period):
+    """Load any NOMIS JSON file into the long-format observation table."""
+    from app.models import Observation
+    from app.utils import OBSERVATION_KEY, bulk_upsert, parse_observations
+
+    rows = parse_observations(file_path, dataset, dimension, period)
+    written = bulk_upsert(Observation, rows, key=OBSERVATION_KEY)
+    db.session.commit()
+    click.echo(f"Parsed {len(rows)} observations, wrote {_count(written)}.")
+
+
+@app.cli.command('fetch-nomis')
+@click.argument('datasets', nargs=-1, type=click.Choice(list(DISPLAY_MODELS)))
+@click.option('--geography', default=None,
+              help="NOMIS geography ids or ranges (e.g. 641734706...641734724) to query instead of "
+                   "Lewisham's wards. Census tables and population estimates use different ward ids.")
+@click.option('--out', 'out_dir', default=None, type=click.Path(file_okay=False),
+              help="Directory to write the responses to. Defaults to instance/nomis.")
+@click.option('--concurrency', default=4, show_default=True, help="Requests in flight at once.")
+@click.option('--api-url', default=None, help="NOMIS dataset API base URL.")
+def fetch_nomis_command(datasets, geography, out_dir, concurrency, api_url):
+    """Download the NOMIS source files from the NOMIS API into a local cache."""
+    from app.nomis import NOMIS_API_URL, fetch_nomis
+
+    start = time.perf_counter()
+    report = fetch_nomis(datasets, geography, out_dir, api_url or NOMIS_API_URL, concurrency)
+    total = time.perf_counter() - start
+
+    click.echo(f"{'file':<38} {'pages':>6} {'obs':>8} {'seconds':>8}  status")
+    for relative_path, result in sorted(report.items()):
+        status = f"error: {result['error']}" if result['error'] else 'ok'
+        click.echo(
+            f"{relative_path:<38} {result['pages']:>6} {result['observations']:>8} "
+            f"{result['seconds']:>8.3f}  {status}"
+        )
+    click.echo(f"{sum(result['observations'] for result in report.values())} observations in {total:.3f} s")
+    if any(result['error'] for result in report.values()):
+        raise SystemExit(1)
+
+
+@app.cli.command('prerender')
+@click.option('--workers', type=int, default=None, help="Render processes to run. Defaults to the CPU count.")
+@click.option('--out', 'out_dir', default=None, type=click.Path(file_okay=False),
+              help="Directory to write the files to. Defaults to PRERENDER_DIR (instance/prerender).")
+def prerender(workers, out_dir):
+    """Render every display/category/measure view to fingerprinted static HTML and JSON files.
+
+    Run after ingesting; with SERVE_PRERENDERED set, wardprofile serves these files
+    for as long as the data version they were rendered from is current.
+    """
+    from app.prerender import prerender_views, run_prerender
+
+    started = time.perf_counter()
+    with click.progressbar(length=len(prerender_views()), label='Rendering') as bar:
+        manifest = run_prerender(workers, out_dir, progress=lambda key, files: bar.update(1))
+    click.echo(
+        f"Rendered {len(manifest['views'])} views for data version {manifest['data_version']} "
+        f"in {time.perf_counter() - started:.1f} s"
+    )
+
+
+@app.cli.command('synthesize')
+@click.option('--wards', default=9000, show_default=True, help="Synthetic wards to generate.")
+@click.option('--periods', default='2011,2021', show_default=True, help="Comma-separated census years.")
+@click.option('--seed', default=0, show_default=True, help="Random seed; the same arguments give the same files.")
+@click.option('--out', 'out_dir', default=None, type=click.Path(file_okay=False),
+              help="Directory to write to, one subdirectory per period. Defaults to instance/synthetic.")
+def synthesize(wards, periods, seed, out_dir):
+    """Generate synthetic ward boundaries and NOMIS files for any number of wards.
+
+    Each period's directory is laid out like app/static/json, with the polygons in
+    boundaries/wards.geojson, so it can be loaded with ingest-boundaries --source and
+    ingest --source-dir. Later periods redraw and recode the wards of some authorities.
+    """
+    from app.synthetic import generate
+
+    started = time.perf_counter()
+    written = generate(
+        wards, out_dir, [int(period) for period in periods.split(',')], seed,
+        progress=lambda period, redrawn: click.echo(f"{period}: {wards} wards, {redrawn} redrawn")
+    )
+    for period, (boundary_path, source_dir) in written.items():
+        click.echo(f"flask ingest-boundaries --source {boundary_path} && flask ingest --source-dir {source_dir}")
+    click.echo(f"Generated {len(written)} periods in {time.perf_counter() - started:.1f} s")
+
+
+@app.cli.command('compress-static')
+@click.option('--force', is_flag=True, help="Rewrite every variant, even if it is up to date.")
+def compress_static(force):
+    """Write precompressed .br and .gz variants of the static data files and styles.css."""
+    from app.responses import precompress_static
+
+    report = precompress_static(force)
+    click.echo(f"{'file':<45} {'KB':>8} {'br KB':>8} {'gzip KB':>8}")
+    for path, size, sizes in report:
+        click.echo(f"{path:<45} {size / 1024:>8.1f} {sizes['br'] / 1024:>8.1f} {sizes['gzip'] / 1024:>8.1f}")
+
+
+@app.cli.command('boundary-report')
+@click.option('--repeat', default=5, show_default=True, help="Renders to time per level.")
+def boundary_report(repeat):
+    """Report payload size and map render time for each boundary level."""
+    import folium
+    import shapely
+    from shapely.geometry import shape
+    from app.boundaries import SIMPLIFY_LEVELS, get_boundaries
+
+    click.echo(f"{'level':>5} {'tolerance':>10} {'vertices':>9} {'geojson KB':>11} {'map KB':>8} {'render ms':>10}")
+    for level in [0] + sorted(SIMPLIFY_LEVELS):
+        geo_json_data = get_boundaries(level)
+        vertices = sum(
+            len(shapely.get_coordinates(shape(feature['geometry'])))
+            for feature in geo_json_data['features']
+        )
+        payload = len(json.dumps(geo_json_data))
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            m = folium.Map(location=[51.465, -0.02], zoom_start=12)
+            folium.GeoJson(geo_json_data).add_to(m)
+            map_html = m._repr_html_()
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+
+        click.echo(
+            f"{level:>5} {SIMPLIFY_LEVELS.get(level, 0):>10} {vertices:>9} {payload / 1024:>11.1f} "
+            f"{len(map_html) / 1024:>8.1f} {timings[len(timings) // 2] * 1000:>10.1f}"
+        )
+
+
+@app.cli.command('bench-ward-data')
+@click.option('--repeat', default=50, show_default=True, help="Runs to time per approach.")
+def bench_ward_data(repeat):
+    """Compare per-request ward data access: five query.all() calls versus the ward matrix."""
+    from app.bench import median_ms
+    from app.cache import get_data_version
+    from app.matrix import get_ward_matrix, load_ward_matrix
+    from app.metrics import DISPLAY_CATEGORIES
+
+    def query_all_and_build_maps():
+        # What wardprofile did per request before the matrix: every row of every model,
+        # then one dict per category
+        for display_type, model in DISPLAY_MODELS.items():
+            rows = model.query.all()
+            {category: {row.ward_code: getattr(row, category) for row in rows}
+             for category in DISPLAY_CATEGORIES[display_type]}
+        db.session.expire_all()
+
+    def matrix_column():
+        get_ward_matrix(get_data_version()).values_for('health', 'residentsBadHealth')
+
+    results = {
+        'query.all() + dicts': median_ms(query_all_and_build_maps, repeat),
+        'matrix reload': median_ms(load_ward_matrix, repeat),
+        'matrix column read': median_ms(matrix_column, repeat),
+    }
+    for name, median in results.items():
+        click.echo(f"{name:<22} {median:>8.3f} ms")
+
+
+@app.cli.command('bench')
+@click.option('--sizes', default='19,600,9000', show_default=True, help="Comma-separated synthetic ward counts.")
+@click.option('--rounds', default=5, show_default=True, help="Timed rounds per benchmark.")
+@click.option('--max-time', default=5.0, show_default=True, help="Seconds after which a benchmark stops adding rounds.")
+@click.option('-k', 'selected', multiple=True, help="Only run benchmarks whose group.name contains this.")
+@click.option('--json', 'json_path', default=None, type=click.Path(dir_okay=False),
+              help="Also write the results as pytest-benchmark style JSON.")
+def bench(sizes, rounds, max_time, selected, json_path):
+    """Benchmark the ingest and wardprofile hot paths at several synthetic ward counts.
+
+    Runs offline: synthetic boundaries and NOMIS files are generated for each ward
+    count and loaded into a scratch database, leaving the site's database untouched.
+    """
+    from app.bench import run_benchmarks
+
+    def report(benchmark):
+        stats = benchmark['stats']
+        click.echo(
+            f"{benchmark['group'] + '.' + benchmark['name']:<34} {stats['min'] * 1000:>10.3f} {stats['max'] * 1000:>10.3f} "
+            f"{stats['mean'] * 1000:>10.3f} {stats['stddev'] * 1000:>10.3f} {stats['median'] * 1000:>10.3f} {stats['rounds']:>6}"
+        )
+
+    click.echo(f"{'Name (time in ms)':<34} {'Min':>10} {'Max':>10} {'Mean':>10} {'StdDev':>10} {'Median':>10} {'Rounds':>6}")
+    results = run_benchmarks(
+        [int(size) for size in sizes.split(',')], rounds, max_time, selected, progress=report
+    )
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+        click.echo(f"Wrote {len(results['benchmarks'])} results to {json_path}")
+
+
+@app.cli.command('loadtest')
+@click.option('--wards', default=9000, show_default=True, help="Synthetic wards to serve.")
+@click.option('--concurrency', default='1,2,4,8,16,32', show_default=True, help="Comma-separated client counts.")
+@click.option('--duration', default=10.0, show_default=True, help="Seconds each concurrency level runs for.")
+@click.option('--warmup', default=5.0, show_default=True, help="Seconds of untimed requests before the first level.")
+@click.option('--workers', type=int, default=None, help="Override the Procfile's worker count.")
+@click.option('--worker-class', default=None, help="Override the worker class, e.g. gthread or gevent.")
+@click.option('--threads', type=int, default=None, help="Threads per worker, for the gthread class.")
+@click.option('--seed', default=0, show_default=True, help="Seed for the synthetic data and the request mix.")
+@click.option('--env', 'settings', multiple=True, help="FLASK_ setting for the workers, e.g. FLASK_SERVE_PRERENDERED=true.")
+@click.option('--json', 'json_path', default=None, type=click.Path(dir_okay=False), help="Also write the report as JSON.")
+def loadtest(wards, concurrency, duration, warmup, workers, worker_class, threads, seed, settings, json_path):
+    """Load test the app under the Procfile's gunicorn command, at increasing concurrency.
+
+    Runs offline: synthetic data is loaded into a scratch database, with the boundaries
+    fetched from a local stand-in for the ArcGIS FeatureServer, and the site's database
+    is left untouched. Reports throughput, latency percentiles, worker RSS and errors.
+    """
+    from app.loadtest import run_loadtest
+
+    def report(level):
+        latency = level['latency_ms']
+        click.echo(
+            f"{level['concurrency']:>7} {level['requests']:>8} {level['throughput_rps']:>8.1f} {latency['p50']:>8.1f} "
+            f"{latency['p95']:>8.1f} {latency['p99']:>8.1f} {level['error_rate'] * 100:>7.2f} "
+            f"{level['worker_rss_mb']['max']:>8.1f}"
+        )
+
+    env = dict(setting.split('=', 1) for setting in settings)
+    click.echo(f"{'clients':>7} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors%':>7} {'RSS MB':>8}")
+    try:
+        results = run_loadtest(
+            wards, [int(clients) for clients in concurrency.split(',')], duration, warmup, workers,
+            worker_class, threads, seed, env, progress=report
+        )
+    except RuntimeError as e:
+        click.echo(f"Load test failed: {e}")
+        raise SystemExit(1)
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+        click.echo(f"Wrote {len(results['levels'])} levels to {json_path}")
+
+
+@app.cli.command('bench-chart')
+@click.option('--repeat', default=20, show_default=True, help="Renders to time per approach.")
+@click.option('--wards', default=0, help="Synthetic wards to chart instead of the stored ones.")
+def bench_chart(repeat, wards):
+    """Compare bar chart rendering: px.bar with pio.to_html versus the precompiled chart spec."""
+    import plotly.express as px
+    import plotly.io as pio
+    import pandas as pd
+    from app.bench import median_ms
+    from app.charts import bar_chart_html
+    from app.matrix import get_ward_matrix
+    from app.views import CHART_SPECS, COLOR_SCALES
+
+    if wards:
+        rows = [(f'Ward {number:05d}', number * 7 % 1000) for number in range(wards)]
+    else:
+        rows = get_ward_matrix().rows_for('tenure', 'owns_outright')
+    df = pd.DataFrame([{'ward_name': name, 'value': value, 'category': 'owns_outright'} for name, value in rows])
+    df = df.sort_values('ward_name')
+    label = 'Owns Outright'
+
+    def plotly_express():
+        # The per-request chart code wardprofile used before the chart specs
+        fig = px.bar(
+            df[df['category'] == 'owns_outright'], x='value', y='ward_name', color='value',
+            color_continuous_scale=COLOR_SCALES['tenure'], title=f'Ward {label}',
+            labels={'ward_name': 'Ward Name', 'value': label}, orientation='h'
+        )
+        fig.update_layout(
+            yaxis_title='Ward Name', xaxis_title=label, autosize=True, height=600,
+            xaxis=dict(showgrid=False), yaxis=dict(showgrid=False, categoryorder="total ascending"),
+            plot_bgcolor='rgba(0,0,0,0)', margin=dict(l=0, r=0, t=40, b=0), showlegend=False
+        )
+        fig.update_traces(marker_line_width=0)
+        return pio.to_html(fig, full_html=False, include_plotlyjs='cdn')
+
+    def chart_spec():
+        return bar_chart_html(CHART_SPECS['tenure'], label, df['ward_name'].tolist(), df['value'].tolist())
+
+    click.echo(f"{len(df)} wards")
+    for name, func in (('px.bar + pio.to_html', plotly_express), ('chart spec + orjson', chart_spec)):
+        click.echo(f"{name:<22} {median_ms(func, repeat):>8.3f} ms {len(func()) / 1024:>8.1f} KB")
+
+
+@app.cli.command('bench-ingest-memory')
+@click.option('--sizes', default='1000,10000,100000', show_default=True,
+              help="Comma-separated observation counts to test.")
+def bench_ingest_memory(sizes):
+    """Compare peak memory of json.load() against the streaming NOMIS parser as files grow."""
+    from app.bench import peak_mb, write_obs_file
+    from app.utils import GENERAL_HEALTH_FILE, iter_observations
+
+    with open(GENERAL_HEALTH_FILE, 'r') as file:
+        template = json.load(file)['obs'][0]
+
+    def load_whole(path):
+        totals = {}
+        with open(path, 'r') as file:
+            for item in json.load(file)['obs']:
+                ward_code = item['geography']['geogcode']
+                totals[ward_code] = totals.get(ward_code, 0) + item['obs_value']['value']
+
+    def stream(path):
+        totals = {}
+        for ward_code, _, _, value in iter_observations(path, 'c2021_health_6'):
+            totals[ward_code] = totals.get(ward_code, 0) + value
+
+    click.echo(f"{'observations':>12} {'file MB':>8} {'json.load MB':>13} {'streaming MB':>13} {'aggregate MB':>13}")
+    with tempfile.TemporaryDirectory() as directory:
+        for count in [int(size) for size in sizes.split(',')]:
+            path = os.path.join(directory, f'obs_{count}.json')
+            write_obs_file(path, count, template)
+            # The aggregate dict itself grows with the ward count; report it so the parser's own share is visible
+            aggregate = peak_mb(lambda: {f'E0{n // 6:07d}': 0 for n in range(count)})
+            click.echo(
+                f"{count:>12} {os.path.getsize(path) / 1024 / 1024:>8.1f} "
+                f"{peak_mb(lambda: load_whole(path)):>13.1f} {peak_mb(lambda: stream(path)):>13.1f} {aggregate:>13.1f}"
+            )
@@ -0,0 +1,58 @@
+import numpy as np
+from app.metrics import DATASET_TOTALS, DISPLAY_CATEGORIES, MEASURES
+
+# Measures worked out from the counts; 'count' is read straight from the ward tables
+DERIVED_MEASURES = [measure for measure in MEASURES if measure != 'count']
+
+
+def _divide(numerator, denominator, scale):
+    # numerator / denominator * scale, with 0 where the denominator is 0
+    denominator = np.broadcast_to(denominator, numerator.shape)
+    result = np.zeros(numerator.shape, dtype=np.float64)
+    np.divide(numerator * scale, denominator, out=result, where=denominator > 0)
+    return result
+
+
+def compute_derived_metrics(matrix):
+    # measure -> ward x column array aligned with matrix.values, computed for every
+    # category at once. Rank, percentile and z-score are taken over the share, among
+    # the wards that have data for the display; other wards are left at 0.
+    values = matrix.values
+    derived = {measure: np.zeros_like(values) for measure in DERIVED_MEASURES}
+
+    residents = matrix.column('population', 'total_population')[:, None]
+    derived['rate'] = _divide(values, residents, 1000)
+
+    for display_type, categories in DISPLAY_CATEGORIES.items():
+        positions = [matrix.column_index[(display_type, category)] for category in categories]
+        rows = np.flatnonzero(matrix.present[display_type])
+        count = len(rows)
+        if not count:
+            continue
+        block = values[np.ix_(rows, positions)]
+
+        total = DATASET_TOTALS.get(display_type)
+        if total:
+            total_position = categories.index(total)
+            totals = block[:, total_position]
+            share = _divide(block, totals[:, None], 100)
+            # The total itself is shared out across the wards instead
+            share[:, total_position] = _divide(totals, totals.sum(), 100)
+        else:
+            share = _divide(block, block.sum(axis=1, keepdims=True), 100)
+
+        ranked = np.sort(share, axis=0)
+        rank = np.empty_like(share)
+        percentile = np.empty_like(share)
+        for column in range(share.shape[1]):
+            # 1 is the highest share and ties share the best rank; the percentile is the
+            # percentage of wards with a share at or below this one
+            rank[:, column] = count - np.searchsorted(ranked[:, column], share[:, column], side='right') + 1
+            percentile[:, column] = np.searchsorted(ranked[:, column], share[:, column], side='right')
+        percentile = _divide(percentile, np.float64(count), 100)
+        zscore = _divide(share - share.mean(axis=0), share.std(axis=0), 1)
+
+        for measure, block in (('share', share), ('rank', rank), ('percentile', percentile), ('zscore', zscore)):
+            derived[measure][np.ix_(rows, positions)] = block
+    return derived
+
@@ -0,0 +1,137 @@
+import csv
+import io
+from sqlalchemy import func, select, union
+from app import app, db
+from app.metrics import DISPLAY_CATEGORIES, DISPLAY_MODELS
+
+# Rows fetched from the cursor, and written out, per chunk
+app.config.setdefault('EXPORT_CHUNK_SIZE', 5000)
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+
+def export_columns(datasets):
+    return ['ward_code', 'ward_name'] + [category for dataset in datasets for category in DISPLAY_CATEGORIES[dataset]]
+
+
+def export_query(datasets):
+    # One row per ward found in any of the datasets, each dataset's categories left-joined
+    # on (null where the ward has no row for it), ordered by ward code. The name comes
+    # from the first dataset that has the ward.
+    models = [DISPLAY_MODELS[dataset] for dataset in datasets]
+    wards = union(*(select(model.ward_code) for model in models)).subquery()
+    query = select(
+        wards.c.ward_code,
+        func.coalesce(*(model.ward_name for model in models)) if len(models) > 1 else models[0].ward_name,
+        *(getattr(DISPLAY_MODELS[dataset], category) for dataset in datasets for category in DISPLAY_CATEGORIES[dataset])
+    ).select_from(wards)
+    for model in models:
+        query = query.outerjoin(model, model.ward_code == wards.c.ward_code)
+    return query.order_by(wards.c.ward_code)
+
+
+def iter_export_chunks(datasets):
+    # Lists of row tuples read through a server-side cursor, EXPORT_CHUNK_SIZE at a time,
+    # so only one chunk is held in memory however many wards there are
+    chunk_size = app.config['EXPORT_CHUNK_SIZE']
+    result = db.session.execute(export_query(datasets).execution_options(stream_results=True, yield_per=chunk_size))
+    try:
+        for partition in result.partitions(chunk_size):
+            yield partition
+    finally:
+        result.close()
+
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only file object that hands back whatever has been written since the last
+    # drain(), letting the Arrow/Parquet writers stream into a response generator
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def stream_csv(datasets):
+    columns = export_columns(datasets)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in iter_export_chunks(datasets):
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _record_batch(schema, rows):
+    import pyarrow as pa
+
+    columns = list(zip(*rows))
+    return pa.record_batch([pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema)
+
+
+def _arrow_schema(datasets):
+    import pyarrow as pa
+
+    columns = export_columns(datasets)
+    return pa.schema(
+        [pa.field('ward_code', pa.string(), nullable=False), pa.field('ward_name', pa.string())]
+        + [pa.field(column, pa.int64()) for column in columns[2:]]
+    )
+
+
+def stream_arrow(datasets):
+    # Arrow IPC stream: the schema, then one record batch per chunk
+    import pyarrow as pa
+
+    schema = _arrow_schema(datasets)
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        yield sink.drain()
+        for rows in iter_export_chunks(datasets):
+            writer.write_batch(_record_batch(schema, rows))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def stream_parquet(datasets):
+    # Parquet with one row group per chunk; the footer goes out last
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(datasets)
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for rows in iter_export_chunks(datasets):
+            writer.write_batch(_record_batch(schema, rows))
+            yield sink.drain()
+    yield sink.drain()
+
+
+EXPORT_WRITERS = {
+    'csv': stream_csv,
+    'parquet': stream_parquet,
+    'arrow': stream_arrow,
+}
@@ -0,0 +1,176 @@
+import os
+import time
+import hashlib
+import logging
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from sqlalchemy.exc import SQLAlchemyError
+from app import db
+from app.metrics import DISPLAY_CATEGORIES, DISPLAY_MODELS
+from app.models import Observation, SourceFile
+from app.rollups import has_rollups, refresh_rollups
+from app.utils import (NOMIS_JSON_DIR, GENERAL_HEALTH_FILE, OCCUPATION_FILE, POPULATION_FILES, TENURE_FILE,
+                       VEHICLES_FILE, OBSERVATION_KEY, bulk_upsert, observation_rows, read_extracted, read_period,
+                       parse_population_data, parse_general_health_data, parse_occupation_data, parse_tenure_data,
+                       parse_vehicle_availability_data)
+
+# Parser for each NOMIS dataset, keyed like DISPLAY_MODELS
+DATASET_PARSERS = {
+    'population': parse_population_data,
+    'health': parse_general_health_data,
+    'occupation': parse_occupation_data,
+    'tenure': parse_tenure_data,
+    'vehicles': parse_vehicle_availability_data,
+}
+
+# What each parser is given: a file path, or for population a category -> file path dict
+DATASET_SOURCES = {
+    'population': POPULATION_FILES,
+    'health': GENERAL_HEALTH_FILE,
+    'occupation': OCCUPATION_FILE,
+    'tenure': TENURE_FILE,
+    'vehicles': VEHICLES_FILE,
+}
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def describe_source(file_path):
+    # Content hash, NOMIS extract timestamp and period of a source file; all None if it is missing
+    if not os.path.exists(file_path):
+        return {'path': file_path, 'content_hash': None, 'extracted': None, 'period': None}
+
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    try:
+        extracted = read_extracted(file_path)
+        period = read_period(file_path)
+    except Exception:
+        extracted = period = None
+    return {'path': file_path, 'content_hash': digest.hexdigest(), 'extracted': extracted, 'period': period}
+
+
+def dataset_source(name, source_dir=None):
+    # The dataset's parser argument, with the files moved from app/static/json to source_dir
+    # (e.g. the NOMIS fetch cache, which uses the same layout)
+    def relocate(file_path):
+        return os.path.join(source_dir, os.path.relpath(file_path, NOMIS_JSON_DIR)) if source_dir else file_path
+
+    source = DATASET_SOURCES[name]
+    if isinstance(source, dict):
+        return {key: relocate(file_path) for key, file_path in source.items()}
+    return relocate(source)
+
+
+def dataset_files(name, source_dir=None):
+    source = dataset_source(name, source_dir)
+    return list(source.values()) if isinstance(source, dict) else [source]
+
+
+def parse_dataset(name, known_hashes=None, source_dir=None):
+    # Runs in a worker process: hash the dataset's files and, unless every one matches
+    # `known_hashes`, parse them into rows. Rows are None when the dataset is unchanged.
+    started = time.perf_counter()
+    sources = [describe_source(file_path) for file_path in dataset_files(name, source_dir)]
+    unchanged = known_hashes is not None and all(
+        source['content_hash'] is not None and known_hashes.get(source['path']) == source['content_hash']
+        for source in sources
+    )
+    rows = None if unchanged else DATASET_PARSERS[name](dataset_source(name, source_dir))
+    return rows, sources, time.perf_counter() - started
+
+
+def get_known_hashes():
+    return {source.path: source.content_hash for source in SourceFile.query.all()}
+
+
+def record_sources(name, sources):
+    # Remember what was ingested, so the next run can skip files that have not changed
+    for source in sources:
+        if source['content_hash'] is None:
+            continue
+        record = SourceFile.query.filter_by(path=source['path']).first() or SourceFile(path=source['path'])
+        record.dataset = name
+        record.content_hash = source['content_hash']
+        record.extracted = source['extracted']
+        record.ingested_at = datetime.utcnow()
+        db.session.add(record)
+
+
+def write_dataset(name, rows, sources=()):
+    # Upsert one parsed dataset into its ward table and the long-format observation table,
+    # refresh its LAD/region rollups if any ward row changed (or the driver cannot tell), and
+    # record its sources, all committed as a single transaction. Only rows whose values differ
+    # are written (see bulk_upsert); returns their count, or None when it is unknown.
+    period = next((source['period'] for source in sources if source.get('period')), 'latest')
+    try:
+        written = bulk_upsert(DISPLAY_MODELS[name], rows)
+        bulk_upsert(Observation, observation_rows(name, rows, DISPLAY_CATEGORIES[name], period), key=OBSERVATION_KEY)
+        if written != 0 or not has_rollups(name):
+            refresh_rollups([name])
+        record_sources(name, sources)
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+        raise
+    return written
+
+
+def _collect_dataset(name, future, result, dry_run):
+    # Fill in one dataset's report from its finished parse, writing the rows unless dry_run
+    try:
+        rows, sources, parse_s = future.result()
+    except Exception as e:
+        logging.error(f"Failed to parse {name} data: {e}")
+        result['error'] = str(e)
+        return
+
+    result['parse_s'] = parse_s
+    if rows is None:
+        result['skipped'] = True
+        return
+
+    result['rows'] = len(rows)
+    if dry_run:
+        return
+
+    started = time.perf_counter()
+    try:
+        result['written'] = write_dataset(name, rows, sources)
+    except SQLAlchemyError as e:
+        logging.error(f"Database error: {e}")
+        result['error'] = str(e)
+    result['write_s'] = time.perf_counter() - started
+
+
+def run_ingest(datasets=None, dry_run=False, workers=None, force=False, progress=None, source_dir=None):
+    # Parse the datasets in a process pool and funnel the rows back to this process,
+    # which is the only one writing to the database. Datasets are written as soon as
+    # their parse finishes; those whose source files are unchanged since the last
+    # ingest are skipped unless `force` is set. A dry run parses every dataset and writes
+    # nothing. Returns a report per dataset: rows parsed, rows written, parse and write
+    # seconds, whether it was skipped, and the error if the dataset failed. `progress(name, result)` is called as each dataset finishes.
+    # `source_dir` reads the files from another directory laid out like app/static/json.
+    # Workers are spawned rather than forked: the refresh job calls this from a background
+    # thread, and a forked child can inherit locks other threads were holding.
+    datasets = list(datasets or DATASET_PARSERS)
+    report = {
+        name: {'rows': 0, 'written': 0, 'parse_s': 0.0, 'write_s': 0.0, 'skipped': False, 'error': None}
+        for name in datasets
+    }
+    if not datasets:
+        return report
+
+    known_hashes = None if force or dry_run else get_known_hashes()
+    workers = workers or min(len(datasets), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn')) as executor:
+        futures = {executor.submit(parse_dataset, name, known_hashes, source_dir): name for name in datasets}
+        for future in as_completed(futures):
+            name = futures[future]
+            _collect_dataset(name, future, report[name], dry_run)
+            if progress:
+                progress(name, report[name])
+    return report
@@ -0,0 +1,113 @@
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.exc import IntegrityError
+from app import app, db
+from app.ingest import DATASET_PARSERS, run_ingest
+from app.models import IngestJob
+
+app.config.setdefault('JOB_TIMEOUT', 3600)  # seconds without a heartbeat before a job is treated as abandoned
+
+ACTIVE_SLOT = 1
+HEARTBEAT_INTERVAL = 30  # seconds between heartbeats while a stage reports progress
+
+# One background thread per worker process; refreshes never run side by side
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ingest-job')
+
+
+def get_active_job():
+    # The queued or running refresh, if any: the job holding the active slot. Jobs are kept
+    # in the database so every gunicorn worker sees them; one whose heartbeat (or, while queued,
+    # creation) is older than JOB_TIMEOUT lost its worker to a kill or restart, and is marked
+    # failed rather than blocking new refreshes forever.
+    job = IngestJob.query.filter_by(active_slot=ACTIVE_SLOT).first()
+    if job and (job.heartbeat_at or job.created_at) < datetime.utcnow() - timedelta(seconds=app.config['JOB_TIMEOUT']):
+        job.status = 'failed'
+        job.error = 'Job abandoned'
+        job.finished_at = datetime.utcnow()
+        job.active_slot = None
+        db.session.commit()
+        return None
+    return job
+
+
+def enqueue_refresh():
+    # Start a refresh of every dataset in the background, or hand back the one already
+    # in progress. Returns (job, created). The database holds the single active slot, so
+    # when two workers race here the loser's insert fails and it returns the winner's job.
+    while True:
+        job = get_active_job()
+        if job:
+            return job, False
+
+        job = IngestJob(
+            id=uuid.uuid4().hex, status='queued', total=len(DATASET_PARSERS), completed=0, active_slot=ACTIVE_SLOT
+        )
+        db.session.add(job)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Already queued by another request
+            db.session.rollback()
+            continue
+        _executor.submit(run_job, job.id)
+        return job, True
+
+
+def run_job(job_id):
+    with app.app_context():
+        job = db.session.get(IngestJob, job_id)
+        job.status = 'running'
+        job.started_at = job.heartbeat_at = datetime.utcnow()
+        db.session.commit()
+
+        report = {}
+
+        def heartbeat(force=False):
+            # Show the job is still alive, so a long refresh is not taken for an abandoned one
+            now = datetime.utcnow()
+            if force or now - job.heartbeat_at >= timedelta(seconds=HEARTBEAT_INTERVAL):
+                job.heartbeat_at = now
+                db.session.commit()
+
+        def progress(name, result):
+            report[name] = result
+            job.completed = len(report)
+            job.report = json.dumps(report)
+            heartbeat(force=True)
+
+        try:
+            run_ingest(progress=progress)
+            if app.config['SERVE_PRERENDERED']:
+                # Pages stored for the old data are no longer served; render the new ones
+                from app.prerender import run_prerender
+                run_prerender(progress=lambda key, files: heartbeat())
+            failed = [name for name, result in report.items() if result['error']]
+            job.status = 'failed' if failed else 'finished'
+            if failed:
+                job.error = f"Failed datasets: {', '.join(failed)}"
+        except Exception as e:
+            logging.error(f"Refresh job {job_id} failed: {e}")
+            db.session.rollback()
+            job.status = 'failed'
+            job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        job.active_slot = None
+        db.session.commit()
+
+
+def job_to_dict(job):
+    return {
+        'id': job.id,
+        'status': job.status,
+        'total': job.total,
+        'completed': job.completed,
+        'datasets': json.loads(job.report) if job.report else {},
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'heartbeat_at': job.heartbeat_at.isoformat() if job.heartbeat_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
@@ -0,0 +1,353 @@
+import os
+import random
+import shlex
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+import numpy as np
+import orjson
+import requests
+from app import app
+from app.bench import machine_info
+from app.boundaries import ARCGIS_URL
+from app.metrics import CATEGORY_ARGS, DISPLAY_CATEGORIES, MEASURES
+from app.synthetic import REFERENCE_PERIOD, generate
+
+# Repository root, holding the Procfile and the migrations
+ROOT_DIR = os.path.dirname(app.root_path)
+PROCFILE = os.path.join(ROOT_DIR, 'Procfile')
+
+# Concurrency levels stepped through, and the seconds each one (and the warm-up) runs for
+CONCURRENCY = (1, 2, 4, 8, 16, 32)
+DURATION = 10.0
+WARMUP = 5.0
+
+REQUEST_TIMEOUT = 60  # seconds
+STARTUP_TIMEOUT = 120  # seconds for gunicorn to answer its first request
+RSS_INTERVAL = 0.5  # seconds between worker memory samples
+
+# Share of requests of each kind: wardprofile pages, and the values and boundary fetches the
+# page makes when the user switches category in place
+REQUEST_MIX = {'page': 0.7, 'values': 0.2, 'boundaries': 0.1}
+
+# Share of page and values requests for a derived measure rather than the count
+DERIVED_SHARE = 0.2
+
+
+def request_paths(rng, count):
+    # `count` request paths drawn from REQUEST_MIX. A page is the landing view a third of the
+    # time, otherwise any display, with its first (default) category twice as likely as the rest.
+    displays = list(DISPLAY_CATEGORIES)
+    kinds = list(REQUEST_MIX)
+    paths = []
+    for _ in range(count):
+        kind = rng.choices(kinds, weights=[REQUEST_MIX[kind] for kind in kinds])[0]
+        display = rng.choice(displays)
+        categories = DISPLAY_CATEGORIES[display]
+        category = rng.choices(categories, weights=[2] + [1] * (len(categories) - 1))[0]
+        measure = rng.choice(MEASURES[1:]) if rng.random() < DERIVED_SHARE else 'count'
+        if kind == 'boundaries':
+            paths.append((kind, '/api/boundaries/2.geojson'))
+        elif kind == 'values':
+            paths.append((kind, f'/api/wards/{display}/{category}?measure={measure}'))
+        elif rng.random() < 1 / 3:
+            paths.append((kind, '/wardprofile'))
+        else:
+            query = {'display': display, CATEGORY_ARGS[display]: category, 'measure': measure}
+            paths.append((kind, f'/wardprofile?{urlencode(query)}'))
+    return paths
+
+
+def gunicorn_command(port, workers=None, worker_class=None, threads=None):
+    # The Procfile's web command with $PORT filled in and the given worker settings replaced,
+    # run with this interpreter's gunicorn
+    with open(PROCFILE) as f:
+        command = next(line.split(':', 1)[1] for line in f if line.startswith('web:'))
+    args = shlex.split(command.replace('$PORT', str(port)))
+    for flags, value in ((('-w', '--workers'), workers), (('-k', '--worker-class'), worker_class),
+                         (('--threads',), threads)):
+        if value is None:
+            continue
+        position = next((position for position, arg in enumerate(args) if arg in flags), None)
+        if position is None:
+            args[1:1] = [flags[-1], str(value)]
+        else:
+            args[position + 1] = str(value)
+    return [sys.executable, '-m'] + args if args[0] == 'gunicorn' else args
+
+
+class ArcGISStub(ThreadingHTTPServer):
+    # Stand-in for the ArcGIS FeatureServer query endpoint, answering from a local GeoJSON file.
+    # Supports the two `where` clauses we send: 1=1 and LAD23NM = '<name>' (case-insensitive).
+
+    def __init__(self, boundary_path):
+        with open(boundary_path, 'rb') as f:
+            self.features = orjson.loads(f.read())['features']
+        self.requests = 0
+        super().__init__(('127.0.0.1', 0), ArcGISHandler)
+
+    @property
+    def url(self):
+        # ARCGIS_URL pointed at this server, asking for every ward
+        parts = urlsplit(ARCGIS_URL)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        query['where'] = '1=1'
+        return f'http://127.0.0.1:{self.server_port}{parts.path}?{urlencode(query)}'
+
+
+class ArcGISHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if not parts.path.endswith('/FeatureServer/0/query'):
+            self.send_error(404)
+            return
+        self.server.requests += 1
+        where = parse_qs(parts.query).get('where', ['1=1'])[0].strip()
+        features = self.server.features
+        if where.upper().startswith('LAD23NM'):
+            name = where.split('=', 1)[1].strip().strip("'").upper()
+            features = [feature for feature in features if feature['properties'].get('LAD23NM', '').upper() == name]
+        body = orjson.dumps({'type': 'FeatureCollection', 'features': features})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/geo+json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def worker_pids(master_pid):
+    # Gunicorn's worker processes: the children of the master, from /proc
+    pids = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    # The parent pid is the second field after the parenthesised command name
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == master_pid:
+                        pids.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                continue
+    return sorted(pids)
+
+
+def rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+class RSSSampler(threading.Thread):
+    # Peak resident memory of each worker while a level runs, sampled every RSS_INTERVAL seconds
+
+    def __init__(self, master_pid):
+        super().__init__(daemon=True)
+        self.master_pid = master_pid
+        self.peaks = {}
+        self.stopped = threading.Event()
+
+    def sample(self):
+        for pid in worker_pids(self.master_pid):
+            self.peaks[pid] = max(self.peaks.get(pid, 0.0), rss_mb(pid))
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.sample()
+            self.stopped.wait(RSS_INTERVAL)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        self.sample()
+        return self.peaks
+
+
+def run_level(base_url, paths, concurrency, duration):
+    # Closed loop: `concurrency` clients each send their next request as soon as the last
+    # one completes, for `duration` seconds. Returns (kind, status, seconds, bytes) per request;
+    # status is None when the request failed outright.
+    results = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(number):
+        session = requests.Session()
+        session.headers['Accept-Encoding'] = 'gzip, deflate, br'
+        done = []
+        position = number
+        while time.perf_counter() < deadline:
+            kind, path = paths[position % len(paths)]
+            position += concurrency
+            start = time.perf_counter()
+            try:
+                response = session.get(base_url + path, timeout=REQUEST_TIMEOUT, stream=True)
+                size = len(response.raw.read(decode_content=False))
+                done.append((kind, response.status_code, time.perf_counter() - start, size))
+            except requests.RequestException:
+                done.append((kind, None, time.perf_counter() - start, 0))
+        with lock:
+            results.extend(done)
+
+    threads = [threading.Thread(target=client, args=(number,)) for number in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - started
+
+
+def summarize(results, elapsed):
+    # Throughput, latency percentiles in milliseconds and error counts for a batch of results.
+    # Failed requests and 5xx responses count as errors.
+    latencies = np.array([seconds for _, _, seconds, _ in results]) * 1000
+    statuses = {}
+    for _, status, _, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(1 for _, status, _, _ in results if status is None or status >= 500)
+    percentiles = np.percentile(latencies, [50, 95, 99]) if len(latencies) else [0.0, 0.0, 0.0]
+    return {
+        'requests': len(results),
+        'errors': errors,
+        'error_rate': errors / len(results) if results else 0.0,
+        'throughput_rps': len(results) / elapsed if elapsed else 0.0,
+        'bytes_per_request': sum(size for _, _, _, size in results) / len(results) if results else 0.0,
+        'latency_ms': {
+            'p50': float(percentiles[0]),
+            'p95': float(percentiles[1]),
+            'p99': float(percentiles[2]),
+            'mean': float(latencies.mean()) if len(latencies) else 0.0,
+            'max': float(latencies.max()) if len(latencies) else 0.0,
+        },
+        'status_counts': statuses,
+    }
+
+
+def _run(args, env, log):
+    # One flask command against the scratch database, failing loudly
+    completed = subprocess.run(args, cwd=ROOT_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    if completed.returncode:
+        raise RuntimeError(f"{' '.join(args[2:])} exited with status {completed.returncode}")
+
+
+def _wait_ready(process, base_url, log_path):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            with open(log_path) as f:
+                tail = f.read()[-2000:]
+            raise RuntimeError(f"gunicorn exited with status {process.returncode}:\n{tail}")
+        try:
+            if requests.get(base_url + '/wardprofile', timeout=REQUEST_TIMEOUT).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"gunicorn did not answer within {STARTUP_TIMEOUT} s")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def run_loadtest(wards=9000, concurrency=CONCURRENCY, duration=DURATION, warmup=WARMUP, workers=None,
+                 worker_class=None, threads=None, seed=0, env=None, progress=None):
+    # Generate `wards` synthetic wards, load them into a scratch database (the boundaries through
+    # the ArcGIS stub), start the Procfile's gunicorn on it and step through the concurrency
+    # levels. `env` adds FLASK_-prefixed settings for the workers, e.g. FLASK_SERVE_PRERENDERED.
+    # Returns the report as a dict; `progress` is called with each level's entry.
+    rng = random.Random(seed)
+    paths = request_paths(rng, 10000)
+
+    with tempfile.TemporaryDirectory(prefix='wardload-') as root:
+        started = time.perf_counter()
+        boundary_path, source_dir = generate(wards, root, periods=(REFERENCE_PERIOD,), seed=seed)[REFERENCE_PERIOD]
+        stub = ArcGISStub(boundary_path)
+        threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+        port = _free_port()
+        worker_env = dict(
+            os.environ, FLASK_APP='app', PORT=str(port),
+            FLASK_SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(root, 'site.db')}",
+            FLASK_PRERENDER_DIR=os.path.join(root, 'prerender'),
+        )
+        worker_env.update(env or {})
+        log_path = os.path.join(root, 'server.log')
+        command = gunicorn_command(port, workers, worker_class, threads)
+        with open(log_path, 'w') as log:
+            flask = [sys.executable, '-m', 'flask']
+            _run(flask + ['db', 'upgrade'], worker_env, log)
+            _run(flask + ['ingest-boundaries', '--source', stub.url], worker_env, log)
+            _run(flask + ['ingest', '--source-dir', source_dir], worker_env, log)
+            if worker_env.get('FLASK_SERVE_PRERENDERED', '').lower() == 'true':
+                _run(flask + ['prerender'], worker_env, log)
+            setup_s = time.perf_counter() - started
+
+            process = subprocess.Popen(command, cwd=ROOT_DIR, env=worker_env, stdout=log, stderr=subprocess.STDOUT)
+            base_url = f'http://127.0.0.1:{port}'
+            try:
+                _wait_ready(process, base_url, log_path)
+                levels = []
+                if warmup:
+                    run_level(base_url, paths, len(worker_pids(process.pid)) or 1, warmup)
+                for clients in concurrency:
+                    sampler = RSSSampler(process.pid)
+                    sampler.start()
+                    results, elapsed = run_level(base_url, paths, clients, duration)
+                    peaks = sampler.stop()
+                    level = dict(summarize(results, elapsed), concurrency=clients, seconds=elapsed)
+                    level['by_kind'] = {
+                        kind: summarize([result for result in results if result[0] == kind], elapsed)
+                        for kind in REQUEST_MIX
+                    }
+                    level['worker_rss_mb'] = {
+                        'max': max(peaks.values(), default=0.0),
+                        'total': sum(peaks.values()),
+                        'workers': [peaks[pid] for pid in sorted(peaks)],
+                    }
+                    levels.append(level)
+                    if progress:
+                        progress(level)
+            finally:
+                process.send_signal(signal.SIGTERM)
+                try:
+                    process.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                stub.shutdown()
+                stub.server_close()
+
+    return {
+        'machine_info': machine_info(),
+        'datetime': datetime.now(timezone.utc).isoformat(),
+        'config': {
+            'command': [os.path.basename(command[0])] + command[1:],
+            'wards': wards,
+            'seed': seed,
+            'duration_s': duration,
+            'warmup_s': warmup,
+            'request_mix': REQUEST_MIX,
+            'derived_share': DERIVED_SHARE,
+            'env': dict(env or {}),
+            'setup_s': setup_s,
+            'arcgis_requests': stub.requests,
+        },
+        'levels': levels,
+    }
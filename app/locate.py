@@ -0,0 +1,70 @@
+import numpy as np
+import shapely
+from shapely.geometry import shape
+from app.boundaries import get_boundaries
+
+# Spatial index over the full-resolution ward polygons, per data version
+_locate_index = {}
+
+
+def get_locate_index(version):
+    # (STRtree, prepared polygons, ward codes, grid cell size in degrees). A new version's
+    # index is built aside and swapped in whole, so other threads never see a half-empty cache.
+    global _locate_index
+    index = _locate_index.get(version)
+    if index is None:
+        features = get_boundaries(0)['features']
+        geometries = np.array([shape(feature['geometry']) for feature in features])
+        shapely.prepare(geometries)
+        ward_codes = np.array([feature['properties'].get('WD23CD') for feature in features], dtype=object)
+
+        # Points are bucketed into square cells about half a typical ward across,
+        # so each cell's box overlaps only a handful of wards
+        bounds = shapely.bounds(geometries)
+        extent = np.median(np.maximum(bounds[:, 2] - bounds[:, 0], bounds[:, 3] - bounds[:, 1]))
+        cell_size = float(extent) / 2 if len(features) else 1.0
+
+        index = (shapely.STRtree(geometries), geometries, ward_codes, cell_size)
+        _locate_index = {version: index}
+    return index
+
+
+def locate_points(lats, lons, version):
+    # Ward code for each (lat, lon), or None outside every ward; a point on a shared border
+    # goes to the first ward found. Building a shapely Point per input would dominate the
+    # run time for large batches, so points are grouped into grid cells, the STRtree is
+    # queried once with the occupied cells' boxes, and the candidate (point, ward) pairs
+    # are tested with one vectorized intersects_xy call against the prepared polygons.
+    tree, geometries, ward_codes, cell_size = get_locate_index(version)
+    x = np.asarray(lons, dtype=np.float64)
+    y = np.asarray(lats, dtype=np.float64)
+    matches = np.full(len(x), -1, dtype=np.int64)
+
+    valid = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    if len(valid) and len(geometries):
+        cell_x = np.floor(x[valid] / cell_size).astype(np.int64)
+        cell_y = np.floor(y[valid] / cell_size).astype(np.int64)
+        cells, first, cell_of_point = np.unique(cell_x * 2 ** 31 + cell_y, return_index=True, return_inverse=True)
+        boxes = shapely.box(
+            cell_x[first] * cell_size, cell_y[first] * cell_size,
+            (cell_x[first] + 1) * cell_size, (cell_y[first] + 1) * cell_size
+        )
+        cell_index, ward_index = tree.query(boxes)
+
+        # Expand each (cell, ward) candidate to every point in that cell
+        order = valid[np.argsort(cell_of_point, kind='stable')]
+        counts = np.bincount(cell_of_point, minlength=len(cells))
+        starts = np.cumsum(counts) - counts
+        pair_counts = counts[cell_index]
+        offsets = np.arange(pair_counts.sum()) - np.repeat(np.cumsum(pair_counts) - pair_counts, pair_counts)
+        point_index = order[np.repeat(starts[cell_index], pair_counts) + offsets]
+        ward_index = np.repeat(ward_index, pair_counts)
+
+        hit = shapely.intersects_xy(geometries[ward_index], x[point_index], y[point_index])
+        # Assign in reverse so the first match for a point is the one that sticks
+        matches[point_index[hit][::-1]] = ward_index[hit][::-1]
+
+    located = np.full(len(x), None, dtype=object)
+    found = matches >= 0
+    located[found] = ward_codes[matches[found]]
+    return located.tolist()
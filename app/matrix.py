@@ -0,0 +1,118 @@
+import threading
+import numpy as np
+from app import db
+from app.cache import get_data_version
+from app.derived import compute_derived_metrics
+from app.metrics import DISPLAY_CATEGORIES, DISPLAY_MODELS
+
+
+class WardMatrix:
+    # Ward x metric values held as one float64 array, with a ward_code -> row index.
+    # Columns are keyed by (display, category); `present` marks which wards each display has rows for.
+    # `derived` holds the same layout for each derived measure (share, rate, ...), see app.derived.
+
+    def __init__(self, ward_codes, ward_names, columns, values, present):
+        self.ward_codes = ward_codes
+        self.ward_names = ward_names
+        self.columns = columns
+        self.values = values
+        self.present = present
+        self.derived = {}
+        self.index = {ward_code: row for row, ward_code in enumerate(ward_codes)}
+        self.column_index = {column: position for position, column in enumerate(columns)}
+
+    def column(self, display_type, category, measure='count'):
+        values = self.values if measure == 'count' else self.derived[measure]
+        return values[:, self.column_index[(display_type, category)]]
+
+    def values_for(self, display_type, category, measure='count'):
+        # ward_code -> value for the wards that have data for this display
+        column = self.column(display_type, category, measure)
+        rows = np.flatnonzero(self.present[display_type])
+        return {self.ward_codes[row]: _to_python(column[row]) for row in rows}
+
+    def rows_for(self, display_type, category, measure='count'):
+        # (ward_name, value) pairs for the wards that have data for this display
+        column = self.column(display_type, category, measure)
+        rows = np.flatnonzero(self.present[display_type])
+        return [(self.ward_names[row], _to_python(column[row])) for row in rows]
+
+    def profile(self, ward_code):
+        # display -> category -> value for one ward, covering the displays it has data for
+        row = self.index.get(ward_code)
+        if row is None:
+            return {}
+        profile = {}
+        for position, (display_type, category) in enumerate(self.columns):
+            if self.present[display_type][row]:
+                profile.setdefault(display_type, {})[category] = _to_python(self.values[row, position])
+        return profile
+
+
+def _to_python(value):
+    return int(value) if float(value).is_integer() else float(value)
+
+
+def load_ward_matrix():
+    # One query per model, reading every metric column at once
+    fetched = {}
+    ward_names = {}
+    for display_type, model in DISPLAY_MODELS.items():
+        columns = [getattr(model, category) for category in DISPLAY_CATEGORIES[display_type]]
+        rows = db.session.query(model.ward_code, model.ward_name, *columns).all()
+        fetched[display_type] = rows
+        for row in rows:
+            ward_names.setdefault(row[0], row[1])
+
+    ward_codes = sorted(ward_names)
+    index = {ward_code: row for row, ward_code in enumerate(ward_codes)}
+    columns = [
+        (display_type, category)
+        for display_type in DISPLAY_MODELS
+        for category in DISPLAY_CATEGORIES[display_type]
+    ]
+    values = np.zeros((len(ward_codes), len(columns)), dtype=np.float64)
+    present = {}
+
+    position = 0
+    for display_type, rows in fetched.items():
+        width = len(DISPLAY_CATEGORIES[display_type])
+        present[display_type] = np.zeros(len(ward_codes), dtype=bool)
+        if rows:
+            row_index = np.array([index[row[0]] for row in rows])
+            values[row_index, position:position + width] = np.array([row[2:] for row in rows], dtype=np.float64)
+            present[display_type][row_index] = True
+        position += width
+
+    matrix = WardMatrix(ward_codes, [ward_names[code] for code in ward_codes], columns, values, present)
+
+    # Derived measures are worked out from the counts in one vectorized pass per data version
+    matrix.derived = compute_derived_metrics(matrix)
+    return matrix
+
+
+# One matrix per worker process, reloaded when the data version moves
+_matrix = None
+_matrix_version = None
+_matrix_lock = threading.Lock()
+
+
+def get_ward_matrix(version=None):
+    global _matrix, _matrix_version
+    if version is None:
+        version = get_data_version()
+    if _matrix is None or _matrix_version != version:
+        with _matrix_lock:
+            if _matrix is None or _matrix_version != version:
+                _matrix = load_ward_matrix()
+                _matrix_version = version
+    return _matrix
+
+
+def get_category_values(display_type, category, version=None, measure='count'):
+    return get_ward_matrix(version).values_for(display_type, category, measure)
+
+
+def get_ward_names(version=None):
+    matrix = get_ward_matrix(version)
+    return dict(zip(matrix.ward_codes, matrix.ward_names))
@@ -0,0 +1,58 @@
+from app.models import WardPopulation, WardGeneralHealth, WardOccupation, WardTenures, WardVehicles
+
+# Categories available for each themed display; the first one is the default
+DISPLAY_CATEGORIES = {
+    'population': ['total_population', 'population_under_15', 'population_age_16_24',
+                   'population_age_25_49', 'population_age_50_64', 'population_over_65'],
+    'health': ['usual_residents', 'residentsGoodHealth', 'residentsFairHealth',
+               'residentsBadHealth', 'residentVeryBadHealth'],
+    'occupation': ['managers_directors_senior_officials', 'professional_occupations',
+                   'associate_professional_technical', 'administrative_secretarial', 'skilled_trades',
+                   'caring_leisure_service', 'sales_customer_service', 'process_plant_machine_operatives',
+                   'elementary_occupations'],
+    'tenure': ['owns_outright', 'owns_with_mortgage', 'shared_ownership', 'rents_council',
+               'other_social_rented', 'rents_private_landlord', 'other_private_rented', 'lives_rent_free'],
+    'vehicles': ['no_cars_vans', 'one_car_van', 'two_cars_vans', 'three_or_more_cars_vans'],
+}
+
+# Measures for every category; 'count' is the raw value and the rest are derived from the counts.
+# Shares are a percentage of the ward's total for the dataset; rates are per 1,000 residents
+# (total_population); rank, percentile and z-score compare the share across wards.
+MEASURES = ['count', 'share', 'rate', 'rank', 'percentile', 'zscore']
+MEASURE_LABELS = {
+    'count': 'Count',
+    'share': '% Share',
+    'rate': 'Per 1,000 Residents',
+    'rank': 'Rank',
+    'percentile': 'Percentile',
+    'zscore': 'Z-score',
+}
+
+# Column holding each dataset's ward total; datasets without one use the sum of their categories
+DATASET_TOTALS = {
+    'population': 'total_population',
+    'health': 'usual_residents',
+}
+
+# Query-string argument that carries the category for each display
+CATEGORY_ARGS = {
+    'population': 'age_category',
+    'health': 'health_category',
+    'occupation': 'occupation_category',
+    'tenure': 'tenure_category',
+    'vehicles': 'vehicle_category',
+}
+
+# Model holding the columns for each display
+DISPLAY_MODELS = {
+    'population': WardPopulation,
+    'health': WardGeneralHealth,
+    'occupation': WardOccupation,
+    'tenure': WardTenures,
+    'vehicles': WardVehicles,
+}
+
+
+def is_valid_category(display_type, category):
+    return category in DISPLAY_CATEGORIES.get(display_type, [])
+
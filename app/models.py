@@ -1,3 +1,4 @@
+from datetime import datetime
 from app import db
 
 class WardPopulation(db.Model):
@@ -61,4 +62,99 @@ class WardTenures(db.Model):
     other_social_rented = db.Column(db.Integer, nullable=False)
     rents_private_landlord = db.Column(db.Integer, nullable=False)
     other_private_rented = db.Column(db.Integer, nullable=False)
-    lives_rent_free = db.Column(db.Integer, nullable=False)
\ No newline at end of file
+    lives_rent_free = db.Column(db.Integer, nullable=False)
+
+class WardBoundary(db.Model):
+    __tablename__ = 'ward_boundary'
+    id = db.Column(db.Integer, primary_key=True)
+    ward_code = db.Column(db.String(100), nullable=False, unique=True)
+    ward_name = db.Column(db.String(100), nullable=False)
+    lad_code = db.Column(db.String(100), nullable=False)
+    lad_name = db.Column(db.String(100), nullable=False)
+    region_code = db.Column(db.String(100))  # RGN23CD, blank when it cannot be derived
+    region_name = db.Column(db.String(100))
+    properties = db.Column(db.Text, nullable=False)  # ArcGIS feature properties as JSON
+    geometry = db.Column(db.Text, nullable=False)  # GeoJSON geometry in EPSG:4326
+
+
+class WardBoundaryLevel(db.Model):
+    __tablename__ = 'ward_boundary_level'
+    __table_args__ = (db.UniqueConstraint('ward_code', 'level'),)
+    id = db.Column(db.Integer, primary_key=True)
+    ward_code = db.Column(db.String(100), nullable=False)
+    level = db.Column(db.Integer, nullable=False)  # 1 = finest simplified level
+    tolerance = db.Column(db.Float, nullable=False)  # simplification tolerance in degrees
+    geometry = db.Column(db.Text, nullable=False)  # simplified GeoJSON geometry
+
+
+class DataVersion(db.Model):
+    __tablename__ = 'data_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)  # bumped whenever ward data changes
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class SourceFile(db.Model):
+    __tablename__ = 'source_file'
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String(255), unique=True, nullable=False)
+    dataset = db.Column(db.String(50), nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)  # SHA-256 of the file as last ingested
+    extracted = db.Column(db.String(32))  # NOMIS header.extracted timestamp
+    ingested_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class IngestJob(db.Model):
+    __tablename__ = 'ingest_job'
+    __table_args__ = (
+        db.Index('uq_ingest_job_active_slot', 'active_slot', unique=True),
+    )
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex, handed back to the client
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, finished or failed
+    total = db.Column(db.Integer, nullable=False, default=0)  # datasets to ingest
+    completed = db.Column(db.Integer, nullable=False, default=0)  # datasets done so far
+    report = db.Column(db.Text)  # per-dataset report from run_ingest, as JSON
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # last sign of life from the running job
+    finished_at = db.Column(db.DateTime)
+    # 1 while the job is queued or running and NULL afterwards, so the unique index
+    # admits a single active job however many workers try to queue one
+    active_slot = db.Column(db.Integer)
+
+
+class Observation(db.Model):
+    # One value per (dataset, category, period, ward) in long format, so a new NOMIS table
+    # needs no schema change. The unique key doubles as the index for "every ward for one
+    # category and period"; ix_observation_ward serves one ward's values across categories.
+    __tablename__ = 'observation'
+    __table_args__ = (
+        db.UniqueConstraint('dataset', 'category', 'period', 'ward_code', name='uq_observation_key'),
+        db.Index('ix_observation_ward', 'ward_code', 'dataset', 'period'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    dataset = db.Column(db.String(50), nullable=False)
+    category = db.Column(db.String(100), nullable=False)
+    ward_code = db.Column(db.String(100), nullable=False)
+    period = db.Column(db.String(20), nullable=False)  # NOMIS time value, e.g. 2021
+    value = db.Column(db.Float)
+
+
+class AreaRollup(db.Model):
+    # Ward values summed to local authority ('lad') and region level, one row per
+    # (level, dataset, category, area), so a higher-level map or total is a single lookup
+    __tablename__ = 'area_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('level', 'dataset', 'category', 'area_code', name='uq_area_rollup_key'),
+        db.Index('ix_area_rollup_area', 'level', 'area_code'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    level = db.Column(db.String(20), nullable=False)
+    dataset = db.Column(db.String(50), nullable=False)
+    category = db.Column(db.String(100), nullable=False)
+    area_code = db.Column(db.String(100), nullable=False)
+    area_name = db.Column(db.String(100), nullable=False)
+    value = db.Column(db.Float)
+    ward_count = db.Column(db.Integer, nullable=False)
+
@@ -0,0 +1,156 @@
+import json
+import os
+import time
+import logging
+import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from app import app
+
+NOMIS_API_URL = 'https://www.nomisweb.co.uk/api/v01/dataset'
+
+REQUEST_TIMEOUT = 30  # seconds
+RECORD_LIMIT = 25000  # NOMIS caps a single response at 25,000 observations
+MAX_CONCURRENCY = 4
+MAX_RETRIES = 5
+BACKOFF_FACTOR = 0.5  # retries wait 0.5s, 1s, 2s, ...
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+app.config.setdefault('NOMIS_CACHE_DIR', os.path.join(app.instance_path, 'nomis'))
+
+# Lewisham's wards in the two NOMIS geography types the source files were queried with
+CENSUS_WARDS = '641734706...641734724'  # 2023 wards, Census 2021 tables
+ESTIMATE_WARDS = '729813882...729813900'  # wards in the mid-year population estimates
+OUTPUT_AREA = '629161292'  # E00016654, which the bundled total_population query also asked for
+
+# The query behind each NOMIS source file, keyed by its path under app/static/json.
+# These are the header `uri`s of the bundled files, with the geography left open.
+NOMIS_QUERIES = {
+    'general_health/general_health.json': {
+        'dataset': 'health', 'table': 'NM_2055_1', 'geography': CENSUS_WARDS,
+        'params': {'date': 'latest', 'c2021_health_6': '0...5', 'measures': '20100'},
+    },
+    'occupation/occupation.json': {
+        'dataset': 'occupation', 'table': 'NM_2080_1', 'geography': CENSUS_WARDS,
+        'params': {'date': 'latest', 'c2021_occ_10': '1...9', 'measures': '20100'},
+    },
+    'tenures/tenures.json': {
+        'dataset': 'tenure', 'table': 'NM_2072_1', 'geography': CENSUS_WARDS,
+        'params': {'date': 'latest', 'c2021_tenure_9': '1...8', 'measures': '20100'},
+    },
+    'vehicles/vehicle_availability.json': {
+        'dataset': 'vehicles', 'table': 'NM_2063_1', 'geography': CENSUS_WARDS,
+        'params': {'date': 'latest', 'c2021_cars_5': '1...4', 'measures': '20100'},
+    },
+    'population/total_population.json': {
+        'dataset': 'population', 'table': 'NM_2014_1', 'geography': f'{OUTPUT_AREA},{ESTIMATE_WARDS}',
+        'params': {'date': 'latest', 'gender': '0', 'c_age': '200', 'measures': '20100'},
+    },
+    'population/population_under_15.json': {
+        'dataset': 'population', 'table': 'NM_2014_1', 'geography': ESTIMATE_WARDS,
+        'params': {'date': 'latest', 'gender': '0', 'c_age': '201', 'measures': '20100'},
+    },
+    'population/population_16_24.json': {
+        'dataset': 'population', 'table': 'NM_2014_1', 'geography': ESTIMATE_WARDS,
+        'params': {'date': 'latest', 'gender': '0', 'c_age': '250', 'measures': '20100'},
+    },
+    'population/population_25_49.json': {
+        'dataset': 'population', 'table': 'NM_2014_1', 'geography': ESTIMATE_WARDS,
+        'params': {'date': 'latest', 'gender': '0', 'c_age': '207', 'measures': '20100'},
+    },
+    'population/population_50_64.json': {
+        'dataset': 'population', 'table': 'NM_2014_1', 'geography': ESTIMATE_WARDS,
+        'params': {'date': 'latest', 'gender': '0', 'c_age': '208', 'measures': '20100'},
+    },
+    'population/population_over_65.json': {
+        'dataset': 'population', 'table': 'NM_2014_1', 'geography': ESTIMATE_WARDS,
+        'params': {'date': 'latest', 'gender': '0', 'c_age': '209', 'measures': '20100'},
+    },
+}
+
+
+def make_session(concurrency=MAX_CONCURRENCY, retries=MAX_RETRIES):
+    # One pooled session shared by all fetch threads. Connection errors and
+    # 429/5xx responses are retried with exponential backoff, honouring Retry-After.
+    retry = Retry(
+        total=retries, backoff_factor=BACKOFF_FACTOR, status_forcelist=RETRY_STATUSES,
+        allowed_methods=['GET'], respect_retry_after_header=True
+    )
+    adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def fetch_query(session, query, path, geography=None, api_url=NOMIS_API_URL, record_limit=RECORD_LIMIT):
+    # Run one NOMIS query page by page (recordoffset/recordlimit) and write the observations
+    # to `path` as a single NOMIS JSON document, keeping the first page's header. Only one
+    # page is held in memory at a time. Returns (pages, observations).
+    url = f"{api_url}/{query['table']}.data.json"
+    params = dict(query['params'], geography=geography or query['geography'], recordlimit=record_limit)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    pages = observations = 0
+    try:
+        with open(temp_path, 'w') as file:
+            while True:
+                response = session.get(url, params=dict(params, recordoffset=observations), timeout=REQUEST_TIMEOUT)
+                response.raise_for_status()
+                data = response.json()
+                obs = data.get('obs', [])
+
+                if not pages:
+                    header = dict(data.get('header', {}), truncated='false')
+                    file.write(f'{{"header": {json.dumps(header)}, "obs": [')
+                for item in obs:
+                    file.write((', ' if observations else '') + json.dumps(item))
+                    observations += 1
+                pages += 1
+
+                if len(obs) < record_limit:
+                    break
+            file.write(']}')
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    os.replace(temp_path, path)
+    return pages, observations
+
+
+def fetch_nomis(datasets=None, geography=None, out_dir=None, api_url=NOMIS_API_URL,
+                concurrency=MAX_CONCURRENCY, record_limit=RECORD_LIMIT):
+    # Fetch the source files of the given datasets (all by default) concurrently into out_dir,
+    # laid out like app/static/json so `flask ingest --source-dir` can read them.
+    # Returns a report per file: pages, observations, seconds and the error if it failed.
+    out_dir = out_dir or app.config['NOMIS_CACHE_DIR']
+    queries = {
+        relative_path: query for relative_path, query in NOMIS_QUERIES.items()
+        if not datasets or query['dataset'] in datasets
+    }
+    report = {}
+
+    def fetch(relative_path, query):
+        started = time.perf_counter()
+        pages, observations = fetch_query(
+            session, query, os.path.join(out_dir, relative_path), geography, api_url, record_limit
+        )
+        return {'pages': pages, 'observations': observations, 'seconds': time.perf_counter() - started}
+
+    with make_session(concurrency) as session, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(fetch, relative_path, query): relative_path
+            for relative_path, query in queries.items()
+        }
+        for future in as_completed(futures):
+            relative_path = futures[future]
+            try:
+                report[relative_path] = dict(future.result(), error=None)
+            except (requests.RequestException, ValueError, OSError) as e:
+                logging.error(f"Failed to fetch {relative_path}: {e}")
+                report[relative_path] = {'pages': 0, 'observations': 0, 'seconds': 0.0, 'error': str(e)}
+
+    return report
@@ -0,0 +1,38 @@
+from sqlalchemy import func
+from app import db
+from app.models import Observation
+
+
+def latest_period(dataset, category):
+    # Served from the (dataset, category, period, ward_code) index
+    return db.session.query(func.max(Observation.period)).filter(
+        Observation.dataset == dataset, Observation.category == category
+    ).scalar()
+
+
+def get_observation_values(dataset, category, period=None):
+    # ward_code -> value for one category and period (the latest by default), read with a
+    # single range scan of the observation key index
+    period = period or latest_period(dataset, category)
+    rows = db.session.query(Observation.ward_code, Observation.value).filter(
+        Observation.dataset == dataset, Observation.category == category, Observation.period == period
+    ).all()
+    return period, dict(rows)
+
+
+def get_ward_observations(ward_code, dataset=None):
+    # Every stored value for one ward, via ix_observation_ward
+    query = db.session.query(Observation.dataset, Observation.category, Observation.period, Observation.value)
+    query = query.filter(Observation.ward_code == ward_code)
+    if dataset:
+        query = query.filter(Observation.dataset == dataset)
+    return query.order_by(Observation.dataset, Observation.category, Observation.period).all()
+
+
+def get_observation_catalog():
+    # dataset -> category -> periods held in the observation table
+    catalog = {}
+    rows = db.session.query(Observation.dataset, Observation.category, Observation.period).distinct()
+    for dataset, category, period in rows.order_by(Observation.dataset, Observation.category, Observation.period):
+        catalog.setdefault(dataset, {}).setdefault(category, []).append(period)
+    return catalog
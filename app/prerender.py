@@ -0,0 +1,176 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from urllib.parse import urlencode
+from flask import request, send_file
+from app import app
+from app.cache import get_data_version
+from app.metrics import CATEGORY_ARGS, DISPLAY_CATEGORIES, MEASURES
+from app.responses import ENCODING_SUFFIXES, compress
+
+app.config.setdefault('PRERENDER_DIR', os.path.join(app.instance_path, 'prerender'))
+# Serve wardprofile pages and ward value JSON from the pre-rendered files when they match
+# the current data version, instead of rendering them
+app.config.setdefault('SERVE_PRERENDERED', False)
+
+MANIFEST = 'manifest.json'
+
+# WSGI environ key marking the pre-renderer's own requests. Clients can only add HTTP_*
+# keys through headers, so they cannot set it to bypass the stored files.
+PRERENDER_ENVIRON = 'wardprofiles.prerender'
+
+# kind -> (media type, file extension)
+PRERENDER_KINDS = {
+    'page': ('text/html', 'html'),
+    'values': ('application/json', 'json'),
+}
+
+# Parsed manifest and the mtime it was read at
+_manifest = {'mtime': None, 'data': None}
+
+
+def prerender_views():
+    # Every (display, category, measure) the page's selects can ask for, the default view first
+    views = [('default', 'total_population', 'count')]
+    for display_type, categories in DISPLAY_CATEGORIES.items():
+        for category in categories:
+            views.extend((display_type, category, measure) for measure in MEASURES)
+    return views
+
+
+def view_key(display_type, category, measure):
+    return f'{display_type}/{category}/{measure}'
+
+
+def view_urls(display_type, category, measure):
+    # kind -> the URL whose response is stored for this view
+    if display_type == 'default':
+        return {'page': '/wardprofile'}
+    query = urlencode({'display': display_type, CATEGORY_ARGS[display_type]: category, 'measure': measure})
+    return {
+        'page': f'/wardprofile?{query}',
+        'values': f'/api/wards/{display_type}/{category}?measure={measure}',
+    }
+
+
+def render_view(display_type, category, measure):
+    # Fetch one view's responses through the app itself, exactly as a browser would get them
+    client = app.test_client()
+    bodies = {}
+    for kind, url in view_urls(display_type, category, measure).items():
+        response = client.get(url, environ_overrides={PRERENDER_ENVIRON: True})
+        if response.status_code != 200:
+            raise RuntimeError(f'{url}: {response.status_code}')
+        bodies[kind] = response.get_data()
+    return bodies
+
+
+def write_fingerprinted(out_dir, stem, extension, body):
+    # Write body as <stem>.<content hash>.<extension> with .br and .gz variants; returns the name
+    name = f'{stem}.{hashlib.sha1(body).hexdigest()[:16]}.{extension}'
+    path = os.path.join(out_dir, name)
+    if not os.path.exists(path):
+        for suffix, data in [('', body)] + [(suffix, compress(body, encoding)) for encoding, suffix in ENCODING_SUFFIXES.items()]:
+            with open(path + suffix + '.tmp', 'wb') as f:
+                f.write(data)
+            os.replace(path + suffix + '.tmp', path + suffix)
+    return name
+
+
+def run_prerender(workers=None, out_dir=None, progress=None):
+    # Render every view in a process pool and write the responses as fingerprinted files,
+    # then swap in a manifest mapping each view to its files and the data version they were
+    # rendered from. The previous manifest's files are kept for workers that have not re-read
+    # the manifest yet; anything older is removed. Returns the manifest.
+    # Spawned workers start with a fresh app and their own database connections, like run_ingest's.
+    out_dir = out_dir or app.config['PRERENDER_DIR']
+    os.makedirs(out_dir, exist_ok=True)
+    version = get_data_version()
+    views = prerender_views()
+    manifest = {'data_version': version, 'created_at': time.time(), 'views': {}}
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=get_context('spawn')) as executor:
+        futures = {executor.submit(render_view, *view): view for view in views}
+        for future in as_completed(futures):
+            view = futures[future]
+            key = view_key(*view)
+            try:
+                bodies = future.result()
+            except Exception as e:
+                logging.error(f"Failed to pre-render {key}: {e}")
+                continue
+            manifest['views'][key] = {
+                kind: write_fingerprinted(out_dir, key.replace('/', '-'), PRERENDER_KINDS[kind][1], body)
+                for kind, body in bodies.items()
+            }
+            if progress:
+                progress(key, manifest['views'][key])
+
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    keep = manifest_files(manifest)
+    try:
+        with open(manifest_path) as f:
+            keep |= manifest_files(json.load(f))
+    except (OSError, ValueError):
+        pass
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+    for name in os.listdir(out_dir):
+        base = name
+        for suffix in ENCODING_SUFFIXES.values():
+            base = base.removesuffix(suffix)
+        if name != MANIFEST and base not in keep:
+            os.remove(os.path.join(out_dir, name))
+    return manifest
+
+
+def manifest_files(manifest):
+    return {name for files in manifest['views'].values() for name in files.values()}
+
+
+def get_manifest():
+    # The manifest of the pre-rendered files, re-read when it is replaced
+    path = os.path.join(app.config['PRERENDER_DIR'], MANIFEST)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    if _manifest['mtime'] != mtime:
+        with open(path) as f:
+            _manifest['data'] = json.load(f)
+        _manifest['mtime'] = mtime
+    return _manifest['data']
+
+
+def prerendered_response(kind, display_type, category, measure, version):
+    # The stored response for a view, or None (serving mode off, a pre-render request,
+    # no files, or files from another data version) so the caller renders it instead
+    if not app.config['SERVE_PRERENDERED'] or request.environ.get(PRERENDER_ENVIRON):
+        return None
+    manifest = get_manifest()
+    if not manifest or manifest['data_version'] != version:
+        return None
+    name = manifest['views'].get(view_key(display_type, category, measure), {}).get(kind)
+    if not name:
+        return None
+
+    path = os.path.join(app.config['PRERENDER_DIR'], name)
+    if not os.path.exists(path):
+        # Removed by a later pre-render than the manifest this worker holds
+        return None
+    mimetype = PRERENDER_KINDS[kind][0]
+    for encoding, suffix in ENCODING_SUFFIXES.items():
+        if request.accept_encodings[encoding] and os.path.exists(path + suffix):
+            response = send_file(path + suffix, mimetype=mimetype, etag=f'{name}-{encoding}', conditional=True)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_file(path, mimetype=mimetype, etag=name, conditional=True)
+    response.vary.add('Accept-Encoding')
+    return response
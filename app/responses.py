@@ -0,0 +1,108 @@
+import glob
+import gzip
+import mimetypes
+import os
+import brotli
+from flask import request, send_from_directory
+from werkzeug.security import safe_join
+from app import app
+from app.cache import RenderCache
+
+app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+app.config.setdefault('COMPRESS_LEVEL', 6)
+app.config.setdefault('BROTLI_QUALITY', 5)
+
+# Responses that get an ETag and are compressed on the fly
+COMPRESSIBLE_TYPES = {'text/html', 'application/json', 'application/geo+json', 'text/css'}
+
+# Content-Encoding -> suffix of its precompressed static variant, in order of preference
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+# Static files that `flask compress-static` writes .br and .gz variants of
+PRECOMPRESSED_FILES = ['json/**/*.json', 'json/**/*.geojson', 'styles.css']
+
+# Compressed bodies keyed by (ETag, encoding); a cached page compresses once per version
+compressed_cache = RenderCache(maxsize=app.config.get('COMPRESSED_CACHE_SIZE', 64))
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=app.config['BROTLI_QUALITY'])
+    return gzip.compress(data, compresslevel=app.config['COMPRESS_LEVEL'], mtime=0)
+
+
+@app.after_request
+def conditional_response(response):
+    # Tag HTML and JSON responses with a hash of their body, answer a matching If-None-Match
+    # with an empty 304, and otherwise compress the body for clients that accept it.
+    # ETags are weak because the compressed variants share the tag of the plain body.
+    if (request.method not in ('GET', 'HEAD') or response.status_code != 200
+            or response.direct_passthrough or response.is_streamed
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.add_etag(weak=True)
+    response.vary.add('Accept-Encoding')
+    response.make_conditional(request)
+    if response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return response
+
+    encoding = request.accept_encodings.best_match(list(ENCODING_SUFFIXES))
+    if encoding and response.content_length >= app.config['COMPRESS_MIN_SIZE']:
+        key = (response.get_etag()[0], encoding)
+        body = compressed_cache.get(key)
+        if body is None:
+            body = compress(response.get_data(), encoding)
+            compressed_cache.set(key, body)
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+@app.before_request
+def precompressed_static():
+    # Serve the .br/.gz variant written by `flask compress-static` in place of a static
+    # file when the client accepts it and the variant is not older than the file
+    if request.endpoint != 'static':
+        return None
+    filename = request.view_args['filename']
+    path = safe_join(app.static_folder, filename)
+    if path is None or not os.path.isfile(path):
+        return None
+
+    for encoding, suffix in ENCODING_SUFFIXES.items():
+        if not request.accept_encodings[encoding]:
+            continue
+        variant = path + suffix
+        if os.path.isfile(variant) and os.path.getmtime(variant) >= os.path.getmtime(path):
+            response = send_from_directory(
+                app.static_folder, filename + suffix,
+                mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            )
+            response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+            return response
+    return None
+
+
+def precompress_static(force=False):
+    # Write maximum-effort .br and .gz variants next to each static data file, skipping
+    # files whose variants are already up to date. Returns (path, size, sizes by encoding).
+    report = []
+    for pattern in PRECOMPRESSED_FILES:
+        for path in sorted(glob.glob(os.path.join(app.static_folder, pattern), recursive=True)):
+            sizes = {}
+            for encoding, suffix in ENCODING_SUFFIXES.items():
+                variant = path + suffix
+                if force or not os.path.isfile(variant) or os.path.getmtime(variant) < os.path.getmtime(path):
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                    if encoding == 'br':
+                        body = brotli.compress(data, quality=11)
+                    else:
+                        body = gzip.compress(data, compresslevel=9, mtime=0)
+                    with open(variant, 'wb') as f:
+                        f.write(body)
+                sizes[encoding] = os.path.getsize(variant)
+            report.append((os.path.relpath(path, app.static_folder), os.path.getsize(path), sizes))
+    return report
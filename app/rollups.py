@@ -0,0 +1,124 @@
+import shapely
+from shapely.geometry import mapping, shape
+from sqlalchemy import func
+from app import db
+from app.boundaries import get_boundaries, region_for
+from app.cache import bump_data_version
+from app.metrics import DISPLAY_CATEGORIES, DISPLAY_MODELS
+from app.models import AreaRollup, WardBoundary
+from app.utils import add_written, bulk_upsert
+
+AREA_LEVELS = ('lad', 'region')
+
+# Columns identifying one rollup row
+ROLLUP_KEY = ('level', 'dataset', 'category', 'area_code')
+
+# Dissolved area polygons, per (level, data version)
+_area_boundaries = {}
+
+
+def compute_rollups(dataset):
+    # Sum every category of a dataset to LAD level with one GROUP BY over the ward table
+    # joined to the boundaries, then fold the LADs into their regions. Wards with no
+    # boundary (e.g. the output area E00016654 in the population estimates) are left out.
+    model = DISPLAY_MODELS[dataset]
+    categories = DISPLAY_CATEGORIES[dataset]
+    lads = db.session.query(
+        WardBoundary.lad_code, WardBoundary.lad_name, WardBoundary.region_code, WardBoundary.region_name,
+        func.count(model.ward_code), *(func.sum(getattr(model, category)) for category in categories)
+    ).join(WardBoundary, WardBoundary.ward_code == model.ward_code).group_by(
+        WardBoundary.lad_code, WardBoundary.lad_name, WardBoundary.region_code, WardBoundary.region_name
+    ).all()
+
+    rollups = {}
+    for lad_code, lad_name, region_code, region_name, ward_count, *values in lads:
+        region_code, region_name = region_for(lad_code, region_code, region_name)
+        areas = [('lad', lad_code, lad_name)]
+        if region_code:
+            areas.append(('region', region_code, region_name))
+        for level, area_code, area_name in areas:
+            for category, value in zip(categories, values):
+                rollup = rollups.setdefault((level, category, area_code), {
+                    'level': level, 'dataset': dataset, 'category': category, 'area_code': area_code,
+                    'area_name': area_name, 'value': 0, 'ward_count': 0
+                })
+                rollup['value'] += value or 0
+                rollup['ward_count'] += ward_count
+    return list(rollups.values())
+
+
+def refresh_rollups(datasets=None):
+    # Recompute the rollups of the given datasets (all by default). Unchanged rollups are
+    # not rewritten, and areas that no longer have any wards are dropped. The caller commits.
+    written = 0
+    for dataset in datasets or DISPLAY_MODELS:
+        rows = compute_rollups(dataset)
+        written = add_written(written, bulk_upsert(AreaRollup, rows, key=ROLLUP_KEY))
+
+        current = {(row['level'], row['area_code']) for row in rows}
+        stale = [
+            rollup.id for rollup in AreaRollup.query.filter_by(dataset=dataset)
+            if (rollup.level, rollup.area_code) not in current
+        ]
+        if stale:
+            AreaRollup.query.filter(AreaRollup.id.in_(stale)).delete(synchronize_session=False)
+            bump_data_version(db.session)
+            written = add_written(written, len(stale))
+    return written
+
+
+def has_rollups(dataset):
+    return db.session.query(AreaRollup.id).filter_by(dataset=dataset).first() is not None
+
+
+def get_area_values(level, dataset, category):
+    # area_code -> (area_name, value) for one category, from the rollup key index
+    rows = db.session.query(AreaRollup.area_code, AreaRollup.area_name, AreaRollup.value).filter_by(
+        level=level, dataset=dataset, category=category
+    ).all()
+    return {area_code: (area_name, value) for area_code, area_name, value in rows}
+
+
+def get_area_profile(level, area_code):
+    # (area_name, ward count, dataset -> category -> value) for one area
+    rows = AreaRollup.query.filter_by(level=level, area_code=area_code).all()
+    if not rows:
+        return None, 0, {}
+    profile = {}
+    for row in rows:
+        profile.setdefault(row.dataset, {})[row.category] = row.value
+    return rows[0].area_name, max(row.ward_count for row in rows), profile
+
+
+def get_area_boundaries(level, version):
+    # Ward polygons dissolved into LADs or regions, as a GeoJSON FeatureCollection.
+    # The simplified borough-view ward level is used; interior borders vanish anyway.
+    # The other level of the same version is kept; the cache is replaced, never cleared in place.
+    global _area_boundaries
+    key = (level, version)
+    collection = _area_boundaries.get(key)
+    if collection is None:
+        groups = {}
+        for feature in get_boundaries(2)['features']:
+            properties = feature['properties']
+            area_code, area_name = properties.get('LAD23CD', ''), properties.get('LAD23NM', '')
+            if level == 'region':
+                area_code, area_name = region_for(area_code, properties.get('RGN23CD'), properties.get('RGN23NM'))
+            if area_code:
+                groups.setdefault((area_code, area_name), []).append(shape(feature['geometry']))
+
+        collection = {
+            'type': 'FeatureCollection',
+            'features': [
+                {
+                    'type': 'Feature',
+                    'properties': {'code': area_code, 'name': area_name},
+                    'geometry': mapping(shapely.union_all(geometries))
+                }
+                for (area_code, area_name), geometries in sorted(groups.items())
+            ]
+        }
+        _area_boundaries = {
+            **{cached: value for cached, value in _area_boundaries.items() if cached[1] == version}, key: collection
+        }
+    return collection
@@ -0,0 +1,63 @@
+import numpy as np
+from app.matrix import get_ward_matrix
+from app.metrics import DATASET_TOTALS, DISPLAY_CATEGORIES
+
+# Standardized ward feature matrix, per data version
+_feature_index = {}
+
+
+def build_features(matrix):
+    # Wards x features: the share of each category within its dataset (dataset totals left
+    # out, so wards are compared on their make-up rather than their size), standardized per
+    # column. A ward missing a dataset sits at the mean for it, i.e. 0 after standardizing.
+    columns = [
+        (display_type, category)
+        for display_type, categories in DISPLAY_CATEGORIES.items()
+        for category in categories
+        if category != DATASET_TOTALS.get(display_type)
+    ]
+    positions = [matrix.column_index[column] for column in columns]
+    shares = matrix.derived['share'][:, positions]
+    known = np.stack([matrix.present[display_type] for display_type, _ in columns], axis=1)
+
+    counts = known.sum(axis=0)
+    mean = np.divide(np.where(known, shares, 0).sum(axis=0), counts, out=np.zeros(len(positions)), where=counts > 0)
+    centred = np.where(known, shares - mean, 0)
+    std = np.sqrt(np.divide((centred ** 2).sum(axis=0), counts, out=np.zeros(len(positions)), where=counts > 0))
+    features = np.divide(centred, std, out=np.zeros_like(centred), where=std > 0)
+    return features, (features ** 2).sum(axis=1)
+
+
+def get_feature_index(version):
+    # (features, squared row norms), rebuilt only when the data version moves and then
+    # swapped in with a single assignment
+    global _feature_index
+    index = _feature_index.get(version)
+    if index is None:
+        index = build_features(get_ward_matrix(version))
+        _feature_index = {version: index}
+    return index
+
+
+def similar_wards(ward_code, k, version):
+    # The k wards nearest to ward_code by Euclidean distance over the standardized
+    # features, as (ward_code, ward_name, distance) in order, or None for an unknown ward.
+    # Exact: every distance is computed with one matrix-vector product, and only the
+    # k smallest are sorted.
+    matrix = get_ward_matrix(version)
+    row = matrix.index.get(ward_code)
+    if row is None:
+        return None
+    features, norms = get_feature_index(version)
+
+    distances = norms - 2 * (features @ features[row]) + norms[row]
+    distances[row] = np.inf
+    k = min(k, len(distances) - 1)
+    if k <= 0:
+        return []
+    nearest = np.argpartition(distances, k - 1)[:k]
+    nearest = nearest[np.argsort(distances[nearest], kind='stable')]
+    return [
+        (matrix.ward_codes[other], matrix.ward_names[other], float(np.sqrt(max(distances[other], 0))))
+        for other in nearest
+    ]
@@ -0,0 +1,339 @@
+import json
+import math
+import os
+import re
+import numpy as np
+import orjson
+from app import app
+from app.nomis import NOMIS_QUERIES
+from app.utils import NOMIS_JSON_DIR
+
+app.config.setdefault('SYNTHETIC_DIR', os.path.join(app.instance_path, 'synthetic'))
+
+# Census years generated by default. The bundled files are from the 2021 census; each file's
+# NOMIS time keeps its offset from that year (the population estimates are for 2022).
+PERIODS = (2011, 2021)
+REFERENCE_PERIOD = 2021
+
+# Width and height of one ward cell in degrees (about 4.5 x 4.5 km, a typical English ward),
+# and the lon/lat the ward grid is centred on
+WARD_SIZE = (0.065, 0.04)
+CENTRE = (-1.5, 52.6)
+
+# Corner jitter and edge wiggle, as fractions of the cell size. Edges are shared between
+# neighbouring wards, so the polygons tile the grid without gaps or overlaps.
+JITTER = 0.25
+WIGGLE = 0.08
+
+# Points along each ward edge, so a ward has about as many vertices as the real boundaries
+EDGE_POINTS = 40
+
+# Local authorities are blocks of LAD_SIDE x LAD_SIDE wards (England has ~23 wards per LAD)
+LAD_SIDE = 5
+
+# Share of local authorities whose wards are redrawn and recoded at each later period
+REVIEW_SHARE = 0.1
+
+# The English regions on a 3 x 3 grid, south-west first
+REGIONS = [
+    ('E12000009', 'South West'), ('E12000008', 'South East'), ('E12000007', 'London'),
+    ('E12000005', 'West Midlands'), ('E12000004', 'East Midlands'), ('E12000006', 'East of England'),
+    ('E12000002', 'North West'), ('E12000003', 'Yorkshire and The Humber'), ('E12000001', 'North East'),
+]
+
+# Bundled categories that are the total of the others rather than a part
+TOTAL_CATEGORIES = {'Total: All usual residents', 'All Ages'}
+
+# Place name pieces for ward and local authority names
+NAME_STEMS = (
+    'Ash', 'Beck', 'Bram', 'Brook', 'Castle', 'Chal', 'Clay', 'Crane', 'Dun', 'Elm', 'Fern', 'Glen',
+    'Hart', 'Hay', 'Holl', 'Kings', 'Lark', 'Mill', 'Nor', 'Oak', 'Pen', 'Red', 'Stan', 'Wick',
+)
+NAME_ENDINGS = ('bury', 'by', 'combe', 'field', 'ford', 'ham', 'ley', 'mere', 'stead', 'ton', 'well', 'worth')
+NAME_QUALIFIERS = ('', ' Vale', ' Heath', ' Park', ' Green', ' Hill')
+
+
+def load_templates():
+    # Per bundled NOMIS file: its header, one template record per category (in file order),
+    # whether each is a total, and each category's sum over the bundled wards
+    templates = {}
+    for relative_path in NOMIS_QUERIES:
+        with open(os.path.join(NOMIS_JSON_DIR, relative_path)) as f:
+            data = json.load(f)
+        records, sums, wards = {}, {}, set()
+        for record in data['obs']:
+            if not record['geography']['geogcode'].startswith('E05'):
+                continue
+            wards.add(record['geography']['geogcode'])
+            key = orjson.dumps({k: v for k, v in record.items() if k not in ('geography', 'obs_value', 'urn')})
+            records.setdefault(key, record)
+            sums[key] = sums.get(key, 0) + record['obs_value']['value']
+        templates[relative_path] = {
+            'header': data['header'],
+            'records': list(records.values()),
+            'totals': [
+                any(isinstance(v, dict) and v.get('description') in TOTAL_CATEGORIES for v in record.values())
+                for record in records.values()
+            ],
+            'sums': list(sums.values()),
+            'wards': len(wards) or 1,
+        }
+    return templates
+
+
+def _edge_offsets(rng, shape):
+    # Offsets (as a fraction of the cell size) of EDGE_POINTS points along each edge: three
+    # random harmonics, tapered to zero at the corners so neighbouring edges cannot cross
+    t = np.arange(1, EDGE_POINTS + 1) / (EDGE_POINTS + 1)
+    amplitudes = rng.normal(size=shape + (3, 1)) / np.arange(1, 4)[:, None]
+    phases = rng.uniform(0, 2 * math.pi, size=shape + (3, 1))
+    waves = (amplitudes * np.sin(np.arange(1, 4)[:, None] * 2 * math.pi * t + phases)).sum(axis=-2)
+    return WIGGLE * np.sin(math.pi * t) * waves / np.abs(amplitudes).sum(axis=-2)
+
+
+def _names(rng, count, pool):
+    # `count` distinct names from the pool, numbered once it runs out
+    order = rng.permutation(len(pool))
+    return [
+        pool[order[number % len(pool)]] + (f' {number // len(pool) + 1}' if number >= len(pool) else '')
+        for number in range(count)
+    ]
+
+
+class WardGrid:
+    # Synthetic wards on a jittered grid, numbered row by row from the south-west. Corners and
+    # edge points are kept between periods so a boundary review only redraws what it touches.
+
+    def __init__(self, size, rng):
+        self.size = size
+        self.cols = max(1, math.ceil(math.sqrt(size)))
+        self.rows = max(1, math.ceil(size / self.cols))
+        rows, cols = np.divmod(np.arange(size), self.cols)
+        self.cell_rows, self.cell_cols = rows, cols
+
+        # Local authority and region of each ward
+        lad_cols = math.ceil(self.cols / LAD_SIDE)
+        lad_rows = math.ceil(self.rows / LAD_SIDE)
+        lad_of_cell = (rows // LAD_SIDE) * lad_cols + cols // LAD_SIDE
+        lad_numbers, self.lad = np.unique(lad_of_cell, return_inverse=True)
+        lad_region = (
+            (lad_numbers // lad_cols) * 3 // lad_rows * 3 + (lad_numbers % lad_cols) * 3 // lad_cols
+        )
+        pool = [stem + ending + qualifier for qualifier in NAME_QUALIFIERS for stem in NAME_STEMS for ending in NAME_ENDINGS]
+        lad_names = _names(rng, len(lad_numbers), pool)
+        self.lads = [
+            {
+                'code': f"{'E09' if REGIONS[region][1] == 'London' else 'E07'}{number + 1:06d}",
+                'name': lad_names[number],
+                'region_code': REGIONS[region][0],
+                'region_name': REGIONS[region][1],
+            }
+            for number, region in enumerate(lad_region)
+        ]
+        self.names = [''] * size
+        for number, lad in enumerate(self.lads):
+            wards = np.flatnonzero(self.lad == number)
+            for ward, name in zip(wards, _names(rng, len(wards), pool[:len(NAME_STEMS) * len(NAME_ENDINGS)])):
+                self.names[ward] = f"{name} ({lad['name']})"
+
+        # Ward codes change when a ward is redrawn; new codes follow on from the highest
+        self.codes = np.arange(size)
+        self.next_code = size
+
+        # Corner (rows + 1, cols + 1, 2) and edge point offsets, in cells
+        self.corners = rng.uniform(-JITTER, JITTER, size=(self.rows + 1, self.cols + 1, 2))
+        self.south_edges = _edge_offsets(rng, (self.rows + 1, self.cols))
+        self.west_edges = _edge_offsets(rng, (self.rows, self.cols + 1))
+
+    def review(self, rng, share=REVIEW_SHARE):
+        # Redraw the wards of a random `share` of the local authorities: their internal corners
+        # and edges move and they get new codes, while the authority's outline stays put
+        reviewed = rng.random(len(self.lads)) < share
+        grid = np.full((self.rows + 2, self.cols + 2), -1)
+        grid[self.cell_rows + 1, self.cell_cols + 1] = self.lad
+        inside = reviewed[np.maximum(grid, 0)] & (grid >= 0)
+
+        # A corner or edge is internal when every ward around it is in the same reviewed LAD
+        around = [grid[:-1, :-1], grid[:-1, 1:], grid[1:, :-1], grid[1:, 1:]]
+        corners = inside[1:, 1:] & inside[:-1, :-1] & np.logical_and.reduce([lad == around[0] for lad in around])
+        south = inside[1:, 1:-1] & inside[:-1, 1:-1] & (grid[1:, 1:-1] == grid[:-1, 1:-1])
+        west = inside[1:-1, 1:] & inside[1:-1, :-1] & (grid[1:-1, 1:] == grid[1:-1, :-1])
+
+        self.corners[corners] = rng.uniform(-JITTER, JITTER, size=(corners.sum(), 2))
+        self.south_edges[south] = _edge_offsets(rng, (int(south.sum()),))
+        self.west_edges[west] = _edge_offsets(rng, (int(west.sum()),))
+
+        redrawn = np.flatnonzero(reviewed[self.lad])
+        self.codes[redrawn] = self.next_code + np.arange(len(redrawn))
+        self.next_code += len(redrawn)
+        return len(redrawn)
+
+    def ward_codes(self):
+        return [f'E05{number:06d}' for number in self.codes]
+
+    def rings(self):
+        # (wards, 4 * (EDGE_POINTS + 1) + 1, 2) counter-clockwise exterior rings in lon/lat
+        width, height = WARD_SIZE
+        origin = np.array([CENTRE[0] - self.cols * width / 2, CENTRE[1] - self.rows * height / 2])
+        scale = np.array([width, height])
+        grid = np.stack(np.meshgrid(np.arange(self.cols + 1), np.arange(self.rows + 1)), axis=-1)
+        corners = origin + (grid + self.corners) * scale
+
+        t = (np.arange(1, EDGE_POINTS + 1) / (EDGE_POINTS + 1))[:, None]
+        south = corners[:, :-1, None] * (1 - t) + corners[:, 1:, None] * t
+        south[..., 1] += self.south_edges * height
+        west = corners[:-1, :, None] * (1 - t) + corners[1:, :, None] * t
+        west[..., 0] += self.west_edges * width
+
+        r, c = self.cell_rows, self.cell_cols
+        return np.concatenate([
+            corners[r, c][:, None], south[r, c], corners[r, c + 1][:, None], west[r, c + 1],
+            corners[r + 1, c + 1][:, None], south[r + 1, c][:, ::-1], corners[r + 1, c][:, None],
+            west[r, c][:, ::-1], corners[r, c][:, None],
+        ], axis=1)
+
+    def feature_collection(self):
+        # GeoJSON laid out like the ArcGIS WD_MAY_2023_UK_BGC layer, with region fields added
+        rings = np.round(self.rings(), 6)
+        centres = rings[:, :-1].mean(axis=1)
+        features = []
+        for ward, (code, ring) in enumerate(zip(self.ward_codes(), rings.tolist())):
+            lad = self.lads[self.lad[ward]]
+            features.append({
+                'type': 'Feature',
+                'id': ward + 1,
+                'geometry': {'type': 'Polygon', 'coordinates': [ring]},
+                'properties': {
+                    'FID': ward + 1, 'WD23CD': code, 'WD23NM': self.names[ward], 'WD23NMW': ' ',
+                    'LAD23CD': lad['code'], 'LAD23NM': lad['name'],
+                    'RGN23CD': lad['region_code'], 'RGN23NM': lad['region_name'],
+                    'LONG': round(float(centres[ward, 0]), 3), 'LAT': round(float(centres[ward, 1]), 3),
+                },
+            })
+        return {'type': 'FeatureCollection', 'features': features}
+
+
+class WardPopulation:
+    # Per-ward counts for every bundled category. Each ward has a size and two latent traits
+    # (urban, older); each dataset's category shares start from the bundled mix and are tilted
+    # by the traits, so the wards differ in correlated, spatially smooth ways.
+
+    def __init__(self, grid, templates, rng):
+        self.templates = templates
+        x = grid.cell_cols / max(grid.cols - 1, 1)
+        y = grid.cell_rows / max(grid.rows - 1, 1)
+
+        # Urban areas: gaussian bumps around random town centres
+        towns = rng.random((1 + len(grid.lads) // 15, 2))
+        spread = rng.uniform(0.03, 0.12, size=len(towns))
+        distance = (x[:, None] - towns[:, 0]) ** 2 + (y[:, None] - towns[:, 1]) ** 2
+        urban = np.exp(-distance / (2 * spread ** 2)).max(axis=1) + rng.normal(0, 0.1, size=grid.size)
+        urban = (urban - urban.mean()) / (urban.std() or 1)
+        older = rng.normal(size=grid.size) - 0.5 * urban
+        self.traits = np.stack([urban, older], axis=1)
+        self.size = rng.lognormal(0, 0.25, size=grid.size) * (1 + 0.15 * urban).clip(0.5)
+        self.growth = rng.normal(0.07, 0.05, size=grid.size)
+
+        # dataset -> [(relative path, template index)] of the part categories
+        self.parts = {}
+        for relative_path, template in templates.items():
+            dataset = NOMIS_QUERIES[relative_path]['dataset']
+            self.parts.setdefault(dataset, []).extend(
+                (relative_path, index) for index, total in enumerate(template['totals']) if not total
+            )
+        self.loadings = {dataset: rng.normal(0, 0.4, size=(len(parts), 2)) for dataset, parts in self.parts.items()}
+        self.drift = {dataset: np.zeros(len(parts)) for dataset, parts in self.parts.items()}
+
+    def counts(self, years, rng):
+        # dataset -> (wards, parts) integer counts, `years` after the first period
+        size = self.size * (1 + self.growth).clip(0.5) ** (years / 10)
+        counts = {}
+        for dataset, parts in self.parts.items():
+            sums = np.array([self.templates[path]['sums'][index] for path, index in parts], dtype=np.float64)
+            wards = self.templates[parts[0][0]]['wards']
+            self.drift[dataset] += rng.normal(0, 0.05, size=len(parts)) if years else 0
+            logits = (
+                np.log(sums / sums.sum()) + self.traits @ self.loadings[dataset].T + self.drift[dataset]
+                + rng.normal(0, 0.1, size=(len(size), len(parts)))
+            )
+            shares = np.exp(logits - logits.max(axis=1, keepdims=True))
+            shares /= shares.sum(axis=1, keepdims=True)
+            counts[dataset] = np.rint(shares * (size * sums.sum() / wards)[:, None]).astype(np.int64)
+        return counts
+
+
+def write_nomis_file(path, template, period, codes, names, parts, totals):
+    # One NOMIS-shaped file: the bundled header and records, with every ward's observations.
+    # `parts` maps a template index to its (wards,) counts; totals are the sum of the parts.
+    header = dict(template['header'])
+    offset = period - REFERENCE_PERIOD
+    formats = []
+    for record in template['records']:
+        geography = record['geography']
+        year = record['time']['value']
+        description = record['obs_value']['description'].replace('{', '{{').replace('}', '}}')
+        formats.append((
+            geography['value'],
+            description.replace(geography['description'], '{name}').replace(f'for {year} from', 'for {year} from'),
+            year + offset,
+        ))
+    base = min(geography_id for geography_id, _, _ in formats)
+    header['uri'] = re.sub(
+        r'geography=[^&]*', f'geography={base + min(codes)}...{base + max(codes)}', header['uri']
+    )
+
+    columns = [totals if total else parts[index] for index, total in enumerate(template['totals'])]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'{"header":' + orjson.dumps(header) + b',"obs":[')
+        for ward, (number, name) in enumerate(zip(codes, names)):
+            chunk = []
+            for record, (template_id, description, year), column in zip(template['records'], formats, columns):
+                geography_id = base + number
+                chunk.append(orjson.dumps(dict(
+                    record,
+                    geography={'value': geography_id, 'description': name, 'geogcode': f'E05{number:06d}'},
+                    time={'value': year, 'description': year},
+                    obs_value={'value': int(column[ward]), 'description': description.format(name=name, year=year)},
+                    urn=record['urn'].replace(str(template_id), str(geography_id)),
+                )))
+            f.write((b',' if ward else b'') + b','.join(chunk))
+        f.write(b']}')
+
+
+def generate(size, out_dir=None, periods=PERIODS, seed=0, progress=None):
+    # Write boundaries and NOMIS files for `size` synthetic wards at each period to
+    # out_dir/<period>/, laid out like app/static/json (boundaries in boundaries/wards.geojson).
+    # The output depends only on the arguments. Returns {period: (boundary path, source dir)}.
+    out_dir = out_dir or app.config['SYNTHETIC_DIR']
+    rng = np.random.default_rng(seed)
+    templates = load_templates()
+    grid = WardGrid(size, rng)
+    population = WardPopulation(grid, templates, rng)
+
+    written = {}
+    periods = sorted(periods)
+    for number, period in enumerate(periods):
+        period_rng = np.random.default_rng([seed, period])
+        redrawn = grid.review(period_rng) if number else 0
+        source_dir = os.path.join(out_dir, str(period))
+        boundary_path = os.path.join(source_dir, 'boundaries', 'wards.geojson')
+        os.makedirs(os.path.dirname(boundary_path), exist_ok=True)
+        with open(boundary_path, 'wb') as f:
+            f.write(orjson.dumps(grid.feature_collection()))
+
+        counts = population.counts(period - periods[0], period_rng)
+        for relative_path, template in templates.items():
+            dataset = NOMIS_QUERIES[relative_path]['dataset']
+            columns = {
+                index: counts[dataset][:, position]
+                for position, (path, index) in enumerate(population.parts[dataset]) if path == relative_path
+            }
+            write_nomis_file(
+                os.path.join(source_dir, relative_path), template, period,
+                grid.codes.tolist(), grid.names, columns, counts[dataset].sum(axis=1)
+            )
+        written[period] = (boundary_path, source_dir)
+        if progress:
+            progress(period, redrawn)
+    return written
@@ -0,0 +1,109 @@
+import math
+import os
+import shutil
+import numpy as np
+import shapely
+import mapbox_vector_tile
+from shapely.geometry import shape
+from app import app
+from app.boundaries import get_boundaries, level_for_zoom
+from app.matrix import get_category_values
+
+TILE_EXTENT = 4096
+TILE_BUFFER = 64  # in tile units; geometries are clipped slightly past the edge to avoid seams
+TILE_LAYER = 'wards'
+EARTH_RADIUS = 6378137.0
+ORIGIN_SHIFT = math.pi * EARTH_RADIUS
+
+app.config.setdefault('TILE_CACHE_DIR', os.path.join(app.instance_path, 'tiles'))
+
+# Spatial index over the ward boundaries, per (boundary level, data version)
+_tile_index = {}
+
+
+def tile_bounds(z, x, y):
+    # Web Mercator bounds (minx, miny, maxx, maxy) of a z/x/y tile
+    size = 2 * ORIGIN_SHIFT / 2 ** z
+    minx = -ORIGIN_SHIFT + x * size
+    maxy = ORIGIN_SHIFT - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def to_web_mercator(coords):
+    lon = np.radians(coords[:, 0])
+    lat = np.radians(np.clip(coords[:, 1], -85.05112878, 85.05112878))
+    return np.column_stack([lon * EARTH_RADIUS, np.log(np.tan(np.pi / 4 + lat / 2)) * EARTH_RADIUS])
+
+
+def get_tile_index(level, version):
+    # Built aside and swapped in with the other levels of the same version, never cleared in place
+    global _tile_index
+    key = (level, version)
+    index = _tile_index.get(key)
+    if index is None:
+        features = get_boundaries(level)['features']
+        geometries = shapely.transform(
+            np.array([shape(feature['geometry']) for feature in features]), to_web_mercator
+        )
+        index = (shapely.STRtree(geometries), geometries, [feature['properties'] for feature in features])
+        _tile_index = {**{cached: value for cached, value in _tile_index.items() if cached[1] == version}, key: index}
+    return index
+
+
+def render_tile(z, x, y, version, values=None):
+    # Encode the wards intersecting a tile as a Mapbox Vector Tile, clipped to the tile
+    # and taken from the simplified boundary level that suits the zoom
+    tree, geometries, properties = get_tile_index(level_for_zoom(z), version)
+    bounds = tile_bounds(z, x, y)
+    margin = (bounds[2] - bounds[0]) * TILE_BUFFER / TILE_EXTENT
+    clip_box = (bounds[0] - margin, bounds[1] - margin, bounds[2] + margin, bounds[3] + margin)
+
+    features = []
+    for index in tree.query(shapely.box(*clip_box), predicate='intersects'):
+        clipped = shapely.clip_by_rect(geometries[index], *clip_box)
+        if clipped.is_empty:
+            continue
+        ward_code = properties[index].get('WD23CD')
+        attributes = {'WD23CD': ward_code, 'WD23NM': properties[index].get('WD23NM', '')}
+        if values is not None:
+            attributes['value'] = values.get(ward_code, 0)
+        # The feature id is the ward's position in ward code order, the same in every tile of a data version
+        features.append({'geometry': clipped, 'properties': attributes, 'id': int(index)})
+
+    return mapbox_vector_tile.encode(
+        [{'name': TILE_LAYER, 'features': features}],
+        default_options={'quantize_bounds': bounds, 'extents': TILE_EXTENT}
+    )
+
+
+def get_tile(z, x, y, version, display_type=None, category=None):
+    # Serve a tile from the on-disk cache, rendering and storing it on a miss.
+    # The data version is part of the path, so a data refresh never serves stale tiles.
+    version_dir = os.path.join(app.config['TILE_CACHE_DIR'], str(version))
+    path = os.path.join(version_dir, display_type or 'wards', category or 'none', str(z), str(x), f'{y}.mvt')
+    try:
+        with open(path, 'rb') as file:
+            return file.read()
+    except FileNotFoundError:
+        # Not cached yet, or removed by prune_tile_cache; render it
+        pass
+
+    values = get_category_values(display_type, category, version) if display_type else None
+    tile = render_tile(z, x, y, version, values)
+    new_version = not os.path.isdir(version_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if new_version:
+        prune_tile_cache(version)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(tile)
+    os.replace(temp_path, path)
+    return tile
+
+
+def prune_tile_cache(version):
+    # Remove the cached tiles of older data versions, which can never be served again
+    root = app.config['TILE_CACHE_DIR']
+    for name in os.listdir(root):
+        if name.isdigit() and int(name) < version:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
@@ -1,466 +1,353 @@
 import json
 import logging
-from sqlalchemy.exc import SQLAlchemyError
+import ijson
+from sqlalchemy import or_
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from app import db
-from app.models import WardPopulation, WardGeneralHealth, WardOccupation, WardVehicles, WardTenures
+from app.cache import bump_data_version
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
-def update_general_health_data():
-    file_path = 'app/static/json/general_health/general_health.json'  # Path to your JSON file
-
-    try:
-        with open(file_path, 'r') as file:
-            data = json.load(file)
-
-        if 'obs' not in data:
-            raise ValueError("Invalid data structure in general health JSON file")
-
-        # Initialize a dictionary to hold data for each ward
-        all_data = {}
-
-        # Parse the response to extract relevant information
-        for item in data['obs']:
-            ward_code = item['geography']['geogcode']
-            ward_name = item['geography']['description']
-            health_category = item['c2021_health_6']['description']
-            value = item['obs_value']['value']
-
-            # Initialize the ward data if not already done
-            if ward_code not in all_data:
-                all_data[ward_code] = {
-                    'ward_name': ward_name,
-                    'usual_residents': 0,
-                    'residentsGoodHealth': 0,
-                    'residentsFairHealth': 0,
-                    'residentsBadHealth': 0,
-                    'residentVeryBadHealth': 0
-                }
-
-            # Map health category to the correct field in the dictionary
-            if health_category == 'Total: All usual residents':
-                all_data[ward_code]['usual_residents'] = value
-            elif health_category == 'Very good health' or health_category == 'Good health':
-                all_data[ward_code]['residentsGoodHealth'] += value
-            elif health_category == 'Fair health':
-                all_data[ward_code]['residentsFairHealth'] = value
-            elif health_category == 'Bad health':
-                all_data[ward_code]['residentsBadHealth'] = value
-            elif health_category == 'Very bad health':
-                all_data[ward_code]['residentVeryBadHealth'] = value
-
-        # Update or insert the data into the database
-        for ward_code, data in all_data.items():
-            existing_record = WardGeneralHealth.query.filter_by(ward_code=ward_code).first()
-            if existing_record:
-                existing_record.usual_residents = data['usual_residents']
-                existing_record.residentsGoodHealth = data['residentsGoodHealth']
-                existing_record.residentsFairHealth = data['residentsFairHealth']
-                existing_record.residentsBadHealth = data['residentsBadHealth']
-                existing_record.residentVeryBadHealth = data['residentVeryBadHealth']
-                # logging.info(f"Updated existing health record for ward {ward_code}")
-            else:
-                new_record = WardGeneralHealth(
-                    ward_code=ward_code,
-                    ward_name=data['ward_name'],
-                    usual_residents=data['usual_residents'],
-                    residentsGoodHealth=data['residentsGoodHealth'],
-                    residentsFairHealth=data['residentsFairHealth'],
-                    residentsBadHealth=data['residentsBadHealth'],
-                    residentVeryBadHealth=data['residentVeryBadHealth']
-                )
-                db.session.add(new_record)
-                # logging.info(f"Added new health record for ward {ward_code}")
-
-        # Commit the changes to the database
-        db.session.commit()
-        # logging.info("General health data updated successfully.")
-
-    except FileNotFoundError:
-        logging.error(f"File not found: {file_path}")
-    except json.JSONDecodeError:
-        logging.error(f"Error decoding JSON in file: {file_path}")
-    except ValueError as ve:
-        logging.error(ve)
-    except SQLAlchemyError as e:
-        db.session.rollback()
-        logging.error(f"Database error: {e}")
-    except Exception as e:
-        logging.error(f"An unexpected error occurred: {e}")
-
-
-def update_population_data():
-    try:
-        # Define file paths for different population categories
-        file_paths = {
-            'total_population': 'app/static/json/population/total_population.json',
-            'population_under_15': 'app/static/json/population/population_under_15.json',
-            'population_16_24': 'app/static/json/population/population_16_24.json',
-            'population_25_49': 'app/static/json/population/population_25_49.json',
-            'population_50_64': 'app/static/json/population/population_50_64.json',
-            'population_over_65': 'app/static/json/population/population_over_65.json'
+# Rows sent per INSERT ... ON CONFLICT statement
+UPSERT_BATCH_SIZE = 5000
+
+# Bundled NOMIS source files for each dataset
+NOMIS_JSON_DIR = 'app/static/json'
+GENERAL_HEALTH_FILE = f'{NOMIS_JSON_DIR}/general_health/general_health.json'
+OCCUPATION_FILE = f'{NOMIS_JSON_DIR}/occupation/occupation.json'
+VEHICLES_FILE = f'{NOMIS_JSON_DIR}/vehicles/vehicle_availability.json'
+TENURE_FILE = f'{NOMIS_JSON_DIR}/tenures/tenures.json'
+POPULATION_FILES = {
+    'total_population': f'{NOMIS_JSON_DIR}/population/total_population.json',
+    'population_under_15': f'{NOMIS_JSON_DIR}/population/population_under_15.json',
+    'population_16_24': f'{NOMIS_JSON_DIR}/population/population_16_24.json',
+    'population_25_49': f'{NOMIS_JSON_DIR}/population/population_25_49.json',
+    'population_50_64': f'{NOMIS_JSON_DIR}/population/population_50_64.json',
+    'population_over_65': f'{NOMIS_JSON_DIR}/population/population_over_65.json'
+}
+
+# Columns identifying one row of the long-format observation table
+OBSERVATION_KEY = ('dataset', 'category', 'period', 'ward_code')
+
+# Errors raised while decoding a NOMIS JSON file
+JSON_ERRORS = (json.JSONDecodeError, ijson.JSONError)
+
+
+def iter_observations(file_path, dimension=None, field='description'):
+    # Stream the 'obs' records of a NOMIS JSON file one at a time, yielding
+    # (ward_code, ward_name, category, value). Only the fields we use are kept, so memory
+    # stays flat however large the file is. `category` is the `field` of the `dimension`
+    # (e.g. c2021_health_6), or None when no dimension is given.
+    wanted = {
+        'obs.item.geography.geogcode': 'ward_code',
+        'obs.item.geography.description': 'ward_name',
+        'obs.item.obs_value.value': 'value',
+    }
+    if dimension:
+        wanted[f'obs.item.{dimension}.{field}'] = 'category'
+
+    found_obs = False
+    record = {}
+    with open(file_path, 'rb') as file:
+        for prefix, event, value in ijson.parse(file, use_float=True):
+            if prefix in wanted:
+                record[wanted[prefix]] = value
+            elif prefix == 'obs.item' and event == 'end_map':
+                yield record.get('ward_code'), record.get('ward_name'), record.get('category'), record.get('value')
+                record = {}
+            elif prefix == 'obs' and event == 'start_array':
+                found_obs = True
+
+    if not found_obs:
+        raise ValueError(f"Invalid data structure in NOMIS JSON file: {file_path}")
+
+
+def read_extracted(file_path):
+    # The NOMIS header.extracted timestamp; the header precedes 'obs', so this stops early
+    with open(file_path, 'rb') as file:
+        for prefix, _, value in ijson.parse(file):
+            if prefix == 'header.extracted':
+                return value
+            if prefix == 'obs':
+                break
+    return None
+
+
+def read_period(file_path):
+    # The NOMIS time value of the first observation, e.g. '2021'
+    with open(file_path, 'rb') as file:
+        for prefix, _, value in ijson.parse(file):
+            if prefix == 'obs.item.time.value':
+                return str(value)
+    return None
+
+
+def parse_observations(file_path, dataset, dimension=None, period=None):
+    # Rows for the long-format observation table straight from a NOMIS file, one per
+    # observation, with the dimension's description as the category. Any NOMIS table can be
+    # loaded this way without a new model.
+    period = period or read_period(file_path)
+    return [
+        {'dataset': dataset, 'category': category or dataset, 'ward_code': ward_code, 'period': period, 'value': value}
+        for ward_code, _, category, value in iter_observations(file_path, dimension)
+    ]
+
+
+def observation_rows(dataset, rows, categories, period):
+    # Long-format rows for a wide, one-row-per-ward dataset
+    return [
+        {'dataset': dataset, 'category': category, 'ward_code': row['ward_code'], 'period': period,
+         'value': row[category]}
+        for row in rows
+        for category in categories
+    ]
+
+
+def bulk_upsert(model, rows, key='ward_code'):
+    # Insert or update a whole dataset with INSERT ... ON CONFLICT(key) DO UPDATE.
+    # Rows whose values are unchanged are left alone, so a no-op refresh writes nothing.
+    # The caller commits, so a dataset is written in a single transaction.
+    # `key` is a column name, or a tuple of them for a composite unique key.
+    # Returns the rows written, or None when the driver cannot count them (a rowcount of
+    # -1, e.g. PostgreSQL executemany); callers treat None as "something may have changed".
+    if not rows:
+        return 0
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        insert = sqlite_insert
+    elif dialect == 'postgresql':
+        insert = postgresql_insert
+    else:
+        raise ValueError(f"Bulk upsert is not supported on {dialect}")
+
+    table = model.__table__
+    statement = insert(table)
+    keys = [key] if isinstance(key, str) else list(key)
+    update_columns = [column.name for column in table.columns if column.name not in ('id', *keys)]
+    statement = statement.on_conflict_do_update(
+        index_elements=keys,
+        set_={name: statement.excluded[name] for name in update_columns},
+        where=or_(*(table.c[name].is_distinct_from(statement.excluded[name]) for name in update_columns))
+    )
+
+    written = 0
+    for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+        result = db.session.execute(statement, rows[start:start + UPSERT_BATCH_SIZE])
+        written = add_written(written, result.rowcount if result.rowcount >= 0 else None)
+
+    # Core statements bypass the ORM flush hooks, so bump the data version here
+    if written != 0:
+        bump_data_version(db.session)
+    return written
+
+
+def add_written(total, count):
+    # Sum bulk_upsert results; an unknown count (None) makes the total unknown
+    return None if total is None or count is None else total + count
+
+
+def parse_general_health_data(file_path=GENERAL_HEALTH_FILE):
+    # Initialize a dictionary to hold data for each ward
+    all_data = {}
+
+    # Stream the observations and aggregate them as they are parsed
+    for ward_code, ward_name, health_category, value in iter_observations(file_path, 'c2021_health_6'):
+
+        # Initialize the ward data if not already done
+        if ward_code not in all_data:
+            all_data[ward_code] = {
+                'ward_name': ward_name,
+                'usual_residents': 0,
+                'residentsGoodHealth': 0,
+                'residentsFairHealth': 0,
+                'residentsBadHealth': 0,
+                'residentVeryBadHealth': 0
+            }
+
+        # Map health category to the correct field in the dictionary
+        if health_category == 'Total: All usual residents':
+            all_data[ward_code]['usual_residents'] = value
+        elif health_category == 'Very good health' or health_category == 'Good health':
+            all_data[ward_code]['residentsGoodHealth'] += value
+        elif health_category == 'Fair health':
+            all_data[ward_code]['residentsFairHealth'] = value
+        elif health_category == 'Bad health':
+            all_data[ward_code]['residentsBadHealth'] = value
+        elif health_category == 'Very bad health':
+            all_data[ward_code]['residentVeryBadHealth'] = value
+
+    return [{'ward_code': ward_code, **data} for ward_code, data in all_data.items()]
+
+
+
+def parse_population_data(file_paths=POPULATION_FILES):
+    # Initialize a dictionary to hold data for all categories
+    all_data = {}
+
+    # Load data from JSON files
+    for category, file_path in file_paths.items():
+        try:
+            # Stream the observations and aggregate them as they are parsed
+            for ward_code, ward_name, _, value in iter_observations(file_path):
+
+                # Initialize the ward data if not already done
+                if ward_code not in all_data:
+                    all_data[ward_code] = {
+                        'ward_name': ward_name,
+                        'total_population': 0,
+                        'population_under_15': 0,
+                        'population_16_24': 0,
+                        'population_25_49': 0,
+                        'population_50_64': 0,
+                        'population_over_65': 0
+                    }
+
+                # Update the ward data with the value from the current category
+                all_data[ward_code][category] = value
+
+        except FileNotFoundError:
+            logging.error(f"File not found: {file_path}")
+            continue
+        except JSON_ERRORS:
+            logging.error(f"Error decoding JSON in file: {file_path}")
+            continue
+        except ValueError as ve:
+            logging.error(ve)
+            continue
+
+    return [
+        {
+            'ward_code': ward_code,
+            'ward_name': data['ward_name'],
+            'total_population': data['total_population'],
+            'population_under_15': data['population_under_15'],
+            'population_age_16_24': data['population_16_24'],
+            'population_age_25_49': data['population_25_49'],
+            'population_age_50_64': data['population_50_64'],
+            'population_over_65': data['population_over_65']
         }
-
-        # Initialize a dictionary to hold data for all categories
-        all_data = {}
-
-        # Load data from JSON files
-        for category, file_path in file_paths.items():
-            try:
-                with open(file_path, 'r') as file:
-                    data = json.load(file)
-
-                # Check if data contains 'obs' key
-                if 'obs' not in data:
-                    raise ValueError(f"Invalid data structure in {category} JSON file")
-
-                # Parse the response to extract relevant information
-                for item in data['obs']:
-                    ward_code = item['geography']['geogcode']
-                    ward_name = item['geography']['description']
-                    value = item['obs_value']['value']
-
-                    # Initialize the ward data if not already done
-                    if ward_code not in all_data:
-                        all_data[ward_code] = {
-                            'ward_name': ward_name,
-                            'total_population': 0,
-                            'population_under_15': 0,
-                            'population_16_24': 0,
-                            'population_25_49': 0,
-                            'population_50_64': 0,
-                            'population_over_65': 0
-                        }
-
-                    # Update the ward data with the value from the current category
-                    all_data[ward_code][category] = value
-
-            except FileNotFoundError:
-                logging.error(f"File not found: {file_path}")
-                continue
-            except json.JSONDecodeError:
-                logging.error(f"Error decoding JSON in file: {file_path}")
-                continue
-            except ValueError as ve:
-                logging.error(ve)
-                continue
-
-        # Update or insert the data into the database
-        for ward_code, data in all_data.items():
-            existing_record = WardPopulation.query.filter_by(ward_code=ward_code).first()
-            if existing_record:
-                existing_record.total_population = data['total_population']
-                existing_record.population_under_15 = data['population_under_15']
-                existing_record.population_age_16_24 = data['population_16_24']
-                existing_record.population_age_25_49 = data['population_25_49']
-                existing_record.population_age_50_64 = data['population_50_64']
-                existing_record.population_over_65 = data['population_over_65']
-                # logging.info(f"Updated existing record for ward {ward_code}")
-            else:
-                new_record = WardPopulation(
-                    ward_code=ward_code,
-                    ward_name=data['ward_name'],
-                    total_population=data['total_population'],
-                    population_under_15=data['population_under_15'],
-                    population_age_16_24=data['population_16_24'],
-                    population_age_25_49=data['population_25_49'],
-                    population_age_50_64=data['population_50_64'],
-                    population_over_65=data['population_over_65']
-                )
-                db.session.add(new_record)
-                logging.info(f"Added new record for ward {ward_code}")
-
-        # Commit the changes to the database
-        db.session.commit()
-        logging.info("Population data updated successfully.")
-
-    except SQLAlchemyError as e:
-        db.session.rollback()
-        logging.error(f"Database error: {e}")
-    except Exception as e:
-        logging.error(f"An unexpected error occurred: {e}")
-
-
-def update_occupation_data():
-    file_path = 'app/static/json/occupation/occupation.json'  # Path to your JSON file
-
-    try:
-        with open(file_path, 'r') as file:
-            data = json.load(file)
-
-        if 'obs' not in data:
-            raise ValueError("Invalid data structure in occupation JSON file")
-
-        # Initialize a dictionary to hold data for each ward
-        all_data = {}
-
-        # Parse the response to extract relevant information
-        for item in data['obs']:
-            ward_code = item['geography']['geogcode']
-            ward_name = item['geography']['description']
-            occupation_category = item['c2021_occ_10']['description']
-            value = item['obs_value']['value']
-
-            # Initialize the ward data if not already done
-            if ward_code not in all_data:
-                all_data[ward_code] = {
-                    'ward_name': ward_name,
-                    'managers_directors_senior_officials': 0,
-                    'professional_occupations': 0,
-                    'associate_professional_technical': 0,
-                    'administrative_secretarial': 0,
-                    'skilled_trades': 0,
-                    'caring_leisure_service': 0,
-                    'sales_customer_service': 0,
-                    'process_plant_machine_operatives': 0,
-                    'elementary_occupations': 0
-                }
-
-            # Map occupation category to the correct field in the dictionary
-            if occupation_category == '1. Managers, directors and senior officials':
-                all_data[ward_code]['managers_directors_senior_officials'] = value
-            elif occupation_category == '2. Professional occupations':
-                all_data[ward_code]['professional_occupations'] = value
-            elif occupation_category == '3. Associate professional and technical occupations':
-                all_data[ward_code]['associate_professional_technical'] = value
-            elif occupation_category == '4. Administrative and secretarial occupations':
-                all_data[ward_code]['administrative_secretarial'] = value
-            elif occupation_category == '5. Skilled trades occupations':
-                all_data[ward_code]['skilled_trades'] = value
-            elif occupation_category == '6. Caring, leisure and other service occupations':
-                all_data[ward_code]['caring_leisure_service'] = value
-            elif occupation_category == '7. Sales and customer service occupations':
-                all_data[ward_code]['sales_customer_service'] = value
-            elif occupation_category == '8. Process, plant and machine operatives':
-                all_data[ward_code]['process_plant_machine_operatives'] = value
-            elif occupation_category == '9. Elementary occupations':
-                all_data[ward_code]['elementary_occupations'] = value
-
-        # Update or insert the data into the database
-        for ward_code, data in all_data.items():
-            existing_record = WardOccupation.query.filter_by(ward_code=ward_code).first()
-            if existing_record:
-                existing_record.managers_directors_senior_officials = data['managers_directors_senior_officials']
-                existing_record.professional_occupations = data['professional_occupations']
-                existing_record.associate_professional_technical = data['associate_professional_technical']
-                existing_record.administrative_secretarial = data['administrative_secretarial']
-                existing_record.skilled_trades = data['skilled_trades']
-                existing_record.caring_leisure_service = data['caring_leisure_service']
-                existing_record.sales_customer_service = data['sales_customer_service']
-                existing_record.process_plant_machine_operatives = data['process_plant_machine_operatives']
-                existing_record.elementary_occupations = data['elementary_occupations']
-                logging.info(f"Updated existing occupation record for ward {ward_code}")
-            else:
-                new_record = WardOccupation(
-                    ward_code=ward_code,
-                    ward_name=data['ward_name'],
-                    managers_directors_senior_officials=data['managers_directors_senior_officials'],
-                    professional_occupations=data['professional_occupations'],
-                    associate_professional_technical=data['associate_professional_technical'],
-                    administrative_secretarial=data['administrative_secretarial'],
-                    skilled_trades=data['skilled_trades'],
-                    caring_leisure_service=data['caring_leisure_service'],
-                    sales_customer_service=data['sales_customer_service'],
-                    process_plant_machine_operatives=data['process_plant_machine_operatives'],
-                    elementary_occupations=data['elementary_occupations']
-                )
-                db.session.add(new_record)
-                # logging.info(f"Added new occupation record for ward {ward_code}")
-
-        # Commit the changes to the database
-        db.session.commit()
-        # logging.info("Occupation data updated successfully.")
-
-    except FileNotFoundError:
-        logging.error(f"File not found: {file_path}")
-    except json.JSONDecodeError:
-        logging.error(f"Error decoding JSON in file: {file_path}")
-    except ValueError as ve:
-        logging.error(ve)
-    except SQLAlchemyError as e:
-        db.session.rollback()
-        logging.error(f"Database error: {e}")
-    except Exception as e:
-        logging.error(f"An unexpected error occurred: {e}")
-
-def update_vehicle_availability_data():
-    file_path = 'app/static/json/vehicles/vehicle_availability.json'  # Path to your JSON file
-
-    try:
-        with open(file_path, 'r') as file:
-            data = json.load(file)
-
-        if 'obs' not in data:
-            raise ValueError("Invalid data structure in vehicle availability JSON file")
-
-        # Initialize a dictionary to hold data for each ward
-        all_data = {}
-
-        # Define the mappings for vehicle categories based on the values of c2021_cars_5
-        vehicle_categories = {
-            1: 'no_cars_vans',                # Value 1 corresponds to No cars or vans in household
-            2: 'one_car_van',                 # Value 2 corresponds to One car or van in household
-            3: 'two_cars_vans',               # Value 3 corresponds to Two cars or vans in household
-            4: 'three_or_more_cars_vans'      # Value 4 corresponds to Three or more cars or vans in household
-        }
-
-        # Parse the response to extract relevant information
-        for item in data['obs']:
-            ward_code = item['geography']['geogcode']
-            ward_name = item['geography']['description']
-
-            # Initialize the ward data if not already done
-            if ward_code not in all_data:
-                all_data[ward_code] = {
-                    'ward_name': ward_name,
-                    'no_cars_vans': 0,
-                    'one_car_van': 0,
-                    'two_cars_vans': 0,
-                    'three_or_more_cars_vans': 0
-                }
-
-            # Get the value of c2021_cars_5
-            cars_value = item['c2021_cars_5']['value']
-            # Get the corresponding obs_value
-            obs_value = item['obs_value']['value']
-
-            # Map the obs_value to the correct category based on the cars_value
-            if cars_value in vehicle_categories:
-                category_key = vehicle_categories[cars_value]
-                all_data[ward_code][category_key] = obs_value
-
-        # Update or insert the data into the database
-        for ward_code, data in all_data.items():
-            existing_record = WardVehicles.query.filter_by(ward_code=ward_code).first()
-            if existing_record:
-                existing_record.no_cars_vans = data['no_cars_vans']
-                existing_record.one_car_van = data['one_car_van']
-                existing_record.two_cars_vans = data['two_cars_vans']
-                existing_record.three_or_more_cars_vans = data['three_or_more_cars_vans']
-                # logging.info(f"Updated existing vehicle availability record for ward {ward_code}")
-            else:
-                new_record = WardVehicles(
-                    ward_code=ward_code,
-                    ward_name=data['ward_name'],
-                    no_cars_vans=data['no_cars_vans'],
-                    one_car_van=data['one_car_van'],
-                    two_cars_vans=data['two_cars_vans'],
-                    three_or_more_cars_vans=data['three_or_more_cars_vans']
-                )
-                db.session.add(new_record)
-                # logging.info(f"Added new vehicle availability record for ward {ward_code}")
-
-        # Commit the changes to the database
-        db.session.commit()
-        # logging.info("Vehicle availability data updated successfully.")
-
-    except FileNotFoundError:
-        logging.error(f"File not found: {file_path}")
-    except json.JSONDecodeError:
-        logging.error(f"Error decoding JSON in file: {file_path}")
-    except ValueError as ve:
-        logging.error(ve)
-    except SQLAlchemyError as e:
-        db.session.rollback()
-        logging.error(f"Database error: {e}")
-    except Exception as e:
-        logging.error(f"An unexpected error occurred: {e}")
-
-
-def update_tenure_data():
-    file_path = 'app/static/json/tenures/tenures.json'  # Path to your JSON file
-
-    try:
-        with open(file_path, 'r') as file:
-            data = json.load(file)
-
-        if 'obs' not in data:
-            raise ValueError("Invalid data structure in tenure JSON file")
-
-        # Initialize a dictionary to hold data for each ward
-        all_data = {}
-
-        # Define the mappings for tenure categories
-        tenure_categories = {
-            'Owned: Owns outright': 'owns_outright',
-            'Owned: Owns with a mortgage or loan': 'owns_with_mortgage',
-            'Shared ownership: Shared ownership': 'shared_ownership',
-            'Social rented: Rents from council or Local Authority': 'rents_council',
-            'Social rented: Other social rented': 'other_social_rented',
-            'Private rented: Private landlord or letting agency': 'rents_private_landlord',
-            'Private rented: Other private rented': 'other_private_rented',
-            'Lives rent free': 'lives_rent_free'
-        }
-
-        # Parse the response to extract relevant information
-        for item in data['obs']:
-            ward_code = item['geography']['geogcode']
-            ward_name = item['geography']['description']
-            tenure_category = item['c2021_tenure_9']['description']
-            value = item['obs_value']['value']
-
-            # Initialize the ward data if not already done
-            if ward_code not in all_data:
-                all_data[ward_code] = {
-                    'ward_name': ward_name,
-                    'owns_outright': 0,
-                    'owns_with_mortgage': 0,
-                    'shared_ownership': 0,
-                    'rents_council': 0,
-                    'other_social_rented': 0,
-                    'rents_private_landlord': 0,
-                    'other_private_rented': 0,
-                    'lives_rent_free': 0
-                }
-
-            # Map tenure category to the correct field in the dictionary
-            if tenure_category in tenure_categories:
-                all_data[ward_code][tenure_categories[tenure_category]] = value
-
-        # Update or insert the data into the database
-        for ward_code, data in all_data.items():
-            existing_record = WardTenures.query.filter_by(ward_code=ward_code).first()
-            if existing_record:
-                existing_record.owns_outright = data['owns_outright']
-                existing_record.owns_with_mortgage = data['owns_with_mortgage']
-                existing_record.shared_ownership = data['shared_ownership']
-                existing_record.rents_council = data['rents_council']
-                existing_record.other_social_rented = data['other_social_rented']
-                existing_record.rents_private_landlord = data['rents_private_landlord']
-                existing_record.other_private_rented = data['other_private_rented']
-                existing_record.lives_rent_free = data['lives_rent_free']
-                # logging.info(f"Updated existing tenure record for ward {ward_code}")
-            else:
-                new_record = WardTenures(
-                    ward_code=ward_code,
-                    ward_name=data['ward_name'],
-                    owns_outright=data['owns_outright'],
-                    owns_with_mortgage=data['owns_with_mortgage'],
-                    shared_ownership=data['shared_ownership'],
-                    rents_council=data['rents_council'],
-                    other_social_rented=data['other_social_rented'],
-                    rents_private_landlord=data['rents_private_landlord'],
-                    other_private_rented=data['other_private_rented'],
-                    lives_rent_free=data['lives_rent_free']
-                )
-                db.session.add(new_record)
-                # logging.info(f"Added new tenure record for ward {ward_code}")
-
-        # Commit the changes to the database
-        db.session.commit()
-        logging.info("Tenure data updated successfully.")
-
-    except FileNotFoundError:
-        logging.error(f"File not found: {file_path}")
-    except json.JSONDecodeError:
-        logging.error(f"Error decoding JSON in file: {file_path}")
-    except ValueError as ve:
-        logging.error(ve)
-    except SQLAlchemyError as e:
-        db.session.rollback()
-        logging.error(f"Database error: {e}")
-    except Exception as e:
-        logging.error(f"An unexpected error occurred: {e}")
-
-
+        for ward_code, data in all_data.items()
+    ]
+
+
+
+def parse_occupation_data(file_path=OCCUPATION_FILE):
+    # Initialize a dictionary to hold data for each ward
+    all_data = {}
+
+    # Stream the observations and aggregate them as they are parsed
+    for ward_code, ward_name, occupation_category, value in iter_observations(file_path, 'c2021_occ_10'):
+
+        # Initialize the ward data if not already done
+        if ward_code not in all_data:
+            all_data[ward_code] = {
+                'ward_name': ward_name,
+                'managers_directors_senior_officials': 0,
+                'professional_occupations': 0,
+                'associate_professional_technical': 0,
+                'administrative_secretarial': 0,
+                'skilled_trades': 0,
+                'caring_leisure_service': 0,
+                'sales_customer_service': 0,
+                'process_plant_machine_operatives': 0,
+                'elementary_occupations': 0
+            }
+
+        # Map occupation category to the correct field in the dictionary
+        if occupation_category == '1. Managers, directors and senior officials':
+            all_data[ward_code]['managers_directors_senior_officials'] = value
+        elif occupation_category == '2. Professional occupations':
+            all_data[ward_code]['professional_occupations'] = value
+        elif occupation_category == '3. Associate professional and technical occupations':
+            all_data[ward_code]['associate_professional_technical'] = value
+        elif occupation_category == '4. Administrative and secretarial occupations':
+            all_data[ward_code]['administrative_secretarial'] = value
+        elif occupation_category == '5. Skilled trades occupations':
+            all_data[ward_code]['skilled_trades'] = value
+        elif occupation_category == '6. Caring, leisure and other service occupations':
+            all_data[ward_code]['caring_leisure_service'] = value
+        elif occupation_category == '7. Sales and customer service occupations':
+            all_data[ward_code]['sales_customer_service'] = value
+        elif occupation_category == '8. Process, plant and machine operatives':
+            all_data[ward_code]['process_plant_machine_operatives'] = value
+        elif occupation_category == '9. Elementary occupations':
+            all_data[ward_code]['elementary_occupations'] = value
+
+    return [{'ward_code': ward_code, **data} for ward_code, data in all_data.items()]
+
+
+
+def parse_vehicle_availability_data(file_path=VEHICLES_FILE):
+    # Initialize a dictionary to hold data for each ward
+    all_data = {}
+
+    # Define the mappings for vehicle categories based on the values of c2021_cars_5
+    vehicle_categories = {
+        1: 'no_cars_vans',                # Value 1 corresponds to No cars or vans in household
+        2: 'one_car_van',                 # Value 2 corresponds to One car or van in household
+        3: 'two_cars_vans',               # Value 3 corresponds to Two cars or vans in household
+        4: 'three_or_more_cars_vans'      # Value 4 corresponds to Three or more cars or vans in household
+    }
+
+    # Stream the observations and aggregate them as they are parsed
+    for ward_code, ward_name, cars_value, obs_value in iter_observations(file_path, 'c2021_cars_5', field='value'):
+        # Initialize the ward data if not already done
+        if ward_code not in all_data:
+            all_data[ward_code] = {
+                'ward_name': ward_name,
+                'no_cars_vans': 0,
+                'one_car_van': 0,
+                'two_cars_vans': 0,
+                'three_or_more_cars_vans': 0
+            }
+
+        # Map the obs_value to the correct category based on the cars_value
+        if cars_value in vehicle_categories:
+            category_key = vehicle_categories[cars_value]
+            all_data[ward_code][category_key] = obs_value
+
+    return [{'ward_code': ward_code, **data} for ward_code, data in all_data.items()]
+
+
+
+def parse_tenure_data(file_path=TENURE_FILE):
+    # Initialize a dictionary to hold data for each ward
+    all_data = {}
+
+    # Define the mappings for tenure categories
+    tenure_categories = {
+        'Owned: Owns outright': 'owns_outright',
+        'Owned: Owns with a mortgage or loan': 'owns_with_mortgage',
+        'Shared ownership: Shared ownership': 'shared_ownership',
+        'Social rented: Rents from council or Local Authority': 'rents_council',
+        'Social rented: Other social rented': 'other_social_rented',
+        'Private rented: Private landlord or letting agency': 'rents_private_landlord',
+        'Private rented: Other private rented': 'other_private_rented',
+        'Lives rent free': 'lives_rent_free'
+    }
+
+    # Stream the observations and aggregate them as they are parsed
+    for ward_code, ward_name, tenure_category, value in iter_observations(file_path, 'c2021_tenure_9'):
+
+        # Initialize the ward data if not already done
+        if ward_code not in all_data:
+            all_data[ward_code] = {
+                'ward_name': ward_name,
+                'owns_outright': 0,
+                'owns_with_mortgage': 0,
+                'shared_ownership': 0,
+                'rents_council': 0,
+                'other_social_rented': 0,
+                'rents_private_landlord': 0,
+                'other_private_rented': 0,
+                'lives_rent_free': 0
+            }
+
+        # Map tenure category to the correct field in the dictionary
+        if tenure_category in tenure_categories:
+            all_data[ward_code][tenure_categories[tenure_category]] = value
+
+    return [{'ward_code': ward_code, **data} for ward_code, data in all_data.items()]
@@ -1,226 +1,194 @@
 from app import app, db
-from flask import render_template, request
-import requests
-import geopandas as gpd
+from flask import jsonify, render_template, request, url_for
 import folium
 from branca.colormap import LinearColormap
-from app.models import WardPopulation, WardGeneralHealth, WardOccupation, WardTenures, WardVehicles
-import plotly.express as px
-import plotly.io as pio
+from app.boundaries import SIMPLIFY_LEVELS, BoundaryStoreEmpty, get_boundaries, level_for_zoom
+from app.cache import render_cache, sync_data_version
+from app.charts import PLOTLY_CDN, bar_chart_html, build_chart_spec
+from app.choropleth import WARD_STYLE, WardChoropleth
+from app.jobs import enqueue_refresh
+from app.matrix import get_ward_matrix
+from app.metrics import DISPLAY_CATEGORIES, CATEGORY_ARGS, MEASURES, MEASURE_LABELS
+from app.prerender import prerendered_response
 import pandas as pd
 
+DEFAULT_ZOOM = 12
+
+# Colour the map in the browser from the raw ward values, with the boundaries fetched
+# separately; False embeds the boundaries and a per-ward style from a Python style_function
+app.config.setdefault('CLIENT_SIDE_STYLING', True)
+
+# Define color scales for different display types
+COLOR_SCALES = {
+    'population': [
+        (0, '#f7fcf5'), (0.5, '#74c476'), (1, '#00441b')
+    ],
+    'health': [
+        (0, '#fee8c8'), (0.5, '#fdae61'), (1, '#a50034')
+    ],
+    'occupation': [
+        (0, '#e7f3fe'), (0.5, '#2196f3'), (1, '#0d47a1')
+    ],
+    'tenure': [
+        (0, '#f0f0f0'), (0.5, '#636363'), (1, '#252525')
+    ],
+    'vehicles': [
+        (0, '#edf8e9'), (0.5, '#2ca25f'), (1, '#006d2c')
+    ],
+    'default': [
+        (0, '#377eb8'), (0.5, '#4daf4a'), (1, '#ff7f00')
+    ]
+}
+
+# Bar chart layout of each display, built once; renders only insert the ward arrays
+CHART_SPECS = {display_type: build_chart_spec(color_scale) for display_type, color_scale in COLOR_SCALES.items()}
 
-def update_data():
-    from app.utils import update_population_data, update_general_health_data, update_occupation_data, update_vehicle_availability_data, update_tenure_data
-    update_population_data()
-    update_general_health_data()
-    update_occupation_data()
-    update_vehicle_availability_data()
-    update_tenure_data()
 
 @app.route('/update_all', methods=['GET', 'POST'])
 def update_all_data():
-    update_data()
-    return 'All data updated successfully!'
+    # The refresh runs in the background; poll /jobs/<id> for its progress.
+    # A request made while a refresh is already queued or running gets that job back.
+    job, created = enqueue_refresh()
+    return jsonify(
+        job_id=job.id,
+        status=job.status,
+        created=created,
+        url=url_for('job_status', job_id=job.id)
+    ), 202
+
+@app.route('/cache_stats')
+def cache_stats():
+    return jsonify(data_version=sync_data_version(), render_cache=render_cache.stats())
+
+@app.errorhandler(BoundaryStoreEmpty)
+def boundary_store_empty(error):
+    app.logger.error(str(error))
+    return str(error), 503
 
 @app.route('/', methods=['GET', 'POST'])
 @app.route('/wardprofile', methods=['GET', 'POST'])
 def wardprofile():
-    # Fetch GeoJSON data
-    geo_json_url = (
-        "https://services1.arcgis.com/ESMARspQHYMw9BZ9/arcgis/rest/services/WD_MAY_2023_UK_BGC/FeatureServer/0/query?"
-        "where=LAD23NM%20%3D%20'LEWISHAM'&outFields=*&outSR=4326&f=geojson"
-    )
-    geo_json_data = requests.get(geo_json_url).json()
-
-    # Fetch data from the database
-    population_data = WardPopulation.query.all()
-    health_data = WardGeneralHealth.query.all()
-    occupation_data = WardOccupation.query.all()
-    tenure_data = WardTenures.query.all()
-    vehicle_data = WardVehicles.query.all()  # Fetch vehicle data
-
-    # Map the data to ward codes
-    population_map = {
-        'total_population': {data.ward_code: data.total_population for data in population_data},
-        'population_under_15': {data.ward_code: data.population_under_15 for data in population_data},
-        'population_age_16_24': {data.ward_code: data.population_age_16_24 for data in population_data},
-        'population_age_25_49': {data.ward_code: data.population_age_25_49 for data in population_data},
-        'population_age_50_64': {data.ward_code: data.population_age_50_64 for data in population_data},
-        'population_over_65': {data.ward_code: data.population_over_65 for data in population_data}
-    }
-
-    health_map = {
-        'usual_residents': {data.ward_code: data.usual_residents for data in health_data},
-        'residentsGoodHealth': {data.ward_code: data.residentsGoodHealth for data in health_data},
-        'residentsFairHealth': {data.ward_code: data.residentsFairHealth for data in health_data},
-        'residentsBadHealth': {data.ward_code: data.residentsBadHealth for data in health_data},
-        'residentVeryBadHealth': {data.ward_code: data.residentVeryBadHealth for data in health_data}
-    }
-
-    occupation_map = {
-        'managers_directors_senior_officials': {data.ward_code: data.managers_directors_senior_officials for data in occupation_data},
-        'professional_occupations': {data.ward_code: data.professional_occupations for data in occupation_data},
-        'associate_professional_technical': {data.ward_code: data.associate_professional_technical for data in occupation_data},
-        'administrative_secretarial': {data.ward_code: data.administrative_secretarial for data in occupation_data},
-        'skilled_trades': {data.ward_code: data.skilled_trades for data in occupation_data},
-        'caring_leisure_service': {data.ward_code: data.caring_leisure_service for data in occupation_data},
-        'sales_customer_service': {data.ward_code: data.sales_customer_service for data in occupation_data},
-        'process_plant_machine_operatives': {data.ward_code: data.process_plant_machine_operatives for data in occupation_data},
-        'elementary_occupations': {data.ward_code: data.elementary_occupations for data in occupation_data}
-    }
-
-    tenure_map = {
-        'owns_outright': {data.ward_code: data.owns_outright for data in tenure_data},
-        'owns_with_mortgage': {data.ward_code: data.owns_with_mortgage for data in tenure_data},
-        'shared_ownership': {data.ward_code: data.shared_ownership for data in tenure_data},
-        'rents_council': {data.ward_code: data.rents_council for data in tenure_data},
-        'other_social_rented': {data.ward_code: data.other_social_rented for data in tenure_data},
-        'rents_private_landlord': {data.ward_code: data.rents_private_landlord for data in tenure_data},
-        'other_private_rented': {data.ward_code: data.other_private_rented for data in tenure_data},
-        'lives_rent_free': {data.ward_code: data.lives_rent_free for data in tenure_data}
-    }
-
-    # Map the vehicle data to ward codes
-    vehicle_map = {
-        'no_cars_vans': {data.ward_code: data.no_cars_vans for data in vehicle_data},
-        'one_car_van': {data.ward_code: data.one_car_van for data in vehicle_data},
-        'two_cars_vans': {data.ward_code: data.two_cars_vans for data in vehicle_data},
-        'three_or_more_cars_vans': {data.ward_code: data.three_or_more_cars_vans for data in vehicle_data},
-    }
-
-    # Determine the display type and category
+    # Pick a boundary level matching the zoom hint unless the client asks for one explicitly
+    zoom = min(max(request.args.get('zoom', DEFAULT_ZOOM, type=int), 0), 18)
+    level = request.args.get('detail', type=int)
+    if level != 0 and level not in SIMPLIFY_LEVELS:
+        level = level_for_zoom(zoom)
+
+    # Determine the display type and category, falling back to the display's first category
     display_type = request.args.get('display', 'default')
-    category = (
-        request.args.get('age_category', 'total_population') if display_type == 'population' else
-        request.args.get('health_category', 'usual_residents') if display_type == 'health' else
-        request.args.get('occupation_category', 'managers_directors_senior_officials') if display_type == 'occupation' else
-        request.args.get('tenure_category', 'owns_outright') if display_type == 'tenure' else
-        request.args.get('vehicle_category', 'no_cars_vans') if display_type == 'vehicles' else
-        'total_population'
+    if display_type in DISPLAY_CATEGORIES:
+        category = request.args.get(CATEGORY_ARGS[display_type], DISPLAY_CATEGORIES[display_type][0])
+        if category not in DISPLAY_CATEGORIES[display_type]:
+            category = DISPLAY_CATEGORIES[display_type][0]
+    else:
+        display_type, category = 'default', 'total_population'
+    measure = request.args.get('measure', 'count')
+    if measure not in MEASURES:
+        measure = 'count'
+
+    # Serve the pre-rendered page of a default-zoom view when `flask prerender` has stored it
+    version = sync_data_version()
+    if 'zoom' not in request.args and 'detail' not in request.args:
+        response = prerendered_response('page', display_type, category, measure if display_type != 'default' else 'count', version)
+        if response is not None:
+            return response
+
+    # Reuse an earlier render of the same view unless the data has changed since
+    key = (display_type, category, measure, zoom, level, version)
+    fragments = render_cache.get(key)
+    if fragments is None:
+        fragments = render_fragments(display_type, category, zoom, level, version, measure)
+        render_cache.set(key, fragments)
+
+    return render_template(
+        'wardprofile.html',
+        display_type=display_type,
+        category=category,
+        category_args=CATEGORY_ARGS,
+        measure=measure,
+        measure_labels=MEASURE_LABELS,
+        color_scales=COLOR_SCALES,
+        plotly_cdn=PLOTLY_CDN,
+        **fragments
     )
 
-    # Determine the correct map based on display type
-    data_map = {
-        'population': population_map,
-        'health': health_map,
-        'occupation': occupation_map,
-        'tenure': tenure_map,
-        'vehicles': vehicle_map,
-        'default': population_map  # Default to population_map
-    }.get(display_type, population_map)  # Fallback to population_map if display_type is not recognized
 
-    # Ensure category exists in the selected data_map
-    if category not in data_map:
-        category = 'no_cars_vans' if display_type == 'vehicles' else 'total_population'  # Fallback for vehicles
+def render_fragments(display_type, category, zoom, level, version, measure='count'):
+    # Read the ward boundaries from the local store (cached in-process)
+    geo_json_data = get_boundaries(level)
+
+    # Read the selected column from this worker's ward x metric matrix
+    matrix = get_ward_matrix(version)
+    category_values = matrix.values_for(display_type if display_type in DISPLAY_CATEGORIES else 'population', category, measure)
+    label = category.replace("_", " ").title()
+    if measure != 'count':
+        label += f" ({MEASURE_LABELS[measure]})"
 
     # Calculate min and max values for the selected category in the GeoJSON data
-    values = [data_map[category].get(feature['properties'].get('WD23CD', ''), 0.0) for feature in geo_json_data['features']]
+    values = [category_values.get(feature['properties'].get('WD23CD', ''), 0.0) for feature in geo_json_data['features']]
     min_value = min(values, default=0)
     max_value = max(values, default=0)
 
-    # Add selected data to the GeoJSON properties
-    for feature in geo_json_data['features']:
-        ward_code = feature['properties'].get('WD23CD', None)
-        if ward_code:
-            feature['properties']['data_value'] = data_map[category].get(ward_code, 0.0)
-
-    # Create GeoDataFrame
-    gdf = gpd.GeoDataFrame.from_features(geo_json_data['features'])
+    client_styling = app.config['CLIENT_SIDE_STYLING']
+    boundaries_url = url_for('api_ward_boundaries', level=level, v=version)
 
     # Create a folium map
-    m = folium.Map(location=[51.465, -0.02], zoom_start=12)
-
-    # Define color scales for different display types
-    color_scales = {
-        'population': [
-            (0, '#f7fcf5'), (0.5, '#74c476'), (1, '#00441b')
-        ],
-        'health': [
-            (0, '#fee8c8'), (0.5, '#fdae61'), (1, '#a50034')
-        ],
-        'occupation': [
-            (0, '#e7f3fe'), (0.5, '#2196f3'), (1, '#0d47a1')
-        ],
-        'tenure': [
-            (0, '#f0f0f0'), (0.5, '#636363'), (1, '#252525')
-        ],
-        'vehicles': [
-            (0, '#edf8e9'), (0.5, '#2ca25f'), (1, '#006d2c')
-        ],
-        'default': [
-            (0, '#377eb8'), (0.5, '#4daf4a'), (1, '#ff7f00')
-        ]
-    }
+    m = folium.Map(location=[51.465, -0.02], zoom_start=zoom)
 
     # Use the color scale based on the display type
     color_scale = LinearColormap(
-        [color[1] for color in color_scales.get(display_type, color_scales['default'])], 
+        [color[1] for color in COLOR_SCALES.get(display_type, COLOR_SCALES['default'])], 
         vmin=min_value, vmax=max_value
     )
 
     if display_type in ['population', 'health', 'occupation', 'tenure', 'vehicles']:
-        folium.GeoJson(
-            geo_json_data,
-            style_function=lambda feature: {
-                'fillColor': color_scale(feature['properties'].get('data_value', 0)),
-                'color': 'black',
-                'weight': 1,
-                'dashArray': '5, 5',
-                'fillOpacity': 0.7,
-            },
-            tooltip=folium.GeoJsonTooltip(
-                fields=['WD23NM', 'data_value'],
-                aliases=['Ward Name:', category.replace("_", " ").title() + ": "],
-                localize=True
-            )
-        ).add_to(m)
-
-        color_scale.caption = category.replace("_", " ").title()
+        if client_styling:
+            layer = WardChoropleth(
+                boundaries_url, category_values, COLOR_SCALES.get(display_type, COLOR_SCALES['default']),
+                min_value, max_value, label=label
+            ).add_to(m)
+        else:
+            # Add selected data to the GeoJSON properties
+            for feature in geo_json_data['features']:
+                ward_code = feature['properties'].get('WD23CD', None)
+                if ward_code:
+                    feature['properties']['data_value'] = category_values.get(ward_code, 0.0)
+
+            layer = folium.GeoJson(
+                geo_json_data,
+                style_function=lambda feature: dict(
+                    WARD_STYLE, fillColor=color_scale(feature['properties'].get('data_value', 0))
+                ),
+                tooltip=folium.GeoJsonTooltip(
+                    fields=['WD23NM', 'data_value'],
+                    aliases=['Ward Name:', label + ": "],
+                    localize=True
+                )
+            ).add_to(m)
+
+        color_scale.caption = label
         color_scale.add_to(m)
 
         # Create a bar graph for the selected category
         df = pd.DataFrame([
             {
-                'ward_name': data.ward_name,
-                'value': getattr(data, category, 0),
+                'ward_name': ward_name,
+                'value': value,
                 'category': category
             }
-            for data in (population_data if display_type == 'population' else health_data if display_type == 'health' else occupation_data if display_type == 'occupation' else tenure_data if display_type == 'tenure' else vehicle_data)
+            for ward_name, value in matrix.rows_for(display_type, category, measure)
         ])
 
         # Sort the DataFrame by ward_name alphabetically
         df = df.sort_values('ward_name')
 
-        fig = px.bar(
-            df[df['category'] == category],
-            x='value',
-            y='ward_name',
-            color='value',
-            color_continuous_scale=color_scales.get(display_type, color_scales['default']),  # Sequential color scale
-            title=f'Ward {category.replace("_", " ").title()}',
-            labels={'ward_name': 'Ward Name', 'value': category.replace("_", " ").title()},
-            orientation='h'  # Horizontal bar chart
-        )
-        fig.update_layout(
-            yaxis_title='Ward Name',
-            xaxis_title=category.replace("_", " ").title(),
-            autosize=True,
-            height=600,
-            xaxis=dict(showgrid=False),
-            yaxis=dict(showgrid=False, categoryorder="total ascending"),
-            plot_bgcolor='rgba(0,0,0,0)',
-            margin=dict(l=0, r=0, t=40, b=0),
-            showlegend=False
+        # Fill the display's precompiled bar chart with the sorted wards
+        graph_html = bar_chart_html(
+            CHART_SPECS.get(display_type, CHART_SPECS['default']), label,
+            df['ward_name'].tolist(), df['value'].tolist()
         )
-        fig.update_traces(marker_line_width=0)
 
-        # Save figure to HTML
-        graph_html = pio.to_html(fig, full_html=False, include_plotlyjs='cdn')
-
-        # Create a table for the selected category
-        table_html = df.to_html(classes="table table-striped", index=False)
-            # Remove 'category' from the DataFrame before converting it to HTML
+        # Create a table for the selected category, without the 'category' column
         table_html = df.drop(columns=['category'], errors='ignore').to_html(
         classes="table table-striped table-bordered table-hover", 
         index=False, 
@@ -230,25 +198,34 @@ def wardprofile():
     else:
         # Default view: ward colors
         colors = ['#377eb8', '#4daf4a', '#ff7f00', '#984ea3', '#e41a1c', '#ffff33', '#a65628', '#f781bf', '#999999']
-        color_scale = LinearColormap(colors, vmin=0, vmax=len(gdf['WD23NM'].unique())).to_step(len(gdf['WD23NM'].unique()))
-
-        ward_color_map = {name: color_scale(i) for i, name in enumerate(gdf['WD23NM'].unique())}
-
-        folium.GeoJson(
-            geo_json_data,
-            style_function=lambda feature: {
-                'fillColor': ward_color_map.get(feature['properties']['WD23NM'], '#000000'),
-                'color': 'black',
-                'weight': 1,
-                'dashArray': '5, 5',
-                'fillOpacity': 0.7,
-            },
-            tooltip=folium.GeoJsonTooltip(
-                fields=['WD23NM'],
-                aliases=['Ward Name:'],
-                localize=True
-            )
-        ).add_to(m)
+        ward_names = list(dict.fromkeys(feature['properties'].get('WD23NM') for feature in geo_json_data['features']))
+        color_scale = LinearColormap(colors, vmin=0, vmax=len(ward_names)).to_step(len(ward_names))
+        # The i-th step colour is color_scale(i); reading the steps directly avoids the
+        # colormap's linear scan of its index on every call
+        palette = ['#' + ''.join('%02x' % int(u * 255.9999) for u in color) for color in color_scale.colors]
+
+        if client_styling:
+            # One colour per ward name; wards refer to theirs by index
+            name_index = {name: i for i, name in enumerate(ward_names)}
+            color_index = {
+                feature['properties'].get('WD23CD'): name_index[feature['properties'].get('WD23NM')]
+                for feature in geo_json_data['features']
+            }
+            layer = WardChoropleth(boundaries_url, color_index, palette=palette).add_to(m)
+        else:
+            ward_color_map = dict(zip(ward_names, palette))
+
+            layer = folium.GeoJson(
+                geo_json_data,
+                style_function=lambda feature: dict(
+                    WARD_STYLE, fillColor=ward_color_map.get(feature['properties']['WD23NM'], '#000000')
+                ),
+                tooltip=folium.GeoJsonTooltip(
+                    fields=['WD23NM'],
+                    aliases=['Ward Name:'],
+                    localize=True
+                )
+            ).add_to(m)
 
         color_scale.caption = 'Ward Colors'
         color_scale.add_to(m)
@@ -258,9 +235,9 @@ def wardprofile():
     
     
 
-    # Save map to HTML and pass to template
+    # Save map to HTML
     map_html = m._repr_html_()
-    return render_template('wardprofile.html', map_html=map_html, graph_html=graph_html, table_html=table_html)
+    return {'map_html': map_html, 'graph_html': graph_html, 'table_html': table_html, 'map_layer': layer.get_name()}
 
 
 
@@ -0,0 +1,56 @@
+import os
+import shutil
+import tempfile
+
+# Point the app at a scratch database and cache directories before it is imported
+SCRATCH_DIR = tempfile.mkdtemp(prefix='wardprofiles-tests-')
+os.environ['FLASK_SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(SCRATCH_DIR, 'test.db')}"
+os.environ['FLASK_TILE_CACHE_DIR'] = os.path.join(SCRATCH_DIR, 'tiles')
+os.environ['FLASK_NOMIS_CACHE_DIR'] = os.path.join(SCRATCH_DIR, 'nomis')
+os.environ['FLASK_PRERENDER_DIR'] = os.path.join(SCRATCH_DIR, 'prerender')
+
+import pytest
+from app import app as flask_app, db
+from app.boundaries import clear_boundary_cache, update_boundary_data
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+# The Lewisham wards (approximate stand-in polygons), for tests only
+BOUNDARY_FIXTURE = os.path.join(FIXTURE_DIR, 'lewisham_wards.geojson')
+
+
+def reset_caches():
+    # Per-process and on-disk caches are keyed by data version, which restarts with every fresh database
+    import app.cache
+    import app.matrix
+    import app.tiles
+    app.cache.render_cache.clear()
+    app.cache._seen_version = None
+    app.matrix._matrix = None
+    app.tiles._tile_index.clear()
+    clear_boundary_cache()
+    for setting in ('TILE_CACHE_DIR', 'NOMIS_CACHE_DIR', 'PRERENDER_DIR'):
+        shutil.rmtree(flask_app.config[setting], ignore_errors=True)
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        reset_caches()
+        yield flask_app
+        db.session.remove()
+    reset_caches()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def boundaries(app):
+    # The fixture wards loaded into the boundary store
+    update_boundary_data(BOUNDARY_FIXTURE)
+    return BOUNDARY_FIXTURE
@@ -0,0 +1,83 @@
+import json
+import os
+import pytest
+from app.boundaries import (ARCGIS_URL, SIMPLIFY_LEVELS, BoundaryStoreEmpty, get_boundaries, load_boundary_source,
+                            update_boundary_data)
+from app.models import WardBoundary, WardBoundaryLevel
+
+BOUNDARY_FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'lewisham_wards.geojson')
+
+
+def fixture_features():
+    with open(BOUNDARY_FIXTURE) as f:
+        return json.load(f)['features']
+
+
+def test_ingest_stores_every_fixture_ward(app):
+    features = fixture_features()
+    assert update_boundary_data(BOUNDARY_FIXTURE) == len(features)
+
+    stored = {record.ward_code: record for record in WardBoundary.query.all()}
+    assert set(stored) == {feature['properties']['WD23CD'] for feature in features}
+    for feature in features:
+        record = stored[feature['properties']['WD23CD']]
+        assert record.ward_name == feature['properties']['WD23NM']
+        assert record.lad_code == 'E09000023'
+        assert (record.region_code, record.region_name) == ('E12000007', 'London')
+        assert json.loads(record.geometry) == feature['geometry']
+        assert json.loads(record.properties) == feature['properties']
+
+
+def test_ingest_builds_every_simplified_level(boundaries):
+    wards = WardBoundary.query.count()
+    for level in SIMPLIFY_LEVELS:
+        assert WardBoundaryLevel.query.filter_by(level=level).count() == wards
+
+
+def test_reingest_updates_wards_in_place(app, tmp_path):
+    update_boundary_data(BOUNDARY_FIXTURE)
+    ids = {record.ward_code: record.id for record in WardBoundary.query.all()}
+
+    features = fixture_features()
+    features[0]['properties']['WD23NM'] = 'Renamed'
+    source = tmp_path / 'wards.geojson'
+    source.write_text(json.dumps({'type': 'FeatureCollection', 'features': features}))
+    assert update_boundary_data(str(source)) == len(features)
+
+    assert {record.ward_code: record.id for record in WardBoundary.query.all()} == ids
+    assert WardBoundary.query.filter_by(ward_code=features[0]['properties']['WD23CD']).one().ward_name == 'Renamed'
+
+
+def test_boundaries_are_read_from_the_store(boundaries):
+    collection = get_boundaries(0)
+    assert len(collection['features']) == len(fixture_features())
+    assert {feature['properties']['WD23CD'] for feature in collection['features']} == {
+        record.ward_code for record in WardBoundary.query.all()
+    }
+
+
+def test_empty_store_fails_loudly(app, client):
+    with pytest.raises(BoundaryStoreEmpty):
+        get_boundaries(0)
+    response = client.get('/wardprofile')
+    assert response.status_code == 503
+    assert b'flask ingest-boundaries' in response.data
+
+
+def test_default_source_is_arcgis(monkeypatch):
+    requested = []
+
+    class Response:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {'type': 'FeatureCollection', 'features': []}
+
+    def get(url, timeout):
+        requested.append(url)
+        return Response()
+
+    monkeypatch.setattr('app.boundaries.requests.get', get)
+    load_boundary_source()
+    assert requested == [ARCGIS_URL]
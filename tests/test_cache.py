@@ -0,0 +1,51 @@
+from app import db
+from app.cache import RenderCache, bump_data_version, get_data_version, render_cache, sync_data_version
+from app.ingest import DATASET_PARSERS, dataset_source, write_dataset
+
+
+def test_bumps_before_the_first_flush_share_one_row(app):
+    bump_data_version(db.session)
+    bump_data_version(db.session)
+    db.session.commit()
+    assert get_data_version() == 2
+
+
+def test_render_cache_evicts_the_least_recently_used():
+    cache = RenderCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.stats() == {'size': 2, 'maxsize': 2, 'hits': 3, 'misses': 1, 'evictions': 1}
+
+
+def test_version_change_drops_cached_renders(app):
+    version = sync_data_version()
+    render_cache.set(('tenure', version), 'old page')
+    assert sync_data_version() == version
+    assert render_cache.get(('tenure', version)) == 'old page'
+
+    bump_data_version(db.session)
+    db.session.commit()
+    assert sync_data_version() == version + 1
+    assert render_cache.get(('tenure', version)) is None
+    assert render_cache.stats()['size'] == 0
+
+
+def test_changed_data_is_not_served_from_the_cache(boundaries, client):
+    rows = DATASET_PARSERS['tenure'](dataset_source('tenure'))
+    write_dataset('tenure', rows)
+    url = '/wardprofile?display=tenure&tenure_category=owns_outright'
+    first = client.get(url)
+    hits = render_cache.stats()['hits']
+    assert client.get(url).data == first.data
+    assert render_cache.stats()['hits'] == hits + 1
+
+    rows[0]['owns_outright'] = 987654
+    write_dataset('tenure', rows)
+    changed = client.get(url)
+    assert render_cache.stats()['hits'] == hits + 1
+    assert b'987654' in changed.data and b'987654' not in first.data
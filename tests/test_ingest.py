@@ -0,0 +1,55 @@
+import pytest
+from app import db
+from app.ingest import DATASET_PARSERS, dataset_source, run_ingest, write_dataset
+from app.models import AreaRollup, WardTenures
+
+
+@pytest.fixture
+def tenure_rows(boundaries):
+    return DATASET_PARSERS['tenure'](dataset_source('tenure'))
+
+
+def lad_rollup(category):
+    return AreaRollup.query.filter_by(level='lad', dataset='tenure', category=category).one().value
+
+
+@pytest.fixture
+def uncounted(monkeypatch):
+    # A driver that cannot report how many rows a statement changed, like PostgreSQL executemany
+    execute = db.session.execute
+
+    class Uncounted:
+        def __init__(self, result):
+            self.result = result
+            self.rowcount = -1
+
+    monkeypatch.setattr(db.session, 'execute', lambda *args, **kwargs: Uncounted(execute(*args, **kwargs)))
+
+
+def test_write_counts_changed_rows(tenure_rows):
+    assert write_dataset('tenure', tenure_rows) == len(tenure_rows)
+    assert write_dataset('tenure', tenure_rows) == 0
+    assert lad_rollup('owns_outright') == sum(row['owns_outright'] for row in tenure_rows)
+
+
+def test_unknown_rowcount_refreshes_the_rollups(tenure_rows, uncounted):
+    assert write_dataset('tenure', tenure_rows) is None
+    before = lad_rollup('owns_outright')
+
+    tenure_rows[0]['owns_outright'] += 100
+    assert write_dataset('tenure', tenure_rows) is None
+    assert WardTenures.query.filter_by(ward_code=tenure_rows[0]['ward_code']).one().owns_outright == (
+        tenure_rows[0]['owns_outright']
+    )
+    assert lad_rollup('owns_outright') == before + 100
+
+
+def test_dry_run_parses_unchanged_files_and_writes_nothing(boundaries):
+    assert run_ingest(['tenure'], workers=1)['tenure']['written'] == 19
+    assert run_ingest(['tenure'], workers=1)['tenure']['skipped']
+
+    WardTenures.query.delete()
+    db.session.commit()
+    result = run_ingest(['tenure'], dry_run=True, workers=1)['tenure']
+    assert (result['skipped'], result['rows'], result['written']) == (False, 19, 0)
+    assert WardTenures.query.count() == 0
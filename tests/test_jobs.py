@@ -0,0 +1,98 @@
+import time
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy.exc import IntegrityError
+from app import db, jobs
+from app.jobs import ACTIVE_SLOT, enqueue_refresh
+from app.models import IngestJob, WardTenures
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    # Job ids handed to the background executor, which is kept from running them
+    ids = []
+    monkeypatch.setattr(jobs._executor, 'submit', lambda func, job_id: ids.append(job_id))
+    return ids
+
+
+def test_second_request_gets_the_queued_job(app, submitted):
+    job, created = enqueue_refresh()
+    again, created_again = enqueue_refresh()
+    assert (created, created_again) == (True, False)
+    assert again.id == job.id
+    assert submitted == [job.id]
+
+
+def test_database_admits_one_active_job(app):
+    db.session.add(IngestJob(id='a' * 32, status='queued', active_slot=ACTIVE_SLOT))
+    db.session.commit()
+    db.session.add(IngestJob(id='b' * 32, status='queued', active_slot=ACTIVE_SLOT))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+
+
+def test_only_the_slot_holder_is_active(app, submitted):
+    # A job left running without the slot (e.g. from before the slot existed) does not block refreshes
+    db.session.add(IngestJob(id='a' * 32, status='running', total=5, completed=0))
+    db.session.commit()
+    job, created = enqueue_refresh()
+    assert created and job.id != 'a' * 32
+
+
+def test_timeout_runs_from_the_last_heartbeat(app, submitted):
+    timeout = timedelta(seconds=app.config['JOB_TIMEOUT'])
+    long_ago = datetime.utcnow() - 2 * timeout
+    running = IngestJob(id='a' * 32, status='running', total=5, completed=0, active_slot=ACTIVE_SLOT,
+                        created_at=long_ago, started_at=long_ago, heartbeat_at=datetime.utcnow())
+    db.session.add(running)
+    db.session.commit()
+    assert enqueue_refresh() == (running, False)
+
+    running.heartbeat_at = long_ago
+    db.session.commit()
+    job, created = enqueue_refresh()
+    assert created
+    assert (running.status, running.error, running.active_slot) == ('failed', 'Job abandoned', None)
+
+
+def test_losing_a_race_returns_the_winners_job(app, submitted, monkeypatch):
+    # Another worker queues its job between this one's check and its insert
+    winner = IngestJob(id='a' * 32, status='queued', total=5, completed=0, active_slot=ACTIVE_SLOT)
+    get_active_job = jobs.get_active_job
+    checks = []
+
+    def racing_get_active_job():
+        if not checks:
+            checks.append(True)
+            db.session.add(winner)
+            db.session.commit()
+            return None
+        return get_active_job()
+
+    monkeypatch.setattr(jobs, 'get_active_job', racing_get_active_job)
+    job, created = enqueue_refresh()
+    assert (job.id, created) == (winner.id, False)
+    assert submitted == []
+    assert IngestJob.query.count() == 1
+
+
+def test_finished_job_frees_the_slot(app, client, monkeypatch):
+    response = client.post('/update_all')
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+
+    deadline = time.monotonic() + 60
+    while True:
+        status = client.get(f'/jobs/{job_id}').get_json()
+        if status['status'] not in ('queued', 'running') or time.monotonic() > deadline:
+            break
+        time.sleep(0.2)
+
+    assert status['status'] == 'finished', status
+    assert status['heartbeat_at'] >= status['started_at']
+    assert db.session.get(IngestJob, job_id).active_slot is None
+    assert WardTenures.query.count() == 19
+
+    monkeypatch.setattr(jobs._executor, 'submit', lambda func, job_id: None)
+    assert client.post('/update_all').get_json()['created']
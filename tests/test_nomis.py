@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pytest
+import requests
+import app.nomis
+from app.nomis import NOMIS_QUERIES, fetch_nomis, fetch_query, make_session
+
+
+class StubNomis(BaseHTTPRequestHandler):
+    # Serves `observations[table]` a page at a time, after failing `failures[table]` requests with a 503.
+    # `fail_from[table]` makes every request from that record offset on fail with a 500.
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        table = url.path.rsplit('/', 1)[-1].split('.')[0]
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        server = self.server
+        with server.lock:
+            server.requests.append((table, params))
+            failing = server.failures.get(table, 0) > 0
+            if failing:
+                server.failures[table] -= 1
+
+        offset, limit = int(params['recordoffset']), int(params['recordlimit'])
+        if failing or offset >= server.fail_from.get(table, float('inf')):
+            self.send_response(503 if failing else 500)
+            self.end_headers()
+            return
+
+        body = json.dumps({
+            'header': {'id': table, 'truncated': 'true'},
+            'obs': server.observations.get(table, [])[offset:offset + limit],
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def nomis(monkeypatch):
+    # Retry quickly against the stub
+    monkeypatch.setattr(app.nomis, 'BACKOFF_FACTOR', 0.001)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubNomis)
+    server.lock = threading.Lock()
+    server.requests, server.observations, server.failures, server.fail_from = [], {}, {}, {}
+    server.api_url = f'http://127.0.0.1:{server.server_port}/api/v01/dataset'
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def observations(count):
+    return [{'geography': {'geogcode': f'E0501{index:04d}'}, 'obs_value': {'value': index}} for index in range(count)]
+
+
+QUERY = NOMIS_QUERIES['tenures/tenures.json']
+
+
+def read(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def test_pages_by_record_offset(nomis, tmp_path):
+    nomis.observations['NM_2072_1'] = observations(7)
+    path = tmp_path / 'tenures.json'
+    with make_session() as session:
+        assert fetch_query(session, QUERY, str(path), api_url=nomis.api_url, record_limit=3) == (3, 7)
+
+    assert [int(params['recordoffset']) for _, params in nomis.requests] == [0, 3, 6]
+    assert all(params['recordlimit'] == '3' for _, params in nomis.requests)
+    assert all(params['geography'] == QUERY['geography'] for _, params in nomis.requests)
+    data = read(path)
+    assert data['header'] == {'id': 'NM_2072_1', 'truncated': 'false'}
+    assert data['obs'] == observations(7)
+
+
+def test_full_last_page_asks_for_one_more(nomis, tmp_path):
+    nomis.observations['NM_2072_1'] = observations(6)
+    path = tmp_path / 'tenures.json'
+    with make_session() as session:
+        assert fetch_query(session, QUERY, str(path), api_url=nomis.api_url, record_limit=3) == (3, 6)
+    assert read(path)['obs'] == observations(6)
+
+
+def test_retries_server_errors(nomis, tmp_path):
+    nomis.observations['NM_2072_1'] = observations(2)
+    nomis.failures['NM_2072_1'] = 3
+    path = tmp_path / 'tenures.json'
+    with make_session() as session:
+        assert fetch_query(session, QUERY, str(path), api_url=nomis.api_url) == (1, 2)
+    assert len(nomis.requests) == 4
+    assert read(path)['obs'] == observations(2)
+
+
+def test_gives_up_after_the_retries(nomis, tmp_path):
+    nomis.failures['NM_2072_1'] = 10
+    path = tmp_path / 'tenures.json'
+    with make_session(retries=2) as session:
+        with pytest.raises(requests.RequestException):
+            fetch_query(session, QUERY, str(path), api_url=nomis.api_url)
+    assert len(nomis.requests) == 3
+    assert os.listdir(tmp_path) == []
+
+
+def test_failed_fetch_keeps_the_previous_file(nomis, tmp_path):
+    # The second page fails, so nothing of the partial download may replace the cached file
+    nomis.observations['NM_2072_1'] = observations(5)
+    nomis.fail_from['NM_2072_1'] = 3
+    path = tmp_path / 'tenures.json'
+    path.write_text('{"header": {}, "obs": []}')
+    with make_session(retries=1) as session:
+        with pytest.raises(requests.RequestException):
+            fetch_query(session, QUERY, str(path), api_url=nomis.api_url, record_limit=3)
+    assert os.listdir(tmp_path) == ['tenures.json']
+    assert read(path) == {'header': {}, 'obs': []}
+
+
+def test_cache_layout_matches_the_bundled_files(nomis, tmp_path):
+    for query in NOMIS_QUERIES.values():
+        nomis.observations[query['table']] = observations(4)
+    report = fetch_nomis(out_dir=str(tmp_path), api_url=nomis.api_url, record_limit=3)
+
+    assert set(report) == set(NOMIS_QUERIES)
+    assert all(entry['error'] is None and entry['observations'] == 4 for entry in report.values())
+    written = {
+        os.path.relpath(os.path.join(directory, name), tmp_path).replace(os.sep, '/')
+        for directory, _, names in os.walk(tmp_path) for name in names
+    }
+    assert written == set(NOMIS_QUERIES)
+    for relative_path in NOMIS_QUERIES:
+        assert read(tmp_path / relative_path)['obs'] == observations(4)
+
+
+def test_datasets_and_geography_narrow_the_fetch(nomis, tmp_path):
+    nomis.failures['NM_2055_1'] = 10
+    report = fetch_nomis(['health', 'vehicles'], geography='641734706', out_dir=str(tmp_path),
+                         api_url=nomis.api_url, concurrency=2)
+
+    assert set(report) == {'general_health/general_health.json', 'vehicles/vehicle_availability.json'}
+    assert report['general_health/general_health.json']['error']
+    assert report['vehicles/vehicle_availability.json']['error'] is None
+    assert {params['geography'] for _, params in nomis.requests} == {'641734706'}
+    assert not (tmp_path / 'general_health' / 'general_health.json').exists()
+    assert (tmp_path / 'vehicles' / 'vehicle_availability.json').exists()
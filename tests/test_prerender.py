@@ -0,0 +1,63 @@
+import os
+import pytest
+from app import db, prerender
+from app.ingest import run_ingest
+from app.models import WardTenures
+from app.prerender import get_manifest, manifest_files, run_prerender
+
+VIEW = ('tenure', 'owns_outright', 'count')
+
+
+@pytest.fixture
+def rendered(boundaries, monkeypatch):
+    # The bundled datasets, with one view to pre-render
+    run_ingest(workers=1)
+    monkeypatch.setattr(prerender, 'prerender_views', lambda: [VIEW])
+
+
+def change_data():
+    ward = WardTenures.query.first()
+    ward.owns_outright += 1
+    db.session.commit()
+
+
+def files_on_disk(manifest, out_dir):
+    return {name for name in manifest_files(manifest) if os.path.exists(os.path.join(out_dir, name))}
+
+
+def test_previous_run_is_kept_until_the_next_one(rendered, app):
+    out_dir = app.config['PRERENDER_DIR']
+    first = run_prerender(workers=1)
+    change_data()
+    second = run_prerender(workers=1)
+    assert manifest_files(first).isdisjoint(manifest_files(second))
+    assert files_on_disk(first, out_dir) == manifest_files(first)
+
+    change_data()
+    third = run_prerender(workers=1)
+    assert files_on_disk(first, out_dir) == set()
+    assert files_on_disk(second, out_dir) == manifest_files(second)
+    assert files_on_disk(third, out_dir) == manifest_files(third)
+
+
+def test_missing_file_falls_back_to_rendering(rendered, app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'SERVE_PRERENDERED', True)
+    manifest = run_prerender(workers=1)
+    url = '/api/wards/tenure/owns_outright'
+    served = client.get(url)
+    assert served.status_code == 200
+    assert served.headers['ETag'].strip('"') in manifest_files(manifest)
+
+    for name in manifest_files(get_manifest()):
+        os.remove(os.path.join(app.config['PRERENDER_DIR'], name))
+    rendered_live = client.get(url)
+    assert rendered_live.status_code == 200
+    assert rendered_live.headers['ETag'] != served.headers['ETag']
+    assert rendered_live.get_json() == served.get_json()
+
+
+def test_clients_cannot_force_a_live_render(rendered, app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'SERVE_PRERENDERED', True)
+    manifest = run_prerender(workers=1)
+    response = client.get('/api/wards/tenure/owns_outright', headers={'X-Prerender': '1'})
+    assert response.headers['ETag'].strip('"') in manifest_files(manifest)
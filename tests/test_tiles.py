@@ -0,0 +1,81 @@
+import math
+import os
+import mapbox_vector_tile
+from app import app
+from app.models import WardBoundary
+from app.tiles import TILE_EXTENT, TILE_LAYER, get_tile, render_tile
+
+
+def tile_for(lon, lat, z):
+    # The z/x/y tile containing a point
+    n = 2 ** z
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return z, x, y
+
+
+# Central Lewisham, inside the fixture wards
+LEWISHAM = (-0.02, 51.45)
+
+
+def decode(tile):
+    return mapbox_vector_tile.decode(tile)
+
+
+def test_tile_has_the_ward_layer(boundaries):
+    layers = decode(render_tile(*tile_for(*LEWISHAM, 10), version=1))
+    assert list(layers) == [TILE_LAYER]
+    assert layers[TILE_LAYER]['extent'] == TILE_EXTENT
+
+
+def test_low_zoom_tile_holds_every_ward_with_stable_ids(boundaries):
+    wards = [record.ward_code for record in WardBoundary.query.order_by(WardBoundary.ward_code)]
+    features = decode(render_tile(*tile_for(*LEWISHAM, 8), version=1))[TILE_LAYER]['features']
+
+    assert sorted(feature['properties']['WD23CD'] for feature in features) == wards
+    for feature in features:
+        assert wards[feature['id']] == feature['properties']['WD23CD']
+        assert feature['properties']['WD23NM']
+        assert 'value' not in feature['properties']
+
+
+def test_ids_match_across_tiles(boundaries):
+    z, x, y = tile_for(*LEWISHAM, 13)
+    ids = {}
+    for dx in (-1, 0, 1):
+        for feature in decode(render_tile(z, x + dx, y, version=1))[TILE_LAYER]['features']:
+            assert ids.setdefault(feature['properties']['WD23CD'], feature['id']) == feature['id']
+    assert ids
+
+
+def test_values_are_tile_attributes(boundaries):
+    values = {record.ward_code: position * 10 for position, record in enumerate(WardBoundary.query.all())}
+    features = decode(render_tile(*tile_for(*LEWISHAM, 8), version=1, values=values))[TILE_LAYER]['features']
+    assert {feature['properties']['WD23CD']: feature['properties']['value'] for feature in features} == values
+
+
+def test_empty_tile_outside_the_wards(boundaries):
+    layers = decode(render_tile(*tile_for(-3.19, 55.95, 12), version=1))
+    assert not layers.get(TILE_LAYER, {}).get('features')
+
+
+def test_cached_tiles_are_kept_per_version(boundaries):
+    root = app.config['TILE_CACHE_DIR']
+    z, x, y = tile_for(*LEWISHAM, 12)
+
+    tile = get_tile(z, x, y, 1)
+    path = os.path.join(root, '1', 'wards', 'none', str(z), str(x), f'{y}.mvt')
+    with open(path, 'rb') as file:
+        assert file.read() == tile
+    assert get_tile(z, x, y, 1) == tile
+
+    # The first tile of a newer version removes the older versions
+    get_tile(z, x, y, 2)
+    assert sorted(os.listdir(root)) == ['2']
+
+
+def test_removed_tile_is_rendered_again(boundaries):
+    z, x, y = tile_for(*LEWISHAM, 12)
+    tile = get_tile(z, x, y, 1)
+    os.remove(os.path.join(app.config['TILE_CACHE_DIR'], '1', 'wards', 'none', str(z), str(x), f'{y}.mvt'))
+    assert get_tile(z, x, y, 1) == tile